@@ -0,0 +1,251 @@
+import json
+import os
+from html.parser import HTMLParser
+from time import perf_counter
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Checked in priority order: answer boxes first, then general search result snippets.
+AnswerBoxSelectors = [
+    "div.BNeawe",
+    "div.V3yFp",
+    "div.LGOjhe",
+    "div.d6DCz",
+    "span.hgKElc",
+    "div.IZ6rdc",
+    "div.kno-rdesc > span",
+    "div.liYKde > div.ifM9O",
+    "div.webanswers-webanswers_table__webanswers-table-wrapper",
+]
+SnippetSelectors = [
+    "div.VwiC3b > span.LrzXr",
+    "div.s3v9rd > span",
+    "span.st",
+]
+AnswerSelectors = AnswerBoxSelectors + SnippetSelectors
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# html.parser treats these as raw text; nothing inside them is page content.
+SKIPPED_ELEMENTS = {"script", "style"}
+
+
+def ParseCompound(compound):
+    tag, _, classes = compound.partition(".")
+    return tag or None, set(classes.split(".")) if classes else set()
+
+
+def CompileSelectors(selectors):
+    """Compiles 'tag.class' and 'parent > child' selectors into (parent, child) compound pairs."""
+    compiled = []
+    for selector in selectors:
+        parts = [part.strip() for part in selector.split(">")]
+        parent = ParseCompound(parts[0]) if len(parts) == 2 else None
+        compiled.append((parent, ParseCompound(parts[-1])))
+    return compiled
+
+
+def Matches(compound, tag, classes):
+    wanted_tag, wanted_classes = compound
+    return (wanted_tag is None or wanted_tag == tag) and wanted_classes <= classes
+
+
+def MatchingSelectors(compiled, tag, classes, parent_tag, parent_classes, below):
+    """Indices of selectors (only those with priority below `below`) that match this element."""
+    found = []
+    for index in range(below):
+        parent, child = compiled[index]
+        if not Matches(child, tag, classes):
+            continue
+        if parent is not None and (parent_tag is None or not Matches(parent, parent_tag, parent_classes)):
+            continue
+        found.append(index)
+    return found
+
+
+CompiledAnswerSelectors = CompileSelectors(AnswerSelectors)
+
+
+class StopParsing(Exception):
+    pass
+
+
+class SinglePassExtractor(HTMLParser):
+    """Walks the page once, tracking the first match of every selector in document order."""
+
+    def __init__(self, compiled):
+        super().__init__(convert_charrefs=True)
+        self.compiled = compiled
+        self.stack = []
+        self.active = []
+        self.best = None
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_ELEMENTS:
+            self.skip_depth += 1
+            return
+        if tag in VOID_ELEMENTS:
+            return
+        classes = set()
+        for name, value in attrs:
+            if name == "class" and value:
+                classes = set(value.split())
+        parent_tag, parent_classes = self.stack[-1][:2] if self.stack else (None, set())
+
+        below = self.best[0] if self.best else len(self.compiled)
+        claimed = {capture[0] for capture in self.active}
+        for index in MatchingSelectors(self.compiled, tag, classes, parent_tag, parent_classes, below):
+            if index not in claimed:
+                self.active.append([index, len(self.stack), []])
+        self.stack.append((tag, classes))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_ELEMENTS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+            return
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        while self.stack:
+            open_tag, _ = self.stack.pop()
+            self._CloseCaptures(len(self.stack))
+            if open_tag == tag:
+                break
+
+    def _CloseCaptures(self, depth):
+        still_open = []
+        for capture in self.active:
+            index, capture_depth, texts = capture
+            if capture_depth < depth:
+                still_open.append(capture)
+                continue
+            text = " ".join(texts)
+            # An empty element does not satisfy the selector for our purposes.
+            if text and (self.best is None or index < self.best[0]):
+                self.best = (index, text)
+        self.active = still_open
+        if self.best and self.best[0] == 0:
+            raise StopParsing()
+
+    def handle_data(self, data):
+        if self.skip_depth or not self.active:
+            return
+        text = data.strip()
+        if text:
+            for capture in self.active:
+                capture[2].append(text)
+
+
+def ExtractWithHtmlParser(html, compiled=CompiledAnswerSelectors):
+    extractor = SinglePassExtractor(compiled)
+    try:
+        extractor.feed(html)
+        extractor.close()
+        extractor._CloseCaptures(0)
+    except StopParsing:
+        pass
+    return extractor.best
+
+
+def ExtractWithLxml(html, compiled=CompiledAnswerSelectors):
+    root = lxml.html.fromstring(html)
+    best = None
+    for element in root.iter():
+        if not isinstance(element.tag, str) or element.tag in SKIPPED_ELEMENTS:
+            continue
+        classes = set((element.get("class") or "").split())
+        parent = element.getparent()
+        parent_tag = parent.tag if parent is not None else None
+        parent_classes = set((parent.get("class") or "").split()) if parent is not None else set()
+        below = best[0] if best else len(compiled)
+        for index in MatchingSelectors(compiled, element.tag, classes, parent_tag, parent_classes, below):
+            text = " ".join(
+                piece.strip() for piece in element.xpath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+                if piece.strip()
+            )
+            if text:
+                best = (index, text)
+                break
+        if best and best[0] == 0:
+            break
+    return best
+
+
+def ExtractAnswer(html):
+    """Returns (selector, text) for the highest-priority answer on the page, or (None, None)."""
+    if LXML_AVAILABLE:
+        best = ExtractWithLxml(html)
+    else:
+        best = ExtractWithHtmlParser(html)
+    if best is None:
+        return None, None
+    return AnswerSelectors[best[0]], best[1]
+
+
+def BenchmarkPages(directory):
+    """
+    Runs every saved result page (*.html) in directory through each available backend,
+    checks the answer against expected.json and reports parse time per page. When
+    BeautifulSoup is installed the old select_one() chain is timed alongside.
+    """
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        BeautifulSoup = None
+
+    try:
+        with open(os.path.join(directory, "expected.json"), "r", encoding="utf-8") as file:
+            expected = json.load(file)
+    except (IOError, ValueError):
+        expected = {}
+
+    backends = [("html.parser", ExtractWithHtmlParser)]
+    if LXML_AVAILABLE:
+        backends.append(("lxml", ExtractWithLxml))
+
+    failures = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as file:
+            html = file.read()
+
+        timings = []
+        for backend, extract in backends:
+            start = perf_counter()
+            best = extract(html)
+            timings.append(f"{backend} {(perf_counter() - start) * 1000:.2f} ms")
+            result = [AnswerSelectors[best[0]], best[1]] if best else None
+            if name in expected and result != expected[name]:
+                failures += 1
+                print(f"FAIL {name} [{backend}]: got {result!r}, expected {expected[name]!r}")
+
+        if BeautifulSoup:
+            start = perf_counter()
+            soup = BeautifulSoup(html, "html.parser")
+            for selector in AnswerSelectors:
+                element = soup.select_one(selector)
+                if element and element.get_text(strip=True, separator=' '):
+                    break
+            timings.append(f"select_one chain {(perf_counter() - start) * 1000:.2f} ms")
+
+        print(f"{name}: {', '.join(timings)}")
+
+    print(f"{failures} failure(s) against {os.path.join(directory, 'expected.json')}.")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    import sys
+    passed = BenchmarkPages(sys.argv[1] if len(sys.argv) > 1 else os.path.join("Data", "SearchPages"))
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,554 @@
+import json
+import math
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+from time import monotonic
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+# Minimum trigram similarity (Dice coefficient) for a fuzzy application match. Only the display
+# names of installed applications are matched fuzzily; PATH executables must match exactly.
+AppMatchThreshold = float(env_vars.get("AppMatchThreshold", 0.8))
+# Seconds between checks of the source directories for changes.
+AppIndexRefreshSeconds = float(env_vars.get("AppIndexRefreshSeconds", 10))
+
+APP_INDEX_PATH = os.path.join("Data", "AppIndex.json")
+APP_INDEX_VERSION = 3
+
+# Lower ranks win ties: an installed GUI application over a bare PATH executable.
+KIND_RANK = {"desktop": 0, "shortcut": 0, "bundle": 0, "executable": 1}
+# Executable file extensions on Windows, where os.access(X_OK) is true for every file.
+PATHEXT = [ext.lower() for ext in os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD").split(";") if ext]
+
+
+def NormalizeName(name):
+    name = name.lower()
+    for suffix in (".desktop", ".exe", ".lnk", ".app"):
+        name = name.removesuffix(suffix)
+    return " ".join(re.findall(r"[a-z0-9]+", name))
+
+
+def Trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def DefaultSources():
+    """(directory, kind, recursive) triples for the applications launchable on this platform."""
+    sources = []
+    if sys.platform.startswith("win"):
+        for base in (os.environ.get("ProgramData"), os.environ.get("APPDATA")):
+            if base:
+                sources.append((os.path.join(base, "Microsoft", "Windows", "Start Menu", "Programs"), "shortcut", True))
+    elif sys.platform == "darwin":
+        sources += [("/Applications", "bundle", False), (os.path.expanduser("~/Applications"), "bundle", False)]
+    else:
+        data_home = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+        data_dirs = os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":")
+        for base in [data_home] + data_dirs + ["/var/lib/flatpak/exports/share", "/var/lib/snapd/desktop"]:
+            sources.append((os.path.join(base, "applications"), "desktop", True))
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        if directory:
+            sources.append((directory, "executable", False))
+
+    unique = []
+    seen = set()
+    for directory, kind, recursive in sources:
+        directory = os.path.abspath(directory)
+        if directory not in seen:
+            seen.add(directory)
+            unique.append((directory, kind, recursive))
+    return unique
+
+
+def DirectorySignature(directory, recursive):
+    """Newest mtime of the directory (and its subdirectories), or None if it does not exist."""
+    try:
+        newest = os.stat(directory).st_mtime
+    except OSError:
+        return None
+    if recursive:
+        for root, dirs, _ in os.walk(directory):
+            for name in dirs:
+                try:
+                    newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+                except OSError:
+                    pass
+    return newest
+
+
+def ParseDesktopEntry(path):
+    fields = {}
+    in_entry = False
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            for line in file:
+                line = line.strip()
+                if line.startswith("["):
+                    if in_entry:
+                        break
+                    in_entry = line == "[Desktop Entry]"
+                elif in_entry and "=" in line:
+                    key, value = line.split("=", 1)
+                    fields.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+    if fields.get("Type", "Application") != "Application" or not fields.get("Exec"):
+        return None
+    if fields.get("NoDisplay", "").lower() == "true" or fields.get("Hidden", "").lower() == "true":
+        return None
+    # Field codes such as %U or %f stand for files to open; launching the app alone drops them.
+    command = re.sub(r"\s*%[a-zA-Z]", "", fields["Exec"]).strip()
+    name = fields.get("Name") or os.path.basename(path)
+    aliases = [os.path.basename(path), fields.get("GenericName", "")]
+    try:
+        aliases.append(os.path.basename(shlex.split(command)[0]))
+    except (ValueError, IndexError):
+        pass
+    return {"name": name, "aliases": [a for a in aliases if a], "command": command, "kind": "desktop", "source": path}
+
+
+def ReadEntry(path, file_name, kind):
+    if kind == "desktop":
+        return ParseDesktopEntry(path) if file_name.endswith(".desktop") else None
+    if kind == "shortcut":
+        if file_name.lower().endswith((".lnk", ".url")) and "uninstall" not in file_name.lower():
+            return {"name": os.path.splitext(file_name)[0], "aliases": [], "command": path, "kind": kind, "source": path}
+    elif kind == "bundle":
+        if file_name.endswith(".app"):
+            return {"name": file_name[:-4], "aliases": [], "command": path, "kind": kind, "source": path}
+    elif kind == "executable":
+        if sys.platform.startswith("win"):
+            name, extension = os.path.splitext(file_name)
+            if extension.lower() in PATHEXT and os.path.isfile(path):
+                return {"name": name, "aliases": [], "command": path, "kind": kind, "source": path}
+        elif os.access(path, os.X_OK) and os.path.isfile(path):
+            return {"name": file_name, "aliases": [], "command": path, "kind": kind, "source": path}
+    return None
+
+
+def ScanDirectory(directory, kind, recursive, previous=None):
+    """
+    Returns {path: [mtime, entry or None]} for the directory. Files whose mtime is
+    unchanged since the previous scan reuse their old entry instead of being re-read.
+    """
+    previous = previous or {}
+    files = {}
+    # Listing non-recursively also returns subdirectories, which is what .app bundles are.
+    walker = os.walk(directory) if recursive else [(directory, [], os.listdir(directory))]
+    for root, _, names in walker:
+        for file_name in names:
+            path = os.path.join(root, file_name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            known = previous.get(path)
+            files[path] = known if known and known[0] == mtime else [mtime, ReadEntry(path, file_name, kind)]
+    return files
+
+
+class TrigramIndex:
+    """
+    Exact and fuzzy (trigram Dice coefficient) lookup from names to values. Items are
+    (key, value, rank) or (key, value, rank, fuzzy); keys added with fuzzy=False are
+    only found by an exact match.
+    """
+
+    def __init__(self, items=()):
+        self.exact = {}
+        self.keys = []
+        self.postings = {}
+        for key, value, rank, *fuzzy in sorted(items, key=lambda item: item[2]):
+            key = NormalizeName(key)
+            if not key:
+                continue
+            self.exact.setdefault(key, value)
+            if fuzzy and not fuzzy[0]:
+                continue
+            grams = Trigrams(key)
+            key_id = len(self.keys)
+            self.keys.append((grams, value, rank, len(key)))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(key_id)
+
+    def Find(self, query, threshold):
+        query = NormalizeName(query)
+        if not query:
+            return None
+        if query in self.exact:
+            return self.exact[query]
+
+        grams = Trigrams(query)
+        # Any key with Dice >= threshold shares at least `needed` of the query's trigrams,
+        # so it must appear in one of the rarest len(grams) - needed + 1 postings lists.
+        needed = max(1, math.ceil(threshold * len(grams) / (2 - threshold)))
+        rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(grams) - needed + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        best = None
+        for key_id in candidates:
+            key_grams, value, rank, length = self.keys[key_id]
+            score = 2 * len(grams & key_grams) / (len(grams) + len(key_grams))
+            if score >= threshold:
+                candidate = (-score, rank, length, key_id)
+                if best is None or candidate < best[0]:
+                    best = (candidate, value)
+        return best[1] if best else None
+
+
+class AppIndex:
+    """
+    Persistent index of launchable applications (.desktop entries, Start Menu
+    shortcuts, app bundles and PATH executables) with fuzzy name lookup, plus an
+    index of running processes for closing apps. Only source directories whose
+    mtime changed are rescanned, and the result is saved to Data/AppIndex.json.
+    """
+
+    def __init__(self, path=APP_INDEX_PATH, sources=None, refresh_interval=AppIndexRefreshSeconds):
+        self.path = path
+        self.sources = sources if sources is not None else DefaultSources()
+        self.refresh_interval = refresh_interval
+        self.directories = {}
+        self.index = TrigramIndex()
+        # (normalized name -> pids, monotonic time listed), replaced as one value.
+        self._processes = ({}, 0.0)
+        self._cache = {}
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._Load()
+
+    def _Load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+            if stored.get("version") == APP_INDEX_VERSION:
+                self.directories = stored.get("directories", {})
+        except (IOError, ValueError):
+            pass
+        self._Rebuild()
+
+    def _Save(self, directories):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": APP_INDEX_VERSION, "directories": directories}, file)
+            os.replace(temp_path, self.path)
+        except IOError as e:
+            print(f"ERROR: Could not save application index: {e}")
+
+    def _Rebuild(self, directories=None):
+        if directories is None:
+            directories = self.directories
+        items = []
+        for stored in directories.values():
+            for _, entry in stored["files"].values():
+                if entry is None:
+                    continue
+                rank = KIND_RANK.get(entry["kind"], 1)
+                # "open chrome" must not launch chroot: only application names are matched fuzzily,
+                # aliases and PATH executables have to be named exactly.
+                items.append((entry["name"], entry, rank, entry["kind"] != "executable"))
+                items += [(alias, entry, rank, False) for alias in entry["aliases"]]
+        index = TrigramIndex(items)
+        with self._lock:
+            self.directories = directories
+            self.index = index
+            self._cache = {}
+
+    def Refresh(self):
+        """Rescans source directories that changed since the last scan. Returns how many were rescanned."""
+        with self._refresh_lock:
+            return self._Refresh()
+
+    def _Refresh(self):
+        # Works on a copy; lookups keep using the current index until _Rebuild swaps both in.
+        with self._lock:
+            directories = dict(self.directories)
+        rescanned = 0
+        active = set()
+        for directory, kind, recursive in self.sources:
+            active.add(directory)
+            signature = DirectorySignature(directory, recursive)
+            stored = directories.get(directory)
+            if signature is None:
+                if stored is not None:
+                    del directories[directory]
+                    rescanned += 1
+                continue
+            if stored is not None and stored["signature"] == signature:
+                continue
+            try:
+                files = ScanDirectory(directory, kind, recursive, stored["files"] if stored else None)
+            except OSError as e:
+                print(f"WARNING: Could not scan '{directory}' for applications: {e}")
+                continue
+            directories[directory] = {"signature": signature, "files": files}
+            rescanned += 1
+        for directory in list(directories):
+            if directory not in active:
+                del directories[directory]
+                rescanned += 1
+
+        self._checked_at = monotonic()
+        if rescanned:
+            self._Rebuild(directories)
+            self._Save(directories)
+        return rescanned
+
+    def RefreshInBackground(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def Run():
+            try:
+                rescanned = self.Refresh()
+                if rescanned:
+                    print(f"DEBUG: Application index refreshed ({rescanned} directories rescanned, {self.Stats()['entries']} apps).")
+            except Exception as e:
+                print(f"ERROR: Application index refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=Run, name="AppIndexRefresh", daemon=True).start()
+
+    def FindApp(self, name):
+        """Returns the index entry that best matches name, or None."""
+        if monotonic() - self._checked_at > self.refresh_interval:
+            self._checked_at = monotonic()
+            self.RefreshInBackground()
+        key = NormalizeName(name)
+        with self._lock:
+            index = self.index
+            if key in self._cache:
+                return self._cache[key]
+        entry = index.Find(key, AppMatchThreshold)
+        with self._lock:
+            if index is self.index:
+                if len(self._cache) > 256:
+                    self._cache.clear()
+                self._cache[key] = entry
+        return entry
+
+    def _RefreshProcesses(self):
+        pids = {}
+        for pid, name in ListProcesses():
+            pids.setdefault(NormalizeName(name), []).append(pid)
+        processes = (pids, monotonic())
+        with self._lock:
+            self._processes = processes
+        return processes
+
+    def FindProcesses(self, name, max_age=2.0):
+        """
+        Returns the pids of every running process whose executable name is exactly name
+        once both are normalized. Closing the wrong program is worse than opening the
+        wrong one, so there is no fuzzy matching; callers fall back to AppOpener instead.
+        """
+        with self._lock:
+            processes = self._processes
+        if monotonic() - processes[1] > max_age:
+            processes = self._RefreshProcesses()
+        return list(processes[0].get(NormalizeName(name), []))
+
+    def Stats(self):
+        with self._lock:
+            return {
+                "directories": len(self.directories),
+                "entries": sum(1 for d in self.directories.values() for _, entry in d["files"].values() if entry),
+                "keys": len(self.index.keys),
+            }
+
+
+def ListProcesses():
+    """(pid, executable name) for running processes, excluding this one and every process it started."""
+    processes = []  # (pid, parent pid, name); the parent is None where it cannot be read
+    try:
+        import psutil
+        for process in psutil.process_iter(["pid", "ppid", "name"]):
+            if process.info["name"]:
+                processes.append((process.info["pid"], process.info["ppid"], process.info["name"]))
+    except ImportError:
+        if sys.platform.startswith("win"):
+            processes = ListWindowsProcesses()
+        elif os.path.isdir("/proc"):
+            for pid in os.listdir("/proc"):
+                if not pid.isdigit() or pid == "1":
+                    continue
+                try:
+                    with open(f"/proc/{pid}/stat", "r") as file:
+                        stat = file.read()
+                except OSError:
+                    continue
+                # "pid (name) state ppid ..."; the name itself may contain spaces and parentheses.
+                name = stat[stat.index("(") + 1:stat.rindex(")")]
+                processes.append((int(pid), int(stat[stat.rindex(")") + 2:].split()[1]), name))
+
+    # The image worker, chromedriver and Chrome are the assistant's own; never offer them up.
+    own = {os.getpid()}
+    children = {}
+    for pid, parent, _ in processes:
+        children.setdefault(parent, []).append(pid)
+    stack = [os.getpid()]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in own:
+                own.add(child)
+                stack.append(child)
+    return [(pid, name) for pid, _, name in processes if pid not in own]
+
+
+def ListWindowsProcesses():
+    """(pid, parent pid, name) from wmic, or from tasklist (without parents) where wmic is gone."""
+    processes = []
+    try:
+        output = subprocess.run(["wmic", "process", "get", "Name,ParentProcessId,ProcessId", "/format:csv"],
+                                capture_output=True, text=True, timeout=10).stdout
+        for row in output.splitlines():
+            fields = row.strip().split(",")
+            # Node,Name,ParentProcessId,ProcessId
+            if len(fields) == 4 and fields[2].isdigit() and fields[3].isdigit():
+                processes.append((int(fields[3]), int(fields[2]), fields[1]))
+        if processes:
+            return processes
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+    try:
+        output = subprocess.run(["tasklist", "/fo", "csv", "/nh"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"ERROR: Could not list running processes: {e}")
+        return processes
+    for row in output.splitlines():
+        fields = [field.strip('"') for field in row.split('","')]
+        if len(fields) > 1 and fields[1].isdigit():
+            processes.append((int(fields[1]), None, fields[0]))
+    return processes
+
+
+def Launch(entry):
+    """Starts an application from its index entry without waiting for it."""
+    if entry["kind"] in ("shortcut", "bundle") and hasattr(os, "startfile"):
+        os.startfile(entry["command"])
+    elif entry["kind"] == "bundle":
+        subprocess.Popen(["open", entry["command"]])
+    elif entry["kind"] == "desktop":
+        subprocess.Popen(shlex.split(entry["command"]), start_new_session=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        subprocess.Popen([entry["command"]], start_new_session=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def Terminate(pids):
+    """Asks each process to exit (SIGTERM / taskkill without /F). Returns how many were signalled."""
+    signalled = 0
+    for pid in pids:
+        try:
+            if sys.platform.startswith("win"):
+                subprocess.run(["taskkill", "/PID", str(pid)], capture_output=True, timeout=5)
+            else:
+                os.kill(pid, signal.SIGTERM)
+            signalled += 1
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"WARNING: Could not close process {pid}: {e}")
+    return signalled
+
+
+def BenchmarkAppIndex(count=10000):
+    """Builds an index over count synthetic .desktop entries and times builds, refreshes and lookups."""
+    import random
+    import shutil
+    import tempfile
+    from time import perf_counter
+
+    words = ["studio", "writer", "player", "editor", "viewer", "manager", "terminal", "browser",
+             "monitor", "mail", "office", "photo", "music", "video", "code", "notes", "chat", "maps"]
+    random.seed(7)
+    root = tempfile.mkdtemp(prefix="AppIndexBench")
+    apps = os.path.join(root, "applications")
+    os.makedirs(apps)
+    names = []
+    for i in range(count):
+        name = f"{random.choice(words).title()} {random.choice(words).title()} {i}"
+        names.append(name)
+        with open(os.path.join(apps, f"app{i}.desktop"), "w", encoding="utf-8") as file:
+            file.write(f"[Desktop Entry]\nType=Application\nName={name}\nExec=/opt/app{i}/bin/app{i} %U\n")
+
+    def Timed(fn, rounds=1):
+        started = perf_counter()
+        for _ in range(rounds):
+            result = fn()
+        return result, (perf_counter() - started) / rounds
+
+    try:
+        index_path = os.path.join(root, "AppIndex.json")
+        sources = [(apps, "desktop", True)]
+        index = AppIndex(index_path, sources, refresh_interval=3600)
+        _, build = Timed(index.Refresh)
+        _, load = Timed(lambda: AppIndex(index_path, sources, refresh_interval=3600))
+        _, unchanged = Timed(index.Refresh, rounds=20)
+
+        target = names[count // 2]
+        exact, exact_time = Timed(lambda: index.index.Find(target, AppMatchThreshold), rounds=1000)
+        typo = target.replace(target.split()[0], target.split()[0][:-1] + "x", 1)
+        fuzzy, fuzzy_time = Timed(lambda: index.index.Find(typo, AppMatchThreshold), rounds=200)
+        cached, cached_time = Timed(lambda: index.FindApp(typo), rounds=1000)
+
+        with open(os.path.join(apps, "new.desktop"), "w", encoding="utf-8") as file:
+            file.write("[Desktop Entry]\nType=Application\nName=Freshly Installed\nExec=/opt/fresh\n")
+        os.utime(apps, (os.stat(apps).st_atime, os.stat(apps).st_mtime + 1))
+        _, incremental = Timed(index.Refresh)
+        fresh = index.FindApp("freshly installed")
+
+        # PATH executables only match by exact name, never as a near miss of another request.
+        bin_dir = os.path.join(root, "bin")
+        os.makedirs(bin_dir)
+        for name in ("install", "chroot", "file", "gsettings"):
+            with open(os.path.join(bin_dir, name), "w") as file:
+                file.write("#!/bin/sh\n")
+            os.chmod(os.path.join(bin_dir, name), 0o755)
+        with open(os.path.join(apps, "files.desktop"), "w", encoding="utf-8") as file:
+            file.write("[Desktop Entry]\nType=Application\nName=Files\nExec=nautilus %U\n")
+        mixed = AppIndex(os.path.join(root, "Mixed.json"), [(apps, "desktop", True), (bin_dir, "executable", False)])
+        mixed.Refresh()
+        near_misses = {query: mixed.FindApp(query) for query in ("instagram", "chrome", "settings", "installer")}
+        files = mixed.FindApp("files")
+
+        failures = [label for label, ok in [
+            ("exact", exact and exact["name"] == target),
+            ("fuzzy", fuzzy and fuzzy["name"] == target),
+            ("cached", cached is fuzzy),
+            ("incremental", fresh and fresh["command"] == "/opt/fresh"),
+            ("executable exact", (mixed.FindApp("chroot") or {}).get("kind") == "executable"),
+            ("executable near misses", not any(near_misses.values())),
+            ("desktop over executable", files and files["command"] == "nautilus"),
+        ] if not ok]
+
+        print(f"{count} entries: full build {build * 1000:.0f} ms, load from JSON {load * 1000:.0f} ms, "
+              f"unchanged refresh {unchanged * 1e6:.0f} us, refresh after install {incremental * 1000:.0f} ms")
+        print(f"Lookup: exact {exact_time * 1e6:.1f} us, fuzzy '{typo}' {fuzzy_time * 1e6:.0f} us, cached {cached_time * 1e6:.1f} us")
+        print(f"{len(failures)} failure(s){': ' + ', '.join(failures) if failures else ''}.")
+        return not failures
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+app_index = AppIndex()
+app_index.RefreshInBackground()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if BenchmarkAppIndex() else 1)
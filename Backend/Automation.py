@@ -11,10 +11,21 @@ import keyboard
 import asyncio
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from Backend.AppIndex import app_index, Launch, Terminate
 
 env_vars = dotenv_values(".env")
 GroqAPIKey = env_vars.get("GroqAPIKey")
 Username = env_vars.get("Username", "User")
+AutomationWorkers = int(env_vars.get("AutomationWorkers", 4))
+# Extra threads for handlers that timed out but are still running; when they are all taken the pool is replaced.
+AutomationSpareWorkers = int(env_vars.get("AutomationSpareWorkers", 4))
+# Seconds a command may run before its result is given up on.
+DefaultCommandTimeout = float(env_vars.get("AutomationTimeout", 30))
+# Content topics generated at the same time; the rest wait for a free slot without holding an automation worker.
+ContentConcurrency = int(env_vars.get("ContentConcurrency", 2))
 
 if not GroqAPIKey:
     print("CRITICAL ERROR: GroqAPIKey not found in .env file. Please set it to use this module.")
@@ -64,6 +75,11 @@ def GoogleSearch(Topic):
         return False
 
 def Content(Topic):
+    """
+    Writes AI content for Topic to Data/<topic>.txt, streaming it to disk as it is
+    generated and opening the editor once the first text has landed. The finished
+    text replaces the file atomically.
+    """
     def OpenNotepad(File):
         default_text_editor = "notepad.exe"
         try:
@@ -74,7 +90,7 @@ def Content(Topic):
             return False
         return True
 
-    def ContentWriterAI(prompt):
+    def ContentWriterAI(prompt, OnChunk):
         current_messages = SystemChatBot + [{"role": "user", "content": prompt}]
         
         try:
@@ -90,29 +106,58 @@ def Content(Topic):
             Answer = ""
             for chunk in completion:
                 if chunk.choices[0].delta.content:
-                    Answer += chunk.choices[0].delta.content
+                    piece = chunk.choices[0].delta.content.replace("</s>", "")
+                    if not Answer:
+                        piece = piece.lstrip()
+                    if piece:
+                        Answer += piece
+                        OnChunk(piece)
             
-            Answer = Answer.replace("</s>", "").strip()
+            Answer = Answer.strip()
             print(f"DEBUG: AI generated content: '{Answer[:50]}...'")
             return Answer
         except Exception as e:
             print(f"ERROR: Groq API content generation failed: {e}")
-            return "I am sorry, I am unable to generate content right now."
+            return None
 
     Topic = Topic.removeprefix("content").strip()
-    ContentByAI = ContentWriterAI(Topic)
-    
     file_name = os.path.join("Data", f"{Topic.lower().replace(' ', '_')}.txt")
-    
+
+    started = perf_counter()
+    first_byte = [None]
     try:
         with open(file_name, "w", encoding="utf-8") as file:
+            def WriteChunk(piece):
+                file.write(piece)
+                file.flush()
+                if first_byte[0] is None:
+                    first_byte[0] = perf_counter()
+                    print(f"DEBUG: First content for '{Topic}' on disk after {(first_byte[0] - started) * 1000:.0f} ms.")
+                    OpenNotepad(file_name)
+
+            ContentByAI = ContentWriterAI(Topic, WriteChunk)
+    except IOError as e:
+        print(f"ERROR: Failed to write file '{file_name}': {e}")
+        return False
+
+    if ContentByAI is None:
+        if first_byte[0] is not None:
+            # Keep whatever was streamed before the failure.
+            return False
+        ContentByAI = "I am sorry, I am unable to generate content right now."
+    # The streamed file is replaced in one step with the cleaned-up final text.
+    temp_name = file_name + ".tmp"
+    try:
+        with open(temp_name, "w", encoding="utf-8") as file:
             file.write(ContentByAI)
-        print(f"DEBUG: AI content saved to '{file_name}'.")
-        OpenNotepad(file_name)
+        os.replace(temp_name, file_name)
+        print(f"DEBUG: AI content saved to '{file_name}' in {(perf_counter() - started):.1f}s.")
     except IOError as e:
-        print(f"ERROR: Failed to save or open file '{file_name}': {e}")
+        print(f"ERROR: Failed to save file '{file_name}': {e}")
         return False
-    
+
+    if first_byte[0] is None:
+        OpenNotepad(file_name)
     return True
 
 def YouTubeSearch(Topic):
@@ -135,6 +180,14 @@ def PlayYouTube(Query):
         return False
 
 def OpenApp(app):
+    entry = app_index.FindApp(app)
+    if entry:
+        try:
+            Launch(entry)
+            print(f"DEBUG: Opened '{entry['name']}' from the application index for '{app}'.")
+            return True
+        except Exception as e:
+            print(f"WARNING: Launching indexed app '{entry['name']}' failed: {e}. Trying AppOpener.")
     try:
         appopen(app, match_closest=True, output=False, throw_errors=True)
         print(f"DEBUG: Opened app via AppOpener: '{app}'")
@@ -153,6 +206,11 @@ def CloseApp(app):
     if "chrome" in app.lower():
         print("DEBUG: Skipping close command for Chrome (potentially unstable).")
         return True
+    pids = app_index.FindProcesses(app)
+    if pids:
+        closed = Terminate(pids)
+        print(f"DEBUG: Closed {closed} process(es) matching '{app}'.")
+        return closed > 0
     try:
         close(app, match_closest=True, output=True, throw_error=True)
         print(f"DEBUG: Closed app via AppOpener: '{app}'")
@@ -176,43 +234,246 @@ def System(command):
         return False
     return True
 
-async def TranslateAndExecute(commands: list[str]):
-    funcs = []
+class CommandRegistry:
+    """
+    Word-level prefix trie from command prefixes ("open", "google search", ...) to
+    handlers. Lookup() finds the longest registered prefix in one walk over the words.
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.limits = {}
+        self._gates = {}
+        self._loop = None
+
+    def Register(self, prefix, handler, timeout=DefaultCommandTimeout, concurrency=None):
+        """
+        handler=None marks a prefix that is recognised but handled elsewhere (e.g. 'general').
+        concurrency limits how many of this prefix's commands run at once; the rest queue
+        before they take an automation worker.
+        """
+        node = self.root
+        for word in prefix.lower().split():
+            node = node.setdefault(word, {})
+        node[None] = (prefix, handler, timeout)
+        if concurrency is not None:
+            self.limits[prefix] = concurrency
+
+    def Gate(self, prefix):
+        """The semaphore that queues prefix's commands on the running loop, or None if it is unlimited."""
+        if prefix not in self.limits:
+            return None
+        # asyncio semaphores belong to the loop that created them.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._gates = {}
+        if prefix not in self._gates:
+            self._gates[prefix] = asyncio.Semaphore(self.limits[prefix])
+        return self._gates[prefix]
+
+    def Lookup(self, command):
+        """Returns (prefix, handler, timeout, argument) for command, or None if nothing matches."""
+        words = command.strip().lower().split()
+        node = self.root
+        match = None
+        for depth, word in enumerate(words):
+            node = node.get(word)
+            if node is None:
+                break
+            if None in node:
+                match = node[None] + (" ".join(words[depth + 1:]),)
+        return match
+
+
+registry = CommandRegistry()
+registry.Register("open", OpenApp, timeout=15)
+registry.Register("close", CloseApp, timeout=15)
+registry.Register("play", PlayYouTube, timeout=20)
+registry.Register("content", Content, timeout=60, concurrency=ContentConcurrency)
+registry.Register("google search", GoogleSearch, timeout=15)
+registry.Register("youtube", YouTubeSearch, timeout=15)
+registry.Register("system", System, timeout=5)
+registry.Register("general", None)
+registry.Register("realtime", None)
+
+class AutomationPool:
+    """
+    Bounded thread pool for blocking handlers (AppOpener, pywhatkit, Groq). At most
+    `workers` handlers run at once. A handler that times out cannot be interrupted,
+    so its thread is written off: its slot is freed for the next command and it runs
+    on in one of `spare` extra executor threads. Once every spare thread is held by
+    such a handler, new commands go to a fresh executor.
+    """
+
+    def __init__(self, workers=AutomationWorkers, spare=AutomationSpareWorkers):
+        self.workers = workers
+        self.spare = spare
+        self.executor = self._NewExecutor()
+        self.leaked = 0
+        self.replaced = 0
+        self._slots = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _NewExecutor(self):
+        return ThreadPoolExecutor(max_workers=self.workers + self.spare, thread_name_prefix="Automation")
+
+    def _Slots(self):
+        # asyncio semaphores belong to the loop that created them.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    async def Run(self, handler, argument, timeout):
+        """Runs handler(argument) on a worker. timeout covers waiting for a free worker and the call itself."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        slots = self._Slots()
+        await asyncio.wait_for(slots.acquire(), timeout)
+        try:
+            with self._lock:
+                executor = self.executor
+            job = executor.submit(handler, argument)
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                self._Leak(executor, job)
+                raise
+        finally:
+            slots.release()
+
+    def _Leak(self, executor, job):
+        with self._lock:
+            if executor is not self.executor:
+                return
+            self.leaked += 1
+            if self.leaked < self.spare:
+                job.add_done_callback(lambda _: self._Recovered(executor))
+                return
+            # Every spare thread is stuck; keep them running but stop feeding this executor.
+            self.executor = self._NewExecutor()
+            self.leaked = 0
+            self.replaced += 1
+        print(f"WARNING: {self.spare} automation handlers are stuck; replaced the automation pool.")
+        executor.shutdown(wait=False)
+
+    def _Recovered(self, executor):
+        with self._lock:
+            if executor is self.executor:
+                self.leaked -= 1
+
+
+automation_pool = AutomationPool()
+
+async def RunCommand(command, handler, argument, timeout, pool, gate=None):
+    """Runs one command on pool. A gated command waits for its gate first; that wait is not part of timeout."""
+    try:
+        if gate is None:
+            return command, await pool.Run(handler, argument, timeout)
+        requested = perf_counter()
+        async with gate:
+            waited = perf_counter() - requested
+            if waited > 0.01:
+                print(f"DEBUG: Automation command '{command}' waited {waited * 1000:.0f} ms for its turn.")
+            return command, await pool.Run(handler, argument, timeout)
+    except asyncio.TimeoutError:
+        # The worker thread cannot be interrupted; its result is simply dropped.
+        print(f"WARNING: Automation command '{command}' timed out after {timeout}s.")
+    except Exception as e:
+        print(f"ERROR: Automation command '{command}' failed: {e}")
+    return command, False
+
+async def TranslateAndExecute(commands: list[str], commands_registry=registry, pool=automation_pool):
+    """Starts every recognised command at once and yields (command, result) as each one finishes."""
+    tasks = []
     for command in commands:
         command = command.strip()
-        if command.lower().startswith("open "):
-            app_name = command.lower().removeprefix("open").strip()
-            funcs.append(asyncio.to_thread(OpenApp, app_name))
-        elif command.lower().startswith("close "):
-            app_name = command.lower().removeprefix("close").strip()
-            funcs.append(asyncio.to_thread(CloseApp, app_name))
-        elif command.lower().startswith("play "):
-            query = command.lower().removeprefix("play").strip()
-            funcs.append(asyncio.to_thread(PlayYouTube, query))
-        elif command.lower().startswith("content "):
-            topic = command.lower().removeprefix("content").strip()
-            funcs.append(asyncio.to_thread(Content, topic))
-        elif command.lower().startswith("google search "):
-            topic = command.lower().removeprefix("google search").strip()
-            funcs.append(asyncio.to_thread(GoogleSearch, topic))
-        elif command.lower().startswith("Youtube "):
-            topic = command.lower().removeprefix("Youtube").strip()
-            funcs.append(asyncio.to_thread(YouTubeSearch, topic))
-        elif command.lower().startswith("system "):
-            sys_command = command.lower().removeprefix("system").strip()
-            funcs.append(asyncio.to_thread(System, sys_command))
-        elif command.lower().startswith("general ") or command.lower().startswith("realtime "):
-            pass
-        else:
+        match = commands_registry.Lookup(command)
+        if match is None:
             print(f"WARNING: No automation function found for command: '{command}'")
-    
-    results = await asyncio.gather(*funcs)
-    
-    for result in results:
-        yield result
+            continue
+        prefix, handler, timeout, argument = match
+        if handler is not None:
+            tasks.append(RunCommand(command, handler, argument, timeout, pool, commands_registry.Gate(prefix)))
+
+    for next_done in asyncio.as_completed(tasks):
+        yield await next_done
 
 async def Automation(commands: list[str]):
     print(f"DEBUG: Automation module received commands: {commands}")
-    async for result in TranslateAndExecute(commands):
-        print(f"DEBUG: Automation task completed with result: {result}")
-    return True
\ No newline at end of file
+    async for command, result in TranslateAndExecute(commands):
+        print(f"DEBUG: Automation task '{command}' completed with result: {result}")
+    return True
+
+def BenchmarkAutomation(count=50, slow_every=10, slow_seconds=3.0, timeout=1.5):
+    """
+    Runs count mixed commands against stand-in handlers (every slow_every-th one hangs
+    for slow_seconds) and compares the old gather-then-yield approach with the registry.
+    Then checks that handlers that never return cannot starve later commands.
+    """
+    from random import uniform
+    from time import sleep as blocking_sleep
+
+    def Handler(argument):
+        blocking_sleep(slow_seconds if argument.endswith("slow") else uniform(0.02, 0.2))
+        return True
+
+    prefixes = ["open", "close", "play", "content", "google search", "Youtube", "system"]
+    commands = [
+        f"{prefixes[i % len(prefixes)]} item{i}{' slow' if i % slow_every == 0 else ''}"
+        for i in range(count)
+    ]
+    bench_registry = CommandRegistry()
+    for prefix in prefixes:
+        bench_registry.Register(prefix, Handler, timeout=timeout)
+
+    async def GatherThenYield():
+        jobs = [asyncio.to_thread(Handler, bench_registry.Lookup(c)[3]) for c in commands]
+        for result in await asyncio.gather(*jobs):
+            yield result
+
+    async def Measure(results):
+        started = perf_counter()
+        first = None
+        async for _ in results:
+            if first is None:
+                first = perf_counter() - started
+        return first, perf_counter() - started
+
+    hung = threading.Event()
+
+    def Hang(argument):
+        hung.wait()
+        return True
+
+    async def Run():
+        pool = AutomationPool(workers=AutomationWorkers * 2)
+        old = await Measure(GatherThenYield())
+        new = await Measure(TranslateAndExecute(commands, bench_registry, pool))
+
+        # More hanging handlers than workers and spare threads together, then ordinary commands.
+        stuck_registry = CommandRegistry()
+        stuck_registry.Register("hang", Hang, timeout=0.3)
+        stuck_registry.Register("open", Handler, timeout=timeout)
+        stuck = AutomationPool(workers=2, spare=2)
+        hangs = [f"hang {i}" for i in range(stuck.workers + stuck.spare + 2)]
+        started = perf_counter()
+        results = [r async for r in TranslateAndExecute(hangs + ["open after"] * 4, stuck_registry, stuck)]
+        after = [result for command, result in results if command == "open after"]
+        recovered = (len(after) == 4 and all(after), perf_counter() - started, stuck.replaced)
+        hung.set()
+        return old, new, recovered
+
+    old, new, recovered = asyncio.run(Run())
+    print(f"{count} commands, {count // slow_every} hanging for {slow_seconds}s:")
+    print(f"  gather then yield:  first result {old[0]:.2f}s, all results {old[1]:.2f}s")
+    print(f"  registry + timeout: first result {new[0]:.2f}s, all results {new[1]:.2f}s")
+    print(f"Commands after 6 hung handlers on a 2+2 thread pool: {'all ran' if recovered[0] else 'STARVED'} "
+          f"in {recovered[1]:.2f}s (pool replaced {recovered[2]} time(s)).")
+    return recovered[0]
+
+if __name__ == "__main__":
+    sys.exit(0 if BenchmarkAutomation() else 1)
@@ -0,0 +1,336 @@
+import json
+import os
+import shutil
+import threading
+from time import perf_counter
+
+CHAT_LOG_DIR = os.path.join("Data", "ChatLog")
+LEGACY_CHAT_LOG_PATH = os.path.join("Data", "ChatLog.json")
+
+# Only the conversation itself is persisted; system context is rebuilt per request.
+CONVERSATION_ROLES = ("user", "assistant")
+
+
+def IsConversationMessage(message):
+    return message.get("role") in CONVERSATION_ROLES
+
+
+class ChatLogStore:
+    """
+    Append-only chat log split into JSONL segment files.
+
+    Each segment is named after the index of its first message, so the file
+    names double as the offset index: sealed segments never change and only
+    the last one is scanned on startup. A torn final line left by a crash is
+    truncated away when the store is opened, and so is a compaction that was
+    interrupted halfway through its directory swap. The generation number changes
+    whenever existing offsets are invalidated (reset or compaction).
+    """
+
+    def __init__(self, directory=CHAT_LOG_DIR, segment_size=1000, durable=True):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.durable = durable
+        self._lock = threading.RLock()
+        self._starts = []
+        self._count = 0
+        self._handle = None
+        self.generation = 0
+        self._RecoverCompaction()
+        os.makedirs(directory, exist_ok=True)
+        self._Open()
+
+    def _SegmentPath(self, start):
+        return os.path.join(self.directory, f"{start:012d}.jsonl")
+
+    def _MetaPath(self):
+        return os.path.join(self.directory, "meta.json")
+
+    def _StagingPath(self):
+        return self.directory + ".compact"
+
+    def _OldPath(self):
+        return self.directory + ".old"
+
+    def _RecoverCompaction(self):
+        # Compact() moves the log to .old, then the finished .compact to the log, then
+        # deletes .old. A crash between the two moves leaves no log directory; the
+        # staged log is used if it was completed (its meta.json is written last),
+        # otherwise the old one is put back. Leftovers are removed either way.
+        staging_dir, old_dir = self._StagingPath(), self._OldPath()
+        if not os.path.isdir(self.directory):
+            if os.path.exists(os.path.join(staging_dir, "meta.json")):
+                os.replace(staging_dir, self.directory)
+                print(f"WARNING: Finished an interrupted chat log compaction in {self.directory}.")
+            elif os.path.isdir(old_dir):
+                os.replace(old_dir, self.directory)
+                print(f"WARNING: Rolled back an interrupted chat log compaction in {self.directory}.")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def _WriteGeneration(self, generation):
+        temp_path = self._MetaPath() + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"generation": generation}, file)
+        os.replace(temp_path, self._MetaPath())
+        self.generation = generation
+
+    def _Open(self):
+        try:
+            with open(self._MetaPath(), "r", encoding="utf-8") as file:
+                self.generation = json.load(file).get("generation", 0)
+        except (IOError, ValueError):
+            self.generation = 0
+        self._starts = sorted(
+            int(name.split(".")[0]) for name in os.listdir(self.directory)
+            if name.endswith(".jsonl") and name.split(".")[0].isdigit()
+        )
+        if not self._starts:
+            self._count = 0
+            return
+        last_count = self._RecoverSegment(self._SegmentPath(self._starts[-1]))
+        self._count = self._starts[-1] + last_count
+
+    def _RecoverSegment(self, path):
+        """Drops any partial or unparsable tail from a segment and returns its line count."""
+        with open(path, "rb") as file:
+            data = file.read()
+        good_end = 0
+        count = 0
+        position = 0
+        while position < len(data):
+            newline = data.find(b"\n", position)
+            if newline == -1:
+                break
+            try:
+                json.loads(data[position:newline])
+            except ValueError:
+                break
+            count += 1
+            position = newline + 1
+            good_end = position
+        if good_end != len(data):
+            print(f"WARNING: Recovered chat log segment {path}, dropped {len(data) - good_end} trailing bytes.")
+            with open(path, "r+b") as file:
+                file.truncate(good_end)
+        return count
+
+    def _ActiveHandle(self):
+        if not self._starts or self._count - self._starts[-1] >= self.segment_size:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+            self._starts.append(self._count)
+        if self._handle is None:
+            self._handle = open(self._SegmentPath(self._starts[-1]), "a", encoding="utf-8")
+        return self._handle
+
+    def Append(self, message):
+        self.Extend([message])
+
+    def Extend(self, messages):
+        with self._lock:
+            for message in messages:
+                handle = self._ActiveHandle()
+                handle.write(json.dumps(message, ensure_ascii=False) + "\n")
+                self._count += 1
+                if self._count - self._starts[-1] >= self.segment_size:
+                    self._Sync(handle)
+            if self._handle:
+                self._Sync(self._handle)
+
+    def _Sync(self, handle):
+        handle.flush()
+        if self.durable:
+            os.fsync(handle.fileno())
+
+    def Count(self):
+        with self._lock:
+            return self._count
+
+    def IterRange(self, start, end=None):
+        """Yields messages [start, end) one segment at a time, skipping segments outside that range."""
+        with self._lock:
+            end = self._count if end is None else min(end, self._count)
+            if self._handle:
+                self._handle.flush()
+            starts = list(self._starts)
+        for i, seg_start in enumerate(starts):
+            seg_end = starts[i + 1] if i + 1 < len(starts) else end
+            if seg_end <= start or seg_start >= end:
+                continue
+            with self._lock:
+                with open(self._SegmentPath(seg_start), "r", encoding="utf-8") as file:
+                    lines = file.readlines()
+            for line in lines[max(start - seg_start, 0):end - seg_start]:
+                yield json.loads(line)
+
+    def IterReverse(self, end=None):
+        """Yields (index, message) pairs from newest to oldest, reading one segment at a time."""
+        with self._lock:
+            end = self._count if end is None else min(end, self._count)
+            if self._handle:
+                self._handle.flush()
+            starts = list(self._starts)
+        for i in range(len(starts) - 1, -1, -1):
+            seg_start = starts[i]
+            if seg_start >= end:
+                continue
+            with self._lock:
+                with open(self._SegmentPath(seg_start), "r", encoding="utf-8") as file:
+                    lines = file.readlines()[:end - seg_start]
+            for offset in range(len(lines) - 1, -1, -1):
+                yield seg_start + offset, json.loads(lines[offset])
+
+    def ReadRange(self, start, end=None):
+        """Returns messages [start, end) without touching segments outside that range."""
+        return list(self.IterRange(start, end))
+
+    def Tail(self, n):
+        with self._lock:
+            return self.ReadRange(max(self._count - n, 0))
+
+    def ReadAll(self):
+        return self.ReadRange(0)
+
+    def ReadConversation(self):
+        """Returns the stored user/assistant turns, skipping system entries left by older logs."""
+        return [message for message in self.ReadAll() if IsConversationMessage(message)]
+
+    def Reset(self):
+        with self._lock:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+            for start in self._starts:
+                os.remove(self._SegmentPath(start))
+            self._starts = []
+            self._count = 0
+            self._WriteGeneration(self.generation + 1)
+
+    def Compact(self):
+        """
+        Rewrites the log without system entries. The new segments are built in a
+        side directory and swapped in, so a crash leaves either the old or the new log.
+        Returns (messages_before, messages_after).
+        """
+        with self._lock:
+            messages = self.ReadAll()
+            kept = [message for message in messages if IsConversationMessage(message)]
+            if len(kept) == len(messages):
+                return len(messages), len(kept)
+
+            self.Close()
+            staging_dir, old_dir = self._StagingPath(), self._OldPath()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            # A leftover .old would make the first move below fail.
+            shutil.rmtree(old_dir, ignore_errors=True)
+            staging = ChatLogStore(staging_dir, self.segment_size, self.durable)
+            staging.Extend(kept)
+            staging.Close()
+            staging._WriteGeneration(self.generation + 1)
+
+            os.replace(self.directory, old_dir)
+            os.replace(staging_dir, self.directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            self._Open()
+            print(f"DEBUG: Compacted chat log from {len(messages)} to {len(kept)} messages.")
+            return len(messages), len(kept)
+
+    def Close(self):
+        with self._lock:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+
+    def MigrateFromJson(self, path=LEGACY_CHAT_LOG_PATH):
+        """One-shot import of the old single-file ChatLog.json, which is then renamed aside."""
+        if not os.path.exists(path):
+            return 0
+        with self._lock:
+            if self._count:
+                print(f"WARNING: Chat log store already has messages, not migrating {path}.")
+                return 0
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    content = file.read().strip()
+                messages = json.loads(content) if content else []
+            except (ValueError, IOError) as e:
+                print(f"ERROR: Could not migrate {path}: {e}")
+                return 0
+            messages = [message for message in messages if IsConversationMessage(message)]
+            self.Extend(messages)
+            os.replace(path, path + ".migrated")
+            print(f"DEBUG: Migrated {len(messages)} messages from {path} into {self.directory}.")
+            return len(messages)
+
+
+# Main calls chat_log.MigrateFromJson() at startup; importing this module never touches Data/ChatLog.json.
+chat_log = ChatLogStore()
+
+
+def BenchmarkChatLog(sizes=(100, 1000, 10000, 100000), turns=50):
+    """Prints the per-turn write cost of the segment store against a full JSON rewrite."""
+    import tempfile
+    message = {"role": "user", "content": "Tell me something interesting about the moon."}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = ChatLogStore(os.path.join(directory, "log"), durable=False)
+            store.Extend([message] * size)
+            start = perf_counter()
+            for _ in range(turns):
+                store.Extend([message, message])
+            store_cost = (perf_counter() - start) / turns * 1000
+            store.Close()
+
+            json_cost = None
+            if size <= 10000:
+                json_path = os.path.join(directory, "ChatLog.json")
+                history = [message] * size
+                start = perf_counter()
+                for _ in range(turns):
+                    history += [message, message]
+                    with open(json_path, "w") as f:
+                        json.dump(history, f, indent=4)
+                json_cost = (perf_counter() - start) / turns * 1000
+
+        json_text = f"{json_cost:.3f} ms" if json_cost is not None else "skipped"
+        print(f"{size:>7} messages: segment store {store_cost:.3f} ms/turn, ChatLog.json rewrite {json_text}/turn")
+
+
+def ReportSystemPromptBloat(turns=1000):
+    """
+    Replays a conversation with the old ChatBot() persistence, which saved the two
+    system messages in front of the whole history every turn, and compares the
+    log file and next-request payload against storing only the conversation.
+    """
+    from Backend.Chatbot import SystemChatBot, RealtimeInformation
+
+    def Size(messages, indent=None):
+        return len(json.dumps(messages, indent=indent).encode("utf-8"))
+
+    old_log = []
+    new_log = []
+    for turn in range(turns):
+        user = {"role": "user", "content": f"Question number {turn}: what should I know about this?"}
+        assistant = {"role": "assistant", "content": f"Here is a short answer to question number {turn}."}
+        old_log = SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + old_log + [user, assistant]
+        new_log += [user, assistant]
+
+    context = SystemChatBot + [{"role": "system", "content": RealtimeInformation()}]
+    compacted = [message for message in old_log if IsConversationMessage(message)]
+    print(f"Old log:       {len(old_log)} messages, file {Size(old_log, 4) / 1024:.1f} KiB, payload {Size(context + old_log) / 1024:.1f} KiB")
+    print(f"Compacted log: {len(compacted)} messages, file {Size(compacted, 4) / 1024:.1f} KiB, payload {Size(context + compacted) / 1024:.1f} KiB")
+    print(f"New log:       {len(new_log)} messages, file {Size(new_log, 4) / 1024:.1f} KiB, payload {Size(context + new_log) / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "compact":
+        before, after = chat_log.Compact()
+        print(f"Chat log compacted: {before} -> {after} messages.")
+    elif len(sys.argv) > 1 and sys.argv[1] == "bloat":
+        ReportSystemPromptBloat()
+    else:
+        BenchmarkChatLog()
@@ -1,7 +1,9 @@
 from groq import Groq  # Importing the Groq library
-from json import load, dump  # Importing JSON functions
 import datetime  # Importing datetime module
+from time import perf_counter  # For streaming latency timings
 from dotenv import dotenv_values  # For loading .env variables
+from Backend.ChatLogStore import chat_log  # Append-only chat history
+from Backend.ContextWindow import ContextWindow  # Token-budgeted prompt packing
 
 # Load environment variables from the .env file
 env_vars = dotenv_values(".env")
@@ -10,13 +12,12 @@ env_vars = dotenv_values(".env")
 Username = env_vars.get("Username",)  # Default to "Nikhil" if not set
 Assistantname = env_vars.get("Assistantname", )  # Default to "Jarvis" if not set
 GroqAPIKey = env_vars.get("GroqAPIKey")
+# Tries per question when the model rejects the prompt as too long; each retry halves the history budget.
+ChatAttempts = int(env_vars.get("ChatAttempts", 3))
 
 # Initialize the Groq client
 client = Groq(api_key=GroqAPIKey)
 
-# Initialize an empty list to store chat messages
-messages = []
-
 System = f"""Hello, I am{Assistantname} {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which also has real-time up-to-date information from the internet.
 *** Do not tell time until I ask, do not talk too much, just answer the question.***
 *** Reply in only English, even if the question is in Hindi, reply in English.***
@@ -27,14 +28,6 @@ SystemChatBot = [
     {"role": "system", "content": System}
 ]
 
-# Attempt to load the chat log from a JSON file
-try:
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)  # Load existing messages
-except FileNotFoundError:
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump([], f)
-
 # Real-time context data
 def RealtimeInformation():
     current_date_time = datetime.datetime.now()
@@ -52,6 +45,28 @@ def RealtimeInformation():
     data += f"Time: {hour} hours: {minute} minutes: {second} seconds.\n"
     return data
 
+# Fold older turns into the rolling summary used by the context window
+def SummarizeConversation(PreviousSummary, Messages):
+    transcript = "\n".join(
+        f"{Username if m['role'] == 'user' else Assistantname}: {m['content']}" for m in Messages
+    )
+    try:
+        completion = client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "system", "content": "Summarize the conversation in under 200 words. Keep names, facts, preferences and open questions."},
+                {"role": "user", "content": f"Existing summary:\n{PreviousSummary or 'None'}\n\nNew conversation:\n{transcript}"}
+            ],
+            max_tokens=400,
+            temperature=0.3
+        )
+        return completion.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"ERROR: Could not summarize conversation: {e}")
+        return None
+
+context_window = ContextWindow(chat_log, summarize=SummarizeConversation)
+
 # Clean AI response output
 def AnswerModifier(Answer):
     lines = Answer.split('\n')
@@ -59,16 +74,33 @@ def AnswerModifier(Answer):
     modified_answer = '\n'.join(non_empty_lines)
     return modified_answer
 
-# Main chatbot function
-def ChatBot(Query):
-    try:
-        with open(r"Data\ChatLog.json", "r") as f:
-            messages = load(f)
+# True if the API rejected the request because the prompt does not fit the model's context
+def IsContextLengthError(error):
+    text = str(error).lower()
+    return any(marker in text for marker in ("context_length", "context length", "context window", "reduce the length"))
 
-        messages.append({"role": "user", "content": f"{Query}"})
+# Log one question/answer turn; used directly for answers produced with Persist=False
+def RecordExchange(Query, Answer):
+    chat_log.Extend([{"role": "user", "content": f"{Query}"}, {"role": "assistant", "content": Answer}])
 
-        # ✅ This line should be indented like this
-        messages = SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + messages
+# Main chatbot function
+# OnToken, if given, is called with each piece of the answer as it streams in.
+# Persist=False leaves the chat log untouched (speculative answers); Cancel is a
+# threading.Event that stops streaming early, in which case None is returned.
+# A prompt that is too long for the model is retried with less history, up to
+# ChatAttempts times; the chat log itself is never cleared.
+def ChatBot(Query, OnToken=None, Persist=True, Cancel=None, Attempt=1):
+    try:
+        started = perf_counter()
+        user_message = {"role": "user", "content": f"{Query}"}
+
+        # System context is assembled per request and never written to the log;
+        # history is packed newest-first into the token budget.
+        messages = context_window.Build(
+            SystemChatBot + [{"role": "system", "content": RealtimeInformation()}],
+            user_message,
+            budget=context_window.budget >> (Attempt - 1)
+        )
 
         completion = client.chat.completions.create(
             model="llama3-70b-8192",
@@ -81,31 +113,43 @@ def ChatBot(Query):
 
         # Streamed response
         Answer = ""
+        first_token_at = None
         for chunk in completion:
-            if hasattr(chunk.choices[0].delta, "content"):
-                Answer += chunk.choices[0].delta.content
+            if Cancel is not None and Cancel.is_set():
+                print("DEBUG: ChatBot answer cancelled.")
+                return None
+            content = chunk.choices[0].delta.content
+            if content:
+                if first_token_at is None:
+                    first_token_at = perf_counter()
+                Answer += content
+                if OnToken:
+                    OnToken(content.replace("</s>", ""))
 
         Answer = Answer.replace("</s>", "")
+        if first_token_at is not None:
+            print(f"DEBUG: ChatBot first token after {(first_token_at - started) * 1000:.0f} ms, full answer after {(perf_counter() - started) * 1000:.0f} ms.")
 
-        # Add assistant reply to log
-        messages.append({"role": "assistant", "content": Answer})
-
-        # Save chat log
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump(messages, f, indent=4)
+        # Append only this turn to the log
+        if Persist:
+            chat_log.Extend([user_message, {"role": "assistant", "content": Answer}])
 
         return AnswerModifier(Answer)
 
     except Exception as e:
-        print(f"Error: {e}")
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump([], f, indent=4)
-        return ChatBot(Query)  # Retry
+        if IsContextLengthError(e) and Attempt < ChatAttempts:
+            print(f"WARNING: ChatBot prompt too long, retrying with less history: {e}")
+            # The caller's final text replaces any partial stream.
+            return ChatBot(Query, OnToken=OnToken, Persist=Persist, Cancel=Cancel, Attempt=Attempt + 1)
+        print(f"ERROR: ChatBot failed: {e}")
+        if not Persist:
+            raise
+        return f"An unexpected error occurred while generating the answer: {str(e)}"
 
 # Entry point
 if __name__ == "__main__":
     while True:
         user_input = input("Enter Your Questions: ")
-        print(ChatBot(user_input))
+        print(ChatBot(user_input, OnToken=lambda token: print(token, end="", flush=True)))
 
 
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+
+# llama3-70b-8192 has an 8192 token window and ChatBot() asks for up to 1024 back.
+ContextBudget = int(env_vars.get("ContextBudget", 6500))
+SummaryBudget = int(env_vars.get("SummaryBudget", 600))
+SummaryChunkTokens = int(env_vars.get("SummaryChunkTokens", 3000))
+SummaryRefreshMessages = int(env_vars.get("SummaryRefreshMessages", 10))
+TokenizerModel = env_vars.get("TokenizerModel", "hf-internal-testing/llama-tokenizer")
+
+SUMMARY_PATH = os.path.join("Data", "ChatSummary.json")
+LOCAL_TOKENIZER_PATH = os.path.join("Data", "tokenizer.json")
+
+# Chat formats wrap every message in a few special tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """Counts message tokens with the `tokenizers` package, caching each message's count."""
+
+    def __init__(self, model=TokenizerModel, cache_size=50000):
+        self.model = model
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._tokenizer = None
+        threading.Thread(target=self._Load, daemon=True).start()
+
+    def _Load(self):
+        try:
+            from tokenizers import Tokenizer
+            if os.path.exists(LOCAL_TOKENIZER_PATH):
+                self._tokenizer = Tokenizer.from_file(LOCAL_TOKENIZER_PATH)
+            else:
+                self._tokenizer = Tokenizer.from_pretrained(self.model)
+            print(f"DEBUG: Tokenizer '{self.model}' loaded for context accounting.")
+        except Exception as e:
+            print(f"WARNING: Could not load tokenizer, estimating token counts instead: {e}")
+
+    def Count(self, message):
+        key = (message.get("role"), message.get("content", ""))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        tokenizer = self._tokenizer
+        if tokenizer is None:
+            # Rough upper bound until the tokenizer is ready; not cached.
+            return len(key[1]) // 3 + MESSAGE_OVERHEAD_TOKENS
+
+        count = len(tokenizer.encode(key[1], add_special_tokens=False).ids) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self._cache[key] = count
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return count
+
+    def Truncate(self, text, max_tokens):
+        """Returns the longest prefix of text that is at most max_tokens tokens."""
+        if max_tokens <= 0:
+            return ""
+        tokenizer = self._tokenizer
+        if tokenizer is None:
+            # Same rough three-characters-per-token estimate as Count().
+            return text[:max_tokens * 3]
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= max_tokens:
+            return text
+        return text[:encoding.offsets[max_tokens - 1][1]]
+
+
+class ContextWindow:
+    """
+    Packs the newest chat log turns into a fixed token budget. Turns that no longer
+    fit are folded into a rolling summary, refreshed on a background thread and
+    persisted to Data/ChatSummary.json, so the prompt size stays bounded.
+    """
+
+    def __init__(self, store, summarize=None, budget=ContextBudget, counter=None, summary_path=SUMMARY_PATH):
+        self.store = store
+        self.summarize = summarize
+        self.budget = budget
+        self.counter = counter or TokenCounter()
+        self.summary_path = summary_path
+        self._summary = self._LoadSummary()
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _LoadSummary(self):
+        try:
+            with open(self.summary_path, "r", encoding="utf-8") as file:
+                summary = json.load(file)
+            if summary.get("generation") == self.store.generation:
+                return summary
+        except (IOError, ValueError):
+            pass
+        return {"generation": self.store.generation, "upto": 0, "text": ""}
+
+    def _SaveSummary(self, summary):
+        temp_path = self.summary_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(summary, file)
+            os.replace(temp_path, self.summary_path)
+        except IOError as e:
+            print(f"ERROR: Could not save chat summary: {e}")
+
+    def Build(self, system_messages, query_message, budget=None):
+        """
+        Returns system messages, the summary if needed, the newest turns that fit, and the query.
+        budget overrides the window's token budget for this call only.
+        """
+        with self._lock:
+            if self._summary["generation"] != self.store.generation:
+                self._summary = {"generation": self.store.generation, "upto": 0, "text": ""}
+            summary = dict(self._summary)
+
+        remaining = (budget or self.budget) - sum(self.counter.Count(m) for m in system_messages) - self.counter.Count(query_message)
+        kept = []
+        cut = 0
+        for index, message in self.store.IterReverse():
+            if message.get("role") not in ("user", "assistant"):
+                continue
+            tokens = self.counter.Count(message)
+            if tokens > remaining:
+                cut = index + 1
+                break
+            kept.append((tokens, message, index))
+            remaining -= tokens
+
+        summary_messages = []
+        if cut:
+            # The summary is cut down to SummaryBudget, and its real size is what gets reserved.
+            header = "Summary of the earlier conversation:\n"
+            text = self.counter.Truncate(summary["text"], SummaryBudget - self.counter.Count({"role": "system", "content": header}))
+            summary_message = {"role": "system", "content": header + text}
+            reserve = self.counter.Count(summary_message) if summary["text"] else 0
+            while kept and remaining < reserve:
+                tokens, _, index = kept.pop()
+                remaining += tokens
+                cut = index + 1
+            if summary["text"] and remaining >= reserve:
+                summary_messages.append(summary_message)
+            if cut - summary["upto"] >= SummaryRefreshMessages or (cut and not summary["text"]):
+                self._ScheduleRefresh(cut)
+
+        history = [message for _, message, _ in reversed(kept)]
+        return system_messages + summary_messages + history + [query_message]
+
+    def _ScheduleRefresh(self, target):
+        if not self.summarize:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._Refresh, args=(target,), daemon=True).start()
+
+    def _Refresh(self, target):
+        """Folds the turns before target into the summary with a single summarize call."""
+        try:
+            with self._lock:
+                summary = dict(self._summary)
+            if summary["upto"] >= target or summary["generation"] != self.store.generation:
+                return
+
+            # Take at most SummaryChunkTokens of the newest unsummarized turns; anything
+            # older than that (e.g. a freshly migrated log) is skipped rather than replayed.
+            chunk = []
+            tokens = 0
+            for index, message in self.store.IterReverse(target):
+                if index < summary["upto"] or tokens >= SummaryChunkTokens:
+                    break
+                if message.get("role") not in ("user", "assistant"):
+                    continue
+                chunk.append(message)
+                tokens += self.counter.Count(message)
+            chunk.reverse()
+
+            text = self.summarize(summary["text"], chunk) if chunk else summary["text"]
+            if text is None:
+                return
+            summary.update(upto=target, text=text)
+            with self._lock:
+                if self._summary["generation"] == summary["generation"]:
+                    self._summary = summary
+            self._SaveSummary(summary)
+            print(f"DEBUG: Chat summary now covers {target} messages.")
+        except Exception as e:
+            print(f"ERROR: Chat summary refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
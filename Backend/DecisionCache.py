@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from time import time
+from dotenv import dotenv_values
+from Backend.TextUtils import NormalizeQuery
+
+env_vars = dotenv_values(".env")
+DecisionCacheSize = int(env_vars.get("DecisionCacheSize", 500))
+
+DECISION_CACHE_PATH = os.path.join("Data", "DecisionCache.json")
+
+# Seconds a decision stays valid, by the function word it starts with. Automation
+# commands map to the same decision for a long time; questions are re-checked sooner.
+CategoryTTL = {
+    "open": 30 * 24 * 3600,
+    "close": 30 * 24 * 3600,
+    "play": 7 * 24 * 3600,
+    "system": 30 * 24 * 3600,
+    "content": 7 * 24 * 3600,
+    "google search": 7 * 24 * 3600,
+    "Youtube": 7 * 24 * 3600,
+    "generate image": 7 * 24 * 3600,
+    "exit": 30 * 24 * 3600,
+    "general": 10 * 60,
+    "realtime": 10 * 60,
+    "reminder": 0,
+}
+
+
+def DecisionTTL(decision):
+    """The shortest TTL of any item in the decision; unknown categories are not cached."""
+    ttls = []
+    for item in decision:
+        category = next((func for func in CategoryTTL if item.startswith(func)), None)
+        ttls.append(CategoryTTL.get(category, 0))
+    return min(ttls) if ttls else 0
+
+
+class DecisionCache:
+    """Bounded LRU of DMM decisions keyed by the normalized prompt, persisted to JSON."""
+
+    def __init__(self, path=DECISION_CACHE_PATH, max_entries=DecisionCacheSize):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._Load()
+
+    def _Load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+        except (IOError, ValueError):
+            return
+        now = time()
+        for key, (decision, expires_at) in stored.items():
+            if expires_at > now:
+                self._entries[key] = (decision, expires_at)
+
+    def _Save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(dict(self._entries), file)
+            os.replace(temp_path, self.path)
+        except IOError as e:
+            print(f"ERROR: Could not save DMM decision cache: {e}")
+
+    def Get(self, prompt):
+        key = NormalizeQuery(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def Put(self, prompt, decision):
+        ttl = DecisionTTL(decision)
+        if ttl <= 0:
+            return
+        key = NormalizeQuery(prompt)
+        with self._lock:
+            self._entries[key] = (list(decision), time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._Save()
+
+    def Stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+decision_cache = DecisionCache()
@@ -1,20 +1,33 @@
 import asyncio
 from random import randint
 from PIL import Image
-import requests
 from dotenv import dotenv_values # Use dotenv_values for clearer variable loading
 import os
-from time import sleep
+import sqlite3
+import sys
+import threading
+from time import sleep, perf_counter
+
+# The image worker imports this module as Backend.ImageGeneration (python -m Backend.ImageWorker).
+# The legacy request-file mode below still runs as "python Backend/ImageGeneration.py", which needs
+# the project root on the path for Backend.*
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Backend.Runtime import runtime
+from Backend.InferenceClient import InferenceClient
+from Backend.ImageStore import image_store
 
 # Load environment variables from .env file
 env_vars = dotenv_values(".env")
 HuggingFaceAPIKey = env_vars.get("HuggingFaceAPIKey")
+# Batches the worker generates at the same time; further batches wait in the queue.
+ImageJobConcurrency = int(env_vars.get("ImageJobConcurrency", 2))
+# Serve a prompt that was generated before from the image store instead of calling the API again.
+ImageReuse = str(env_vars.get("ImageReuse", "True")).strip().lower() == "true"
 
-# Ensure the Hugging Face API key is loaded
+# Ensure the Hugging Face API key is loaded. The worker keeps running without it
+# and reports each job as failed, so the assistant is told why.
 if not HuggingFaceAPIKey:
     print("Error: HuggingFaceAPIKey not found in .env file. Please make sure it's set.")
-    # In a production environment, you might want to exit here:
-    exit("Exiting due to missing HuggingFaceAPIKey.")
 
 # Ensure Data folder exists
 DATA_FOLDER = "Data"
@@ -31,24 +44,12 @@ if not os.path.exists(FRONTEND_FILES_FOLDER):
 # Define the path to the ImageGeneration.data file
 IMAGE_GEN_DATA_FILE = os.path.join(FRONTEND_FILES_FOLDER, "ImageGeneration.data")
 
-# --- Consistent filename sanitization function ---
-def sanitize_filename(prompt_text):
-    # This function will be used by both generate_images and open_images
-    # to ensure consistent filenames.
-    # It removes spaces and non-alphanumeric characters, except underscore.
-    return "".join(char for char in prompt_text if char.isalnum() or char == '_').replace(" ", "")
-
 # Function to open and display images based on a given prompt
 def open_images(prompt):
     print(f"Attempting to open images for prompt: '{prompt}'")
     
-    sanitized_prompt = sanitize_filename(prompt) # Use the new sanitize function
-
-    # Generate the filenames for the images - consistent with saving
-    Files = [f"{sanitized_prompt}_{i}.jpg" for i in range(1, 5)]
-
-    for jpg_file in Files:
-        image_path = os.path.join(DATA_FOLDER, jpg_file)
+    # The latest images generated for this prompt, from the image store
+    for image_path in image_store.Lookup(prompt):
         
         try:
             print(f"Checking for image: {image_path}")
@@ -73,82 +74,102 @@ headers = {
     "Authorization": f"Bearer {HuggingFaceAPIKey}"
 }
 
+# One pooled async client for every prompt; it retries model loading and rate limits with backoff
+inference_client = InferenceClient(API_URL, headers)
+
 # Async function to send a query to the Hugging Face API
+# Returns the image bytes, or None if the API did not return an image
 async def query(payload):
-    try:
-        # Add a timeout to prevent hanging indefinitely
-        response = await asyncio.to_thread(requests.post, API_URL, headers=headers, json=payload, timeout=60)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        print(f"API response status: {response.status_code}")
-        # If the API returns JSON, it might contain an error message
-        if response.headers.get('Content-Type') == 'application/json':
-            json_response = response.json()
-            if 'error' in json_response:
-                print(f"Hugging Face API returned error: {json_response['error']}")
-                # If there's a detailed_message, print that too
-                if 'detailed_message' in json_response:
-                    print(f"Detailed message: {json_response['detailed_message']}")
-                return None # Indicate failure
-        return response.content
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
-        # Log the response content if available, for API specific errors
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"API error response status: {e.response.status_code}")
+    return await inference_client.Post(payload)
+
+# Async function to generate 4 images for each (prompt, new_seeds) item of a batch
+# over the shared inference client. Requests are queued round-robin - image 1 of
+# every prompt, then image 2, and so on - and worked off by as many workers as the
+# client allows in flight, so every prompt gets its first image early and N prompts
+# take about 4N / concurrency round trips. Each image is saved as soon as its request
+# finishes; OnImage, if given, is called with (prompt, image number, file path).
+# Prompts already in the image store are served from it unless new_seeds is set.
+# Returns the saved paths grouped per prompt as {prompt: [paths]}.
+async def generate_batch(prompts, OnImage=None):
+    started = perf_counter()
+    results = {}
+    pending = []
+    for prompt, new_seeds in prompts:
+        if prompt in results:
+            continue
+        results[prompt] = []
+        if ImageReuse and not new_seeds:
+            stored = await asyncio.to_thread(image_store.Lookup, prompt)
+            if len(stored) == 4:
+                print(f"DEBUG: Served '{prompt}' from the image store in {perf_counter() - started:.3f}s.")
+                results[prompt] = stored
+                for number, path in enumerate(stored, 1):
+                    if OnImage:
+                        OnImage(prompt, number, path)
+                continue
+        pending.append(prompt)
+    if not pending:
+        return results
+    if not HuggingFaceAPIKey:
+        raise RuntimeError("HuggingFaceAPIKey is not set")
+
+    queued = asyncio.Queue()
+    for number in range(1, 5): # 4 images per prompt
+        for prompt in pending:
+            seed = randint(0, 1000000)
+            print(f"Queueing image generation {number} for '{prompt}' with seed {seed}...")
+            queued.put_nowait((prompt, number, seed))
+
+    async def generate():
+        while not queued.empty():
+            prompt, number, seed = queued.get_nowait()
+            payload = {
+                "inputs": f"{prompt}, quality=4K, sharpness=maximum, Ultra High details, high resolution, seed={seed}",
+            }
             try:
-                print(f"API error response content: {e.response.json()}")
-            except requests.exceptions.JSONDecodeError:
-                print(f"API error response content (non-JSON): {e.response.text}")
-        return None # Return None or raise a custom exception to signal failure
-    except Exception as e:
-        print(f"An unexpected error occurred during API query: {e}")
-        return None
+                image_bytes = await query(payload)
+            except Exception as e:
+                print(f"Image {number} for '{prompt}' failed with exception: {e}")
+                continue
+            if not image_bytes: # Check if content was returned (not None)
+                print(f"No image content received for image {number} of prompt '{prompt}'. Image might not have been generated.")
+                continue
+            try:
+                file_path = await asyncio.to_thread(image_store.Put, prompt, seed, image_bytes)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error saving image {number} for '{prompt}' to the image store: {e}")
+                continue
+            results[prompt].append(file_path)
+            print(f"Saved image: {file_path} ({perf_counter() - started:.2f}s)")
+            if len(results[prompt]) == 1:
+                print(f"DEBUG: First image for '{prompt}' saved after {perf_counter() - started:.2f}s.")
+            if OnImage:
+                OnImage(prompt, number, file_path)
+
+    await asyncio.gather(*(generate() for _ in range(min(inference_client.concurrency, queued.qsize()))))
+    print(f"DEBUG: Generated {sum(len(results[prompt]) for prompt in pending)} images for "
+          f"{len(pending)} prompts in {perf_counter() - started:.2f}s.")
+    return results
 
 # Async function to generate images based on the given prompt
-async def generate_images(prompt: str):
+# OnImage, if given, is called with (image number, file path) for every saved image;
+# the saved paths are returned. A prompt already in the image store is served from
+# it unless NewSeeds is set.
+async def generate_images(prompt: str, OnImage=None, NewSeeds=False):
     print(f"Starting image generation for prompt: '{prompt}'")
-    tasks = []
-
-    sanitized_prompt = sanitize_filename(prompt) # Use the new sanitize function
-
-    # Create 4 image generation tasks
-    for i in range(4): # Loop 4 times for 4 images
-        seed = randint(0, 1000000)
-        payload = {
-            "inputs": f"{prompt}, quality=4K, sharpness=maximum, Ultra High details, high resolution, seed={seed}",
-        }
-        print(f"Queueing image generation {i+1} with seed {seed}...")
-        task = asyncio.create_task(query(payload))  # Create async task
-        tasks.append(task)
-
-    # Wait for all tasks to complete, returning exceptions if they occur
-    image_bytes_list = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Save the generated images to files
-    for i, image_bytes in enumerate(image_bytes_list):
-        if isinstance(image_bytes, Exception):
-            print(f"Task {i+1} failed with exception: {image_bytes}")
-            continue # Skip saving if the task failed
-
-        if image_bytes: # Check if content was returned (not None)
-            file_path = os.path.join(DATA_FOLDER, f"{sanitized_prompt}_{i + 1}.jpg") # Use sanitized_prompt here
-            try:
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-                print(f"Saved image: {file_path}")
-            except IOError as e:
-                print(f"Error saving image to {file_path}: {e}")
-        else:
-            print(f"No image content received for task {i+1} for prompt '{prompt}'. Image might not have been generated.")
-
+    results = await generate_batch(
+        [(prompt, NewSeeds)],
+        (lambda _, number, path: OnImage(number, path)) if OnImage else None
+    )
     print(f"Finished image generation for prompt: '{prompt}'")
+    return results[prompt]
 
 
 # Wrapper function to generate and open images
 def GenerateImages(prompt: str):
     print(f"GenerateImages wrapper called for prompt: '{prompt}'")
     try:
-        asyncio.run(generate_images(prompt))  # Run the async image generation
+        runtime.RunSync(generate_images(prompt))  # Run on the worker's long-lived event loop
         print("Image generation complete in wrapper.")
         open_images(prompt)  # Open the generated images
         return True # Indicate success
@@ -156,60 +177,124 @@ def GenerateImages(prompt: str):
         print(f"Error in GenerateImages wrapper: {e}")
         return False # Indicate failure
 
-# Main loop to check for image generation requests
-print("Image generation script started. Waiting for requests in ImageGeneration.data...")
-while True:
-    try:
-        # Read the status and prompt from the data file
-        if not os.path.exists(IMAGE_GEN_DATA_FILE):
-            print(f"Warning: Data file not found at {IMAGE_GEN_DATA_FILE}. Creating it with default content.")
-            with open(IMAGE_GEN_DATA_FILE, "w") as f:
-                f.write("False,False")
-            sleep(1) # Give system a moment after creating file
-            continue # Skip to next loop iteration
-
-        with open(IMAGE_GEN_DATA_FILE, "r") as f:
-            Data: str = f.read().strip() # Use .strip() to remove leading/trailing whitespace
-
-        if not Data: # Handle empty file case
-            print(f"Warning: {IMAGE_GEN_DATA_FILE} is empty. Writing default content.")
-            with open(IMAGE_GEN_DATA_FILE, "w") as f:
-                f.write("False,False")
-            sleep(1)
-            continue
+# Long-lived worker process fed by Backend/ImageJobs.py. Each message is a batch
+# {"jobs": [{"job": id, "prompt": text, "new_seeds": bool}, ...]} generated together;
+# None shuts the worker down. Progress goes back on events per job as
+# {"job", "state": "running" | "image" | "done" | "failed", ...}.
+def ImageWorker(jobs, events, concurrency=ImageJobConcurrency):
+    print(f"Image generation worker started. Generating up to {concurrency} batches at a time.")
+    slots = threading.BoundedSemaphore(concurrency)
+    in_flight = []
+
+    async def RunBatch(batch):
+        job_ids = {}
+        for job in batch["jobs"]:
+            job_ids.setdefault(job["prompt"], []).append(job["job"])
+            events.put({"job": job["job"], "state": "running", "done": 0, "total": 4})
+        done = {}
+
+        # Every image goes to the GUI gallery as soon as it is on disk.
+        def OnImage(prompt, number, path):
+            done[prompt] = done.get(prompt, 0) + 1
+            for job_id in job_ids[prompt]:
+                events.put({"job": job_id, "state": "image", "done": done[prompt], "total": 4, "number": number,
+                            "path": os.path.abspath(path)})
 
         try:
-            # Use maxsplit=1 to handle commas that might appear in the prompt itself
-            Prompt, Status = Data.split(",", 1)
-        except ValueError:
-            print(f"Error: Invalid format in {IMAGE_GEN_DATA_FILE}. Expected 'Prompt,Status'. Content: '{Data}'. Resetting file.")
-            with open(IMAGE_GEN_DATA_FILE, "w") as f:
-                f.write("False,False")
-            sleep(1)
-            continue # Skip to next loop iteration
-
-
-        # If the status indicates an image generation request
-        if Status.strip().lower() == "true": # Use .lower() for case-insensitive check
-            print(f"Image generation request detected. Prompt: '{Prompt}'")
-            ImageStatus = GenerateImages(prompt=Prompt) # This calls async generate and then open
-
-            # Reset the status in the file after attempting to generate images, regardless of success
-            print(f"Resetting {IMAGE_GEN_DATA_FILE} to 'False,False'")
-            with open(IMAGE_GEN_DATA_FILE, "w") as f:
-                f.write("False,False")
+            results = await generate_batch([(job["prompt"], job.get("new_seeds", False)) for job in batch["jobs"]], OnImage)
+        except Exception as e:
+            for job in batch["jobs"]:
+                events.put({"job": job["job"], "state": "failed", "error": str(e)})
+            return
+        for job in batch["jobs"]:
+            saved = results.get(job["prompt"])
+            if saved:
+                events.put({"job": job["job"], "state": "done", "done": len(saved), "total": 4})
+            else:
+                events.put({"job": job["job"], "state": "failed", "error": "no images were generated"})
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slots.acquire()
+        future = runtime.Submit(RunBatch(job))
+        future.add_done_callback(lambda _: slots.release())
+        in_flight.append(future)
+        in_flight = [f for f in in_flight if not f.done()]
+
+    for future in in_flight:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Image job failed during shutdown: {e}")
+    runtime.RunSync(inference_client.Close())
+    print(f"Inference client stats: {inference_client.stats}")
+    print(f"Image store stats: {image_store.stats}")
+    image_store.Close()
+    runtime.Stop()
+    print("Image generation worker stopped.")
+
+
+# Legacy mode: poll ImageGeneration.data for one "prompt,True" request at a time.
+def WatchRequestFile():
+    print("Image generation script started. Waiting for requests in ImageGeneration.data...")
+    while True:
+        try:
+            # Read the status and prompt from the data file
+            if not os.path.exists(IMAGE_GEN_DATA_FILE):
+                print(f"Warning: Data file not found at {IMAGE_GEN_DATA_FILE}. Creating it with default content.")
+                with open(IMAGE_GEN_DATA_FILE, "w") as f:
+                    f.write("False,False")
+                sleep(1) # Give system a moment after creating file
+                continue # Skip to next loop iteration
+
+            with open(IMAGE_GEN_DATA_FILE, "r") as f:
+                Data: str = f.read().strip() # Use .strip() to remove leading/trailing whitespace
+
+            if not Data: # Handle empty file case
+                print(f"Warning: {IMAGE_GEN_DATA_FILE} is empty. Writing default content.")
+                with open(IMAGE_GEN_DATA_FILE, "w") as f:
+                    f.write("False,False")
+                sleep(1)
+                continue
+
+            try:
+                # Use maxsplit=1 to handle commas that might appear in the prompt itself
+                Prompt, Status = Data.split(",", 1)
+            except ValueError:
+                print(f"Error: Invalid format in {IMAGE_GEN_DATA_FILE}. Expected 'Prompt,Status'. Content: '{Data}'. Resetting file.")
+                with open(IMAGE_GEN_DATA_FILE, "w") as f:
+                    f.write("False,False")
+                sleep(1)
+                continue # Skip to next loop iteration
+
+
+            # If the status indicates an image generation request
+            if Status.strip().lower() == "true": # Use .lower() for case-insensitive check
+                print(f"Image generation request detected. Prompt: '{Prompt}'")
+                ImageStatus = GenerateImages(prompt=Prompt) # This calls async generate and then open
+
+                # Reset the status in the file after attempting to generate images, regardless of success
+                print(f"Resetting {IMAGE_GEN_DATA_FILE} to 'False,False'")
+                with open(IMAGE_GEN_DATA_FILE, "w") as f:
+                    f.write("False,False")
             
-            # If you want it to run once and exit, uncomment 'break'.
-            # If you want it to continuously monitor for new requests, keep 'break' commented.
-            # break 
-            print("Processing complete for this request. Continuing to monitor...")
-        else:
-            # print(f"No active image generation request. Status: '{Status.strip()}'") # This can be too chatty
-            sleep(1) # Wait before checking again
-
-    except FileNotFoundError:
-        print(f"Fatal Error: {IMAGE_GEN_DATA_FILE} not found. Please ensure the path is correct or it can be created.")
-        sleep(5) # Wait before retrying to prevent rapid error spam
-    except Exception as e:
-        print(f"An unexpected error occurred in the main loop: {e}")
-        sleep(5) # Wait before retrying to prevent rapid error spam
\ No newline at end of file
+                # If you want it to run once and exit, uncomment 'break'.
+                # If you want it to continuously monitor for new requests, keep 'break' commented.
+                # break 
+                print("Processing complete for this request. Continuing to monitor...")
+            else:
+                # print(f"No active image generation request. Status: '{Status.strip()}'") # This can be too chatty
+                sleep(1) # Wait before checking again
+
+        except FileNotFoundError:
+            print(f"Fatal Error: {IMAGE_GEN_DATA_FILE} not found. Please ensure the path is correct or it can be created.")
+            sleep(5) # Wait before retrying to prevent rapid error spam
+        except Exception as e:
+            print(f"An unexpected error occurred in the main loop: {e}")
+            sleep(5) # Wait before retrying to prevent rapid error spam
+
+
+if __name__ == "__main__":
+    WatchRequestFile()
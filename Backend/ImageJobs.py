@@ -0,0 +1,191 @@
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+from time import monotonic
+from Backend.StateBus import state_bus, IMAGE_JOB
+from Backend.ImageWorker import LineChannel
+
+ProjectRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImageJobQueue:
+    """
+    Feeds prompts to one long-lived image generation process (Backend/ImageWorker.py)
+    as JSON lines on its stdin. Each prompt gets a job ID; progress events come back
+    on the worker's stdout, are tracked here and published on the state bus under
+    IMAGE_JOB as JSON. Prompts submitted together form a batch that the worker
+    generates as one unit, and a final "batch" event groups the saved files per prompt.
+    """
+
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.jobs = {}
+        self.batches = {}
+        self.process = None
+        self._workers = {}
+        self._job_queue = None
+        self._event_queue = None
+        self._listener = None
+        self._ids = itertools.count(1)
+        self._batch_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def Start(self):
+        with self._lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            # A fresh interpreter running only the worker module; multiprocessing's spawn
+            # would re-import Main.py, and with it the GUI and every backend, in the child.
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [ProjectRoot, env.get("PYTHONPATH")]))
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "Backend.ImageWorker"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                text=True, encoding="utf-8", env=env
+            )
+            self._job_queue = LineChannel(self.process.stdin)
+            self._event_queue = LineChannel(self.process.stdout)
+            self._listener = threading.Thread(target=self._Listen, args=(self._event_queue, self.process),
+                                              name="ImageJobEvents", daemon=True)
+            self._listener.start()
+            print(f"DEBUG: Image generation worker started (pid {self.process.pid}).")
+
+    def Submit(self, prompt, new_seeds=False):
+        """Queues prompt for generation and returns its job ID. new_seeds skips images stored for the same prompt."""
+        return self.SubmitBatch([(prompt, new_seeds)])[0]
+
+    def SubmitBatch(self, prompts):
+        """Queues (prompt, new_seeds) items to be generated together and returns their job IDs in order."""
+        self.Start()
+        batch_id = f"batch-{next(self._batch_ids)}"
+        queued = []
+        with self._lock:
+            for prompt, new_seeds in prompts:
+                job_id = f"img-{next(self._ids)}"
+                self.jobs[job_id] = {"job": job_id, "batch": batch_id, "prompt": prompt, "state": "queued",
+                                     "done": 0, "total": 0, "files": [], "submitted": monotonic()}
+                queued.append({"job": job_id, "prompt": prompt, "new_seeds": new_seeds})
+            self.batches[batch_id] = {"jobs": [job["job"] for job in queued], "submitted": monotonic()}
+            for job in queued:
+                self._workers[job["job"]] = self.process
+            jobs, process = self._job_queue, self.process
+        for job in queued:
+            self._Publish(self.Status(job["job"]))
+        try:
+            jobs.put({"batch": batch_id, "jobs": queued})
+        except (OSError, ValueError) as e:
+            self._FailPending(f"image worker is not running: {e}", process)
+        return [job["job"] for job in queued]
+
+    def Status(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def Pending(self):
+        with self._lock:
+            return [job_id for job_id, job in self.jobs.items() if job["state"] in ("queued", "running")]
+
+    def _Listen(self, events, process):
+        while True:
+            try:
+                event = events.get()
+            except json.JSONDecodeError as e:
+                print(f"WARNING: Image worker wrote a line that is not an event: {e}")
+                continue
+            except (OSError, ValueError):
+                event = None
+            if event is None:
+                # The worker closed its stdout, so it has exited or is about to.
+                try:
+                    code = process.wait(5)
+                except subprocess.TimeoutExpired:
+                    code = None
+                self._FailPending(f"image worker exited with code {code}", process)
+                return
+            with self._lock:
+                job = self.jobs.get(event["job"])
+                if job is None:
+                    continue
+                job.update({key: value for key, value in event.items() if key != "path"})
+                if event.get("path"):
+                    job["files"].append(event["path"])
+                if event["state"] in ("image", "done", "failed"):
+                    event["seconds"] = round(monotonic() - job["submitted"], 2)
+                if event["state"] == "image" and "first_image" not in job:
+                    job["first_image"] = event["seconds"]
+                    print(f"DEBUG: First image of {event['job']} arrived after {event['seconds']:.2f}s.")
+            self._Publish(event)
+            if event["state"] in ("done", "failed"):
+                self._FinishBatch(job["batch"])
+
+    def _FailPending(self, error, process):
+        """Fails the unfinished jobs that were sent to process; jobs of a restarted worker are left alone."""
+        for job_id in self.Pending():
+            with self._lock:
+                if self.jobs[job_id]["state"] not in ("queued", "running") or self._workers.get(job_id) is not process:
+                    continue
+                self.jobs[job_id]["state"] = "failed"
+            self._Publish({"job": job_id, "state": "failed", "error": error})
+            self._FinishBatch(self.jobs[job_id]["batch"])
+
+    def _FinishBatch(self, batch_id):
+        """Publishes the batch's files grouped per prompt once every job in it has finished."""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return
+            jobs = [self.jobs[job_id] for job_id in batch["jobs"]]
+            if any(job["state"] not in ("done", "failed") for job in jobs):
+                return
+            del self.batches[batch_id]
+            for job_id in batch["jobs"]:
+                self._workers.pop(job_id, None)
+            results = {}
+            for job in jobs:
+                results.setdefault(job["prompt"], job["files"])
+            event = {"job": batch_id, "state": "batch", "jobs": batch["jobs"], "results": results,
+                     "failed": sum(1 for job in jobs if job["state"] == "failed"),
+                     "seconds": round(monotonic() - batch["submitted"], 2)}
+        if len(jobs) > 1:
+            print(f"DEBUG: Image {batch_id} finished {len(jobs)} prompts in {event['seconds']:.2f}s.")
+        self._Publish(event)
+
+    def _Publish(self, event):
+        event = {key: value for key, value in event.items() if key != "submitted"}
+        state_bus.Publish(IMAGE_JOB, json.dumps(event))
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"ERROR: Image job event handler failed: {e}")
+
+    def Stop(self, timeout=5):
+        """Asks the worker to exit and waits up to timeout for it; after that it is terminated."""
+        with self._lock:
+            process, jobs, listener = self.process, self._job_queue, self._listener
+            self.process = None
+        if process is None:
+            return
+        try:
+            jobs.put(None)
+            process.stdin.close()
+        except (OSError, ValueError):
+            pass
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            print("WARNING: Image generation worker did not stop in time; terminating it.")
+            process.terminate()
+            try:
+                process.wait(1)
+            except subprocess.TimeoutExpired:
+                pass
+        self._FailPending("image worker stopped", process)
+        listener.join(1)
+        print("DEBUG: Image generation worker stopped.")
+
+
+image_jobs = ImageJobQueue()
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from time import time, perf_counter
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+# Generated images live here, sharded by content hash, next to a SQLite manifest.
+ImageStoreDir = env_vars.get("ImageStoreDir", os.path.join("Data", "Images"))
+# Least recently used images are evicted once the store grows past this many megabytes.
+ImageStoreQuotaMB = float(env_vars.get("ImageStoreQuotaMB", 1024))
+
+
+def PromptKey(prompt):
+    """Case and whitespace differences do not make a new prompt."""
+    return " ".join(prompt.lower().split())
+
+
+class ImageStore:
+    """
+    Content-addressed store for generated images. Each file is saved once under
+    <root>/<aa>/<bb>/<sha256>.jpg; the manifest maps (prompt, seed) to content and
+    records last use, so repeated prompts are served from disk and the least
+    recently used images are evicted when the store exceeds its quota.
+    """
+
+    def __init__(self, root=ImageStoreDir, quota_mb=ImageStoreQuotaMB):
+        self.root = root
+        self.quota = int(quota_mb * 1024 * 1024)
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "deduplicated": 0, "evicted": 0}
+        self._db = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _Open(self):
+        # Caller holds lock.
+        if self._db is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.root, "manifest.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS images (
+                    digest TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used);
+                CREATE TABLE IF NOT EXISTS prompts (
+                    prompt TEXT NOT NULL,
+                    seed INTEGER NOT NULL,
+                    digest TEXT NOT NULL REFERENCES images (digest) ON DELETE CASCADE,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (prompt, seed)
+                );
+                CREATE INDEX IF NOT EXISTS prompts_digest ON prompts (digest);
+            """)
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        return self._db
+
+    def ShardPath(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def Lookup(self, prompt, count=4):
+        """Paths of the most recently generated images for prompt (at most count), newest first."""
+        with self._lock:
+            db = self._Open()
+            rows = db.execute(
+                "SELECT prompts.digest, images.path FROM prompts JOIN images USING (digest) "
+                "WHERE prompts.prompt = ? ORDER BY prompts.created DESC LIMIT ?",
+                (PromptKey(prompt), count)
+            ).fetchall()
+            paths, missing = [], []
+            for digest, path in rows:
+                (paths if os.path.exists(path) else missing).append((digest, path))
+            if missing:
+                # Files deleted behind our back are forgotten rather than served.
+                self._Forget([digest for digest, _ in missing])
+            if paths:
+                db.executemany("UPDATE images SET last_used = ? WHERE digest = ?",
+                               [(time(), digest) for digest, _ in paths])
+                db.commit()
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            return [path for _, path in paths]
+
+    def Put(self, prompt, seed, data):
+        """Stores image bytes generated for (prompt, seed) and returns their path."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.ShardPath(digest)
+        now = time()
+        with self._lock:
+            db = self._Open()
+            if db.execute("SELECT 1 FROM images WHERE digest = ?", (digest,)).fetchone() and os.path.exists(path):
+                self.stats["deduplicated"] += 1
+                db.execute("UPDATE images SET last_used = ? WHERE digest = ?", (now, digest))
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, "wb") as file:
+                    file.write(data)
+                os.replace(temp_path, path)
+                previous = db.execute("SELECT size FROM images WHERE digest = ?", (digest,)).fetchone()
+                self._total += len(data) - (previous[0] if previous else 0)
+                db.execute("INSERT OR REPLACE INTO images (digest, path, size, last_used) VALUES (?, ?, ?, ?)",
+                           (digest, path, len(data), now))
+                self.stats["stored"] += 1
+            db.execute("INSERT OR REPLACE INTO prompts (prompt, seed, digest, created) VALUES (?, ?, ?, ?)",
+                       (PromptKey(prompt), seed, digest, now))
+            db.commit()
+            self._Evict(keep=digest)
+        return path
+
+    def _Evict(self, keep=None):
+        # Caller holds lock. Once over quota, drops least recently used images down to 90% of it,
+        # so eviction runs in batches rather than on every new image.
+        if self._total <= self.quota:
+            return
+        db = self._db
+        target = self.quota * 0.9
+        victims, freed = [], 0
+        for digest, path, size in db.execute("SELECT digest, path, size FROM images ORDER BY last_used"):
+            if self._total - freed <= target:
+                break
+            if digest == keep:
+                continue
+            victims.append(digest)
+            freed += size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._Forget(victims)
+        self.stats["evicted"] += len(victims)
+        print(f"DEBUG: Image store evicted {len(victims)} images ({freed / 1048576:.1f} MB) "
+              f"to stay under {self.quota / 1048576:.0f} MB.")
+
+    def _Forget(self, digests):
+        # Caller holds lock.
+        if not digests:
+            return
+        db = self._db
+        for start in range(0, len(digests), 500):
+            chunk = digests[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            self._total -= db.execute(f"SELECT COALESCE(SUM(size), 0) FROM images WHERE digest IN ({marks})", chunk).fetchone()[0]
+            db.execute(f"DELETE FROM images WHERE digest IN ({marks})", chunk)
+        db.commit()
+
+    def Usage(self):
+        with self._lock:
+            db = self._Open()
+            count = db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            return {"images": count, "bytes": self._total, "quota": self.quota}
+
+    def Close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+image_store = ImageStore()
+
+
+def BenchmarkImageStore(images=100_000):
+    """Fills a temporary store with `images` small files and times lookups, reuse and eviction."""
+    import random
+    import shutil
+    import tempfile
+
+    root = tempfile.mkdtemp(prefix="ImageStoreBench")
+    try:
+        store = ImageStore(root, quota_mb=images * 64 / 1048576)
+        prompts = [f"prompt number {i // 4}" for i in range(images)]
+        started = perf_counter()
+        for i, prompt in enumerate(prompts):
+            store.Put(prompt, i, i.to_bytes(8, "big") * 8)
+        filled = perf_counter() - started
+        usage = store.Usage()
+
+        samples = random.sample(prompts, 2000)
+        started = perf_counter()
+        hits = sum(1 for prompt in samples if len(store.Lookup(prompt)) == 4)
+        lookup = (perf_counter() - started) / len(samples)
+
+        started = perf_counter()
+        miss = store.Lookup("a prompt nobody asked for")
+        miss_time = perf_counter() - started
+
+        # Touch the first prompt so it survives, then push past the quota.
+        store.Lookup(prompts[0])
+        started = perf_counter()
+        for i in range(400):
+            store.Put("overflow prompt", images + i, (images + i).to_bytes(8, "big") * 8)
+        overflow = perf_counter() - started
+        store.Close()
+
+        ok = (usage["images"] == images and hits == len(samples) and not miss
+              and store.stats["evicted"] >= 400 and len(ImageStore(root).Lookup(prompts[0])) == 4)
+        print(f"Stored {images} images in {filled:.1f}s ({filled / images * 1e6:.0f} us each).")
+        print(f"Lookup of a stored prompt: {lookup * 1e6:.0f} us, miss: {miss_time * 1e6:.0f} us "
+              f"({hits}/{len(samples)} hits).")
+        print(f"400 inserts over quota with LRU eviction: {overflow / 400 * 1e3:.2f} ms each; "
+              f"{store.stats['evicted']} evicted, recently used prompt kept: {ok}.")
+        return ok
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if BenchmarkImageStore() else 1)
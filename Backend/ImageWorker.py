@@ -0,0 +1,37 @@
+import json
+import sys
+import threading
+
+
+class LineChannel:
+    """One JSON message per line over a text stream, with the get()/put() shape of a queue."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Returns the next message, or None once the other end has closed the stream."""
+        line = self.stream.readline()
+        return json.loads(line) if line else None
+
+    def put(self, message):
+        with self._lock:
+            self.stream.write(json.dumps(message) + "\n")
+            self.stream.flush()
+
+
+def Main():
+    # Started by Backend/ImageJobs.py as "python -m Backend.ImageWorker", so the worker
+    # only imports the image generation code, never Main.py and the GUI behind it.
+    # Jobs arrive on stdin and events leave on stdout; all logging goes to stderr.
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.stdout.reconfigure(encoding="utf-8")
+    events = LineChannel(sys.stdout)
+    sys.stdout = sys.stderr
+    from Backend.ImageGeneration import ImageWorker
+    ImageWorker(LineChannel(sys.stdin), events)
+
+
+if __name__ == "__main__":
+    Main()
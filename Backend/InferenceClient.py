@@ -0,0 +1,211 @@
+import asyncio
+import random
+from time import monotonic
+import httpx
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+# Requests in flight to the inference API at once, shared by every prompt.
+InferenceConcurrency = int(env_vars.get("InferenceConcurrency", 4))
+# Give up on one image after this many seconds of retrying (model loading, rate limits).
+InferenceMaxWait = float(env_vars.get("InferenceMaxWait", 180))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class InferenceClient:
+    """
+    Async client for a Hugging Face style inference endpoint. One httpx connection
+    pool and one concurrency cap are shared by all requests. 503 "model is loading"
+    answers are retried after their estimated_time, 429s after Retry-After, and
+    other transient failures with jittered exponential backoff.
+    """
+
+    def __init__(self, url, headers, concurrency=InferenceConcurrency, max_wait=InferenceMaxWait,
+                 base_delay=1.0, max_delay=30.0, timeout=60.0):
+        self.url = url
+        self.headers = headers
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.stats = {"requests": 0, "retries": 0, "ok": 0, "failed": 0, "rejected": 0}
+        self._client = None
+        self._slots = None
+        self._loop = None
+
+    def _Bind(self):
+        # httpx clients and asyncio semaphores belong to the loop that created them.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            )
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._client, self._slots
+
+    def _Backoff(self, attempt, response=None):
+        """Seconds to wait before the next attempt."""
+        if response is not None:
+            if response.status_code == 503:
+                try:
+                    estimated = float(response.json().get("estimated_time", 0))
+                except (ValueError, AttributeError):
+                    estimated = 0
+                if estimated > 0:
+                    return min(estimated, self.max_delay) * random.uniform(1.0, 1.2)
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_delay) * random.uniform(1.0, 1.2)
+                except ValueError:
+                    pass
+        # Full jitter keeps parallel requests from retrying in lockstep.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def Post(self, payload, accept="image/"):
+        """Returns the response bytes if the endpoint answers with content of type accept*, otherwise None."""
+        client, slots = self._Bind()
+        deadline = monotonic() + self.max_wait
+        attempt = 0
+        self.stats["requests"] += 1
+        while True:
+            response = None
+            try:
+                async with slots:
+                    response = await client.post(self.url, json=payload)
+                error = f"HTTP {response.status_code}"
+                if response.status_code == 200:
+                    content_type = response.headers.get("Content-Type", "")
+                    if content_type.startswith(accept) and response.content:
+                        self.stats["ok"] += 1
+                        return response.content
+                    # A 200 with JSON (or anything else) is an error report, not an image.
+                    self.stats["rejected"] += 1
+                    print(f"ERROR: Inference API returned '{content_type}' instead of {accept}*: {response.text[:200]}")
+                    return None
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.stats["failed"] += 1
+                    print(f"ERROR: Inference API request failed with {error}: {response.text[:200]}")
+                    return None
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+
+            delay = self._Backoff(attempt, response)
+            if monotonic() + delay > deadline:
+                self.stats["failed"] += 1
+                print(f"ERROR: Inference API still failing after {attempt + 1} attempts ({error}); giving up.")
+                return None
+            self.stats["retries"] += 1
+            attempt += 1
+            print(f"DEBUG: Inference API {error}; retry {attempt} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+    async def Close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+def SelfTest():
+    """
+    Runs the client against a local stand-in server that simulates a loading model
+    (503 + estimated_time), rate limiting (429 + Retry-After), slow responses, JSON
+    error bodies with status 200 and hard failures, and checks each outcome.
+    """
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from time import sleep
+
+    state = {"loading": 2, "limited": 1, "active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    class StandIn(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def Reply(self, status, body, content_type, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            try:
+                mode = self.path.strip("/")
+                if mode == "loading" and state["loading"] > 0:
+                    state["loading"] -= 1
+                    return self.Reply(503, json.dumps({"error": "Model is currently loading", "estimated_time": 0.2}).encode(), "application/json")
+                if mode == "limited" and state["limited"] > 0:
+                    state["limited"] -= 1
+                    return self.Reply(429, b"slow down", "text/plain", [("Retry-After", "0.2")])
+                if mode == "slow":
+                    sleep(0.3)
+                if mode == "json":
+                    return self.Reply(200, json.dumps({"error": "NSFW content detected"}).encode(), "application/json")
+                if mode == "broken":
+                    return self.Reply(400, b"bad request", "text/plain")
+                if mode == "down":
+                    return self.Reply(503, b"unavailable", "text/plain")
+                return self.Reply(200, b"\xff\xd8\xff" + body["inputs"].encode(), "image/jpeg")
+            finally:
+                with lock:
+                    state["active"] -= 1
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def Run():
+        def Client(mode, **kwargs):
+            return InferenceClient(f"{base}/{mode}", {}, base_delay=0.05, max_delay=1.0, **kwargs)
+
+        results = {}
+        results["loading"] = await Client("loading").Post({"inputs": "cat"})
+        results["limited"] = await Client("limited").Post({"inputs": "dog"})
+        results["json"] = await Client("json").Post({"inputs": "x"})
+        results["broken"] = await Client("broken").Post({"inputs": "x"})
+        results["down"] = await Client("down", max_wait=0.5).Post({"inputs": "x"})
+
+        slow = Client("slow", concurrency=2)
+        started = monotonic()
+        batch = await asyncio.gather(*(slow.Post({"inputs": f"p{i}"}) for i in range(6)))
+        results["slow_seconds"] = monotonic() - started
+        results["slow_ok"] = all(batch)
+        await slow.Close()
+        return results
+
+    results = asyncio.run(Run())
+    server.shutdown()
+
+    checks = [
+        ("retries through model loading", results["loading"] == b"\xff\xd8\xffcat"),
+        ("honours 429 Retry-After", results["limited"] == b"\xff\xd8\xffdog"),
+        ("rejects JSON returned as 200", results["json"] is None),
+        ("does not retry a 400", results["broken"] is None),
+        ("gives up after max_wait", results["down"] is None),
+        ("slow batch completes", results["slow_ok"]),
+        ("concurrency cap of 2 respected", state["peak"] <= 2),
+    ]
+    for label, ok in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    print(f"6 slow requests (0.3s each) at concurrency 2 took {results['slow_seconds']:.2f}s.")
+    return all(ok for _, ok in checks)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if SelfTest() else 1)
@@ -0,0 +1,216 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from time import perf_counter
+from Backend.TextUtils import NormalizeQuery
+
+INTENT_CORPUS_PATH = os.path.join("Data", "IntentCorpus.json")
+
+# Minimum model probability before a general/realtime decision is trusted locally.
+CONFIDENCE_THRESHOLD = 0.8
+
+# Automation intents are recognised by their leading words; the decision keeps the
+# same "<func> <argument>" shape that FirstLayerDMM() builds from Cohere's reply.
+PrefixRules = [
+    (re.compile(r"^(?:please\s+)?open\s+(?P<arg>.+)$"), "open"),
+    (re.compile(r"^(?:please\s+)?close\s+(?P<arg>.+)$"), "close"),
+    (re.compile(r"^(?:please\s+)?play\s+(?P<arg>.+)$"), "play"),
+    (re.compile(r"^(?:please\s+)?(?:generate|create|make)\s+(?:an?\s+)?image\s+(?P<arg>.+)$"), "generate image"),
+    (re.compile(r"^(?:please\s+)?google\s+search\s+(?:for\s+)?(?P<arg>.+)$"), "google search"),
+    (re.compile(r"^(?:please\s+)?search\s+(?P<arg>.+?)\s+on\s+google$"), "google search"),
+    (re.compile(r"^(?:please\s+)?search\s+(?P<arg>.+?)\s+on\s+youtube$"), "Youtube"),
+    (re.compile(r"^(?:please\s+)?youtube\s+search\s+(?:for\s+)?(?P<arg>.+)$"), "Youtube"),
+    (re.compile(r"^(?:please\s+)?write\s+(?:an?\s+)?(?P<arg>(?:application|letter|email|essay|code|poem|story)\b.*)$"), "content"),
+    (re.compile(r"^(?P<arg>mute|unmute|volume up|volume down)$"), "system"),
+    (re.compile(r"^(?:turn\s+)?(?:the\s+)?volume\s+(?P<arg>up|down)$"), "system volume"),
+    (re.compile(r"^(?:bye|goodbye|good bye|see you|see ya)\b.*$"), "exit"),
+]
+
+# Anything that looks like more than one request is left to the remote model.
+CompoundPattern = re.compile(r",|\band\b|\bthen\b|\balso\b")
+
+# Words of the remote model's other intents (images, reminders, system, content, ...).
+# The local model only knows general and realtime, so a query that mentions one of these
+# and did not match a prefix rule is never answered locally.
+CommandWords = re.compile(
+    r"\b(?:images?|pictures?|photos?|draw|reminders?|remind|alarms?|schedule|shut\s*down|restart|reboot|"
+    r"sleep|hibernate|log\s*off|brightness|volume|mute|unmute|screenshot|wi-?fi|bluetooth|"
+    r"content|write|open|close|launch|play|search|youtube|exit)\b"
+)
+
+# Corpus label for examples that belong to other intents; choosing it defers the query.
+DEFER_LABEL = "defer"
+
+
+def Tokenize(text):
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """
+    Local first pass for FirstLayerDMM(): compiled prefix rules for automation
+    commands, plus a small TF-IDF / logistic regression model for general vs
+    realtime questions. Returns None whenever it is not confident, when the query
+    uses a command word no rule matched, or when the model picks the defer label.
+    """
+
+    def __init__(self, corpus_path=INTENT_CORPUS_PATH, threshold=CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.labels = []
+        self.idf = {}
+        self.weights = {}
+        self.bias = {}
+        self.local_decisions = 0
+        self.deferred = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+        self._Train(corpus_path)
+
+    def _Train(self, corpus_path, epochs=60, learning_rate=0.5, l2=1e-4):
+        try:
+            with open(corpus_path, "r", encoding="utf-8") as file:
+                corpus = json.load(file)
+        except (IOError, ValueError) as e:
+            print(f"WARNING: Intent corpus unavailable, only prefix rules will run locally: {e}")
+            return
+
+        self.labels = sorted({row["label"] for row in corpus})
+        documents = [Tokenize(row["text"]) for row in corpus]
+        document_frequency = Counter(term for tokens in documents for term in set(tokens))
+        self.idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+
+        samples = [(self._Vector(tokens), row["label"]) for tokens, row in zip(documents, corpus)]
+        for _ in range(epochs):
+            for vector, target in samples:
+                probabilities = self._Probabilities(vector)
+                for label in self.labels:
+                    gradient = probabilities[label] - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for term, value in vector.items():
+                        weights[term] = weights.get(term, 0.0) * (1 - learning_rate * l2) - learning_rate * gradient * value
+                    self.bias[label] -= learning_rate * gradient
+
+    def _Vector(self, tokens):
+        counts = Counter(term for term in tokens if term in self.idf)
+        vector = {term: count * self.idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {term: value / norm for term, value in vector.items()}
+
+    def _Probabilities(self, vector):
+        scores = {
+            label: self.bias[label] + sum(self.weights[label].get(term, 0.0) * value for term, value in vector.items())
+            for label in self.labels
+        }
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def _Decide(self, query):
+        if CompoundPattern.search(query):
+            return None
+
+        for pattern, func in PrefixRules:
+            match = pattern.match(query)
+            if match:
+                if func == "exit":
+                    return ["exit"]
+                return [f"{func} {match.group('arg').strip()}"]
+
+        if not self.labels or CommandWords.search(query):
+            return None
+
+        vector = self._Vector(Tokenize(query))
+        if not vector:
+            return None
+        probabilities = self._Probabilities(vector)
+        label = max(probabilities, key=probabilities.get)
+        if label == DEFER_LABEL or probabilities[label] < self.threshold:
+            return None
+        return [f"{label} {query}"]
+
+    def Classify(self, prompt):
+        """Returns a FirstLayerDMM-style decision list, or None to defer to the remote model."""
+        started = perf_counter()
+        query = NormalizeQuery(prompt)
+        decision = self._Decide(query) if query else None
+        elapsed = perf_counter() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+            if len(self.latencies) > 10000:
+                del self.latencies[:5000]
+            if decision:
+                self.local_decisions += 1
+            else:
+                self.deferred += 1
+        return decision
+
+    def Stats(self):
+        with self._lock:
+            total = self.local_decisions + self.deferred
+            samples = sorted(self.latencies)
+
+        def Percentile(fraction):
+            return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000 if samples else 0.0
+
+        return {
+            "local": self.local_decisions,
+            "deferred": self.deferred,
+            "skip_rate": self.local_decisions / total if total else 0.0,
+            "p50_ms": Percentile(0.5),
+            "p95_ms": Percentile(0.95),
+        }
+
+
+intent_classifier = IntentClassifier()
+
+# Queries with a known local outcome; None means the remote model must decide.
+RegressionCases = [
+    ("generate images of a lion", None),
+    ("set a reminder for my meeting tomorrow", None),
+    ("shut down the computer", None),
+    ("restart my laptop", None),
+    ("make a picture of a cat", None),
+    ("increase the brightness", None),
+    ("take a screenshot", None),
+    ("open chrome and play music", None),
+    ("open chrome", ["open chrome"]),
+    ("generate an image of a lion", ["generate image of a lion"]),
+    ("write a poem about rain", ["content poem about rain"]),
+    ("volume up", ["system volume up"]),
+    ("how are you", ["general how are you"]),
+    ("what is the weather today", ["realtime what is the weather today"]),
+]
+
+
+def SelfCheck(classifier=intent_classifier):
+    """Runs RegressionCases and prints each mismatch; True if all of them pass."""
+    ok = True
+    for query, expected in RegressionCases:
+        decision = classifier.Classify(query)
+        if decision != expected:
+            ok = False
+            print(f"FAIL {query!r} -> {decision}, expected {expected}")
+    print(f"Intent classifier self-check: {'ok' if ok else 'FAILED'} ({len(RegressionCases)} cases).")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    # Without arguments runs the regression cases; with a file, replays one query per line
+    # and reports how much stays local.
+    if len(sys.argv) < 2:
+        sys.exit(0 if SelfCheck() else 1)
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        queries = [line.strip() for line in file if line.strip()]
+    for query in queries:
+        print(f"{query!r} -> {intent_classifier.Classify(query)}")
+    stats = intent_classifier.Stats()
+    print(f"Remote DMM skipped for {stats['local']}/{stats['local'] + stats['deferred']} queries ({stats['skip_rate']:.0%}).")
+    print(f"Local decision latency: p50 {stats['p50_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms.")
@@ -0,0 +1,305 @@
+import json
+import os
+import wave
+from time import perf_counter
+import numpy as np
+from dotenv import dotenv_values
+
+try:
+    import pyaudio
+    PYAUDIO_AVAILABLE = True
+except ImportError:
+    PYAUDIO_AVAILABLE = False
+
+try:
+    from vosk import Model as VoskModel, KaldiRecognizer, SetLogLevel
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+env_vars = dotenv_values(".env")
+# Offline recognizer model directory (any Vosk model, e.g. vosk-model-small-en-us-0.15).
+VoskModelPath = env_vars.get("VoskModelPath", os.path.join("Data", "VoskModel"))
+# A frame counts as speech when its energy is this many times the running noise floor.
+VadSensitivity = float(env_vars.get("VadSensitivity", 3.0))
+# Milliseconds of silence that end an utterance.
+VadSilenceMs = int(env_vars.get("VadSilenceMs", 600))
+# Longer utterances are cut here and recognized as they are.
+MaxUtteranceSeconds = float(env_vars.get("MaxUtteranceSeconds", 15))
+# Seconds of audio to wait for an utterance before the turn is given up.
+SpeechTimeout = float(env_vars.get("SpeechTimeout", 30))
+
+SampleRate = 16000
+FrameMs = 30
+FixturesDir = os.path.join("Data", "SpeechFixtures")
+
+
+class RingBuffer:
+    """Fixed-size int16 sample buffer addressed by absolute sample position; new samples overwrite the oldest."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.end = 0
+
+    def Write(self, samples):
+        total = self.end + len(samples)
+        samples = samples[-self.capacity:]
+        start = (total - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+        self.end = total
+
+    def Read(self, begin, end):
+        """Samples at positions [begin, end); positions that were already overwritten are skipped."""
+        begin = max(begin, self.end - self.capacity, 0)
+        return self.data[np.arange(begin, end) % self.capacity]
+
+
+class EnergyVAD:
+    """
+    Cuts utterances out of a stream of fixed-size frames by RMS energy against an
+    adaptive noise floor. Speech starts after start_frames loud frames in a row and
+    ends after silence_ms of quiet frames. pre_roll_ms of audio before the start is
+    kept so the first syllable is not clipped.
+    """
+
+    def __init__(self, sample_rate=SampleRate, frame_ms=FrameMs, sensitivity=VadSensitivity,
+                 silence_ms=VadSilenceMs, max_seconds=MaxUtteranceSeconds, start_frames=3,
+                 pre_roll_ms=300, min_energy=100.0):
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * frame_ms // 1000
+        self.sensitivity = sensitivity
+        self.end_frames = max(1, silence_ms // frame_ms)
+        self.start_frames = start_frames
+        self.pre_roll = sample_rate * pre_roll_ms // 1000
+        self.max_samples = int(sample_rate * max_seconds)
+        self.min_energy = min_energy
+        self.buffer = RingBuffer(self.max_samples + self.pre_roll + self.frame * (start_frames + 1))
+        self.noise = None
+        self.Reset()
+
+    def Reset(self):
+        self.start = None
+        self.loud = 0
+        self.quiet = 0
+        self.last_segment = None
+
+    def Feed(self, frame):
+        """Adds one frame and returns the samples of the utterance it completes, otherwise None."""
+        self.buffer.Write(frame)
+        energy = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+        if self.noise is None:
+            self.noise = energy
+        speech = energy > max(self.noise * self.sensitivity, self.min_energy)
+
+        if self.start is None:
+            if not speech:
+                # Only quiet frames move the noise floor, so speech cannot raise its own threshold.
+                self.noise = 0.95 * self.noise + 0.05 * energy
+            self.loud = self.loud + 1 if speech else 0
+            if self.loud >= self.start_frames:
+                self.start = max(self.buffer.end - self.loud * len(frame) - self.pre_roll, 0)
+                self.quiet = 0
+            return None
+
+        self.quiet = 0 if speech else self.quiet + 1
+        if self.quiet >= self.end_frames or self.buffer.end - self.start >= self.max_samples:
+            # Keep a little of the trailing silence; recognizers like a clean ending.
+            end = self.buffer.end - max(self.quiet - 3, 0) * len(frame)
+            utterance = self.buffer.Read(self.start, end)
+            self.last_segment = (self.start / self.sample_rate, end / self.sample_rate)
+            self.start = None
+            self.loud = 0
+            self.quiet = 0
+            return utterance
+        return None
+
+
+class MicrophoneSource:
+    """
+    Mono int16 frames from the default input device. The stream is opened up front,
+    so a missing or busy microphone is reported while the backend is being chosen,
+    and it is paused between turns.
+    """
+
+    def __init__(self, sample_rate=SampleRate, frame_ms=FrameMs):
+        if not PYAUDIO_AVAILABLE:
+            raise RuntimeError("PyAudio is not installed; it is needed for the local speech backend.")
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * frame_ms // 1000
+        self.audio = None
+        self.stream = None
+        self._Open()
+
+    def _Open(self):
+        self.audio = pyaudio.PyAudio()
+        try:
+            self.stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate,
+                                          input=True, frames_per_buffer=self.frame, start=False)
+        except (OSError, ValueError) as e:
+            self.audio.terminate()
+            self.audio = None
+            raise RuntimeError(f"Could not open the microphone: {e}")
+
+    def Frames(self):
+        if self.stream is None:
+            self._Open()
+        self.stream.start_stream()
+        try:
+            while True:
+                data = self.stream.read(self.frame, exception_on_overflow=False)
+                yield np.frombuffer(data, dtype=np.int16)
+        finally:
+            # Audio played back while the assistant answers is not queued up for the next turn.
+            self.stream.stop_stream()
+
+    def Close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.audio.terminate()
+            self.stream = None
+
+
+class WavSource:
+    """Frames from a 16-bit mono WAV file, for fixtures and offline checks."""
+
+    def __init__(self, path, sample_rate=SampleRate, frame_ms=FrameMs):
+        self.path = path
+        self.frame = sample_rate * frame_ms // 1000
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != sample_rate:
+                raise ValueError(f"{path} must be 16-bit mono at {sample_rate} Hz.")
+            self.samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+    def Frames(self):
+        for start in range(0, len(self.samples) - self.frame + 1, self.frame):
+            yield self.samples[start:start + self.frame]
+
+    def Close(self):
+        pass
+
+
+class VoskTranscriber:
+    """Offline CPU speech-to-text with a Vosk model loaded once."""
+
+    def __init__(self, model_path=VoskModelPath, sample_rate=SampleRate):
+        if not VOSK_AVAILABLE:
+            raise RuntimeError("vosk is not installed; run 'pip install vosk' for the local speech backend.")
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"Vosk model not found at '{model_path}'. Download one from "
+                               f"https://alphacephei.com/vosk/models and set VoskModelPath in .env.")
+        SetLogLevel(-1)
+        started = perf_counter()
+        self.model = VoskModel(model_path)
+        self.sample_rate = sample_rate
+        print(f"DEBUG: Vosk model loaded from '{model_path}' in {perf_counter() - started:.1f}s.")
+
+    def Transcribe(self, samples):
+        recognizer = KaldiRecognizer(self.model, self.sample_rate)
+        recognizer.AcceptWaveform(samples.tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class LocalRecognizer:
+    """
+    Speech-to-text without a browser: frames from a source (the microphone by
+    default) go through EnergyVAD, and each finished utterance is transcribed by an
+    offline recognizer.
+    """
+    name = "local"
+
+    def __init__(self, source=None, transcriber=None, timeout=SpeechTimeout):
+        # The microphone is checked first; there is no point loading a model without one.
+        self.source = source or MicrophoneSource()
+        try:
+            self.transcriber = transcriber or VoskTranscriber()
+        except RuntimeError:
+            self.source.Close()
+            raise
+        self.timeout = timeout
+        self.vad = EnergyVAD()
+
+    def Listen(self):
+        """Returns the text of the next utterance, or "" if none was heard within timeout seconds of audio."""
+        self.vad.Reset()
+        heard = 0
+        for frame in self.source.Frames():
+            utterance = self.vad.Feed(frame)
+            if utterance is not None:
+                speech_end = perf_counter()
+                text = self.transcriber.Transcribe(utterance).strip()
+                print(f"DEBUG: Local recognizer heard {len(utterance) / SampleRate:.1f}s of speech: '{text}' "
+                      f"(end of speech to text: {(perf_counter() - speech_end) * 1000:.0f} ms)")
+                if text:
+                    return text
+            heard += len(frame)
+            if heard >= self.timeout * SampleRate:
+                break
+        return ""
+
+    def Close(self):
+        self.source.Close()
+
+
+def SelfTest(directory=FixturesDir):
+    """
+    Runs EnergyVAD and LocalRecognizer over the WAV fixtures and compares the cut
+    utterances with expected.json. Transcripts are checked too when vosk and a model
+    are installed and the fixture lists one. Needs numpy, like the rest of this module;
+    PyAudio is not used.
+    """
+    with open(os.path.join(directory, "expected.json"), encoding="utf-8") as file:
+        expected = json.load(file)
+
+    class LengthTranscriber:
+        # Stands in for a recognizer so the pipeline runs without a model.
+        def Transcribe(self, samples):
+            return f"{len(samples) / SampleRate:.1f}s"
+
+    transcriber = None
+    if VOSK_AVAILABLE and os.path.isdir(VoskModelPath):
+        transcriber = VoskTranscriber()
+
+    ok = True
+    tolerance = 0.15
+    for name, fixture in expected.items():
+        source = WavSource(os.path.join(directory, name))
+        vad = EnergyVAD()
+        started = perf_counter()
+        segments = []
+        for frame in source.Frames():
+            if vad.Feed(frame) is not None:
+                segments.append(vad.last_segment)
+        elapsed = perf_counter() - started
+        wanted = fixture["segments"]
+        # Utterances are cut pre-roll early on purpose.
+        pre_roll = vad.pre_roll / SampleRate
+        matched = len(segments) == len(wanted) and all(
+            abs(start - (want[0] - pre_roll)) <= tolerance and abs(end - want[1]) <= tolerance
+            for (start, end), want in zip(segments, wanted)
+        )
+        ok &= matched
+        audio = len(source.samples) / SampleRate
+        print(f"{'ok  ' if matched else 'FAIL'} {name}: {len(segments)} utterances "
+              f"{[(round(s, 2), round(e, 2)) for s, e in segments]}, expected {wanted} "
+              f"({audio:.1f}s of audio cut in {elapsed * 1000:.1f} ms)")
+
+        recognizer = LocalRecognizer(WavSource(os.path.join(directory, name)), transcriber or LengthTranscriber())
+        heard = recognizer.Listen()
+        if wanted and not heard:
+            ok = False
+            print(f"FAIL {name}: LocalRecognizer returned nothing.")
+        if transcriber and fixture.get("text"):
+            matched = heard.lower() == fixture["text"].lower()
+            ok &= matched
+            print(f"{'ok  ' if matched else 'FAIL'} {name}: transcript '{heard}', expected '{fixture['text']}'")
+    if transcriber is None:
+        print("Transcripts not checked: vosk or its model is not installed.")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if SelfTest() else 1)
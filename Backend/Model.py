@@ -1,6 +1,8 @@
 import cohere
 from rich import print
 from dotenv import dotenv_values
+from Backend.IntentClassifier import intent_classifier
+from Backend.DecisionCache import decision_cache
 import os
 import sys
 
@@ -67,7 +69,17 @@ ChatHistory = [
 
 def FirstLayerDMM(prompt: str = "test"):
     print(f"DEBUG: FirstLayerDMM received prompt: '{prompt}'")
-    
+
+    local_decision = intent_classifier.Classify(prompt)
+    if local_decision:
+        print(f"DEBUG: Local intent classifier decided: {local_decision}. Skipping Cohere.")
+        return local_decision
+
+    cached_decision = decision_cache.Get(prompt)
+    if cached_decision:
+        print(f"DEBUG: Reusing cached DMM decision: {cached_decision}")
+        return cached_decision
+
     try:
         stream = co.chat_stream(
             model='command-r-plus',
@@ -103,6 +115,8 @@ def FirstLayerDMM(prompt: str = "test"):
         print(f"WARNING: No recognized functions in response. Falling back to 'general (query)'.")
         return ["general " + prompt]
     else:
+        # Only real Cohere decisions are cached, never the fallback above.
+        decision_cache.Put(prompt, filtered_response)
         return filtered_response
 
 if __name__ == "__main__":
@@ -115,6 +129,8 @@ if __name__ == "__main__":
             
             response = FirstLayerDMM(prompt=user_input)
             print(f"Final DMM Decision: {response}")
+            print(f"Local classifier stats: {intent_classifier.Stats()}")
+            print(f"Decision cache stats: {decision_cache.Stats()}")
             
     except KeyboardInterrupt:
         print("\nExiting DMM test.")
@@ -1,58 +1,140 @@
 import requests
-from bs4 import BeautifulSoup
+import threading
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from time import monotonic, perf_counter
+from dotenv import dotenv_values
+from Backend.AnswerExtractor import ExtractAnswer, SnippetSelectors
+from Backend.TextUtils import NormalizeQuery
 
-def RealtimeSearchEngine(query):
+env_vars = dotenv_values(".env")
+SearchCacheTTL = float(env_vars.get("SearchCacheTTL", 300))
+SearchNegativeCacheTTL = float(env_vars.get("SearchNegativeCacheTTL", 60))
+# Serve an expired answer for this long while a background refresh runs; 0 disables it.
+SearchStaleTTL = float(env_vars.get("SearchStaleTTL", 0))
+# Most distinct queries kept in the search cache; the least recently used are dropped first.
+SearchCacheSize = int(env_vars.get("SearchCacheSize", 256))
+
+NOT_FOUND_ANSWER = "I could not find a clear answer for that query from Google."
+
+def NewSession():
+    new_session = requests.Session()
+    new_session.headers.update({
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    })
+    new_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+    return new_session
+
+# One keep-alive session for every search, so repeat queries skip the TCP/TLS handshake.
+session = NewSession()
+
+# Normalized query -> (answer, fresh_until, stale_until), least recently used first
+search_cache = OrderedDict()
+search_cache_lock = threading.Lock()
+refreshing = set()
+
+def FetchAnswer(query, Cancel=None):
+    """
+    Fetches and parses the Google result page. Network errors propagate to the caller.
+    With Cancel (a threading.Event), the page is downloaded in chunks and the fetch
+    stops with None as soon as the event is set.
+    """
+    url = "https://www.google.com/search"
+
+    if Cancel is None:
+        response = session.get(url, params={"q": query}, timeout=10)
+        response.raise_for_status()
+        page = response.text
+    else:
+        with session.get(url, params={"q": query}, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(16384):
+                if Cancel.is_set():
+                    return None
+                chunks.append(chunk)
+            page = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+        if Cancel.is_set():
+            return None
+
+    selector, result_text = ExtractAnswer(page)
+    if selector in SnippetSelectors:
+        print(f"DEBUG: Found result from a general search snippet with selector '{selector}'.")
+    elif selector:
+        print(f"DEBUG: Found result with selector '{selector}'.")
+
+    return result_text
+
+def CacheAnswer(key, result_text):
+    ttl = SearchCacheTTL if result_text else SearchNegativeCacheTTL
+    now = monotonic()
+    with search_cache_lock:
+        search_cache[key] = (result_text, now + ttl, now + ttl + SearchStaleTTL)
+        search_cache.move_to_end(key)
+        # Entries past their stale window can never be served again.
+        for old_key in [k for k, entry in search_cache.items() if entry[2] <= now]:
+            del search_cache[old_key]
+        while len(search_cache) > SearchCacheSize:
+            search_cache.popitem(last=False)
+
+def RefreshInBackground(key, query):
+    with search_cache_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    def Refresh():
+        try:
+            CacheAnswer(key, FetchAnswer(query))
+            print(f"DEBUG: Refreshed cached search result for '{query}'.")
+        except Exception as e:
+            print(f"WARNING: Background search refresh failed for '{query}': {e}")
+        finally:
+            with search_cache_lock:
+                refreshing.discard(key)
+
+    threading.Thread(target=Refresh, daemon=True).start()
+
+def RealtimeSearchEngine(query, OnToken=None, UseCache=True, Cancel=None):
+    """
+    Returns the best answer snippet for query. OnToken, if given, receives the answer as soon as it is extracted.
+    Cancel is a threading.Event that stops the search early, in which case None is returned and nothing is cached.
+    """
     print(f"DEBUG: Performing real-time search for query: '{query}'")
+    key = NormalizeQuery(query)
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        url = f"https://www.google.com/search?q={query}"
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        entry = None
+        if UseCache:
+            with search_cache_lock:
+                entry = search_cache.get(key)
+                if entry and monotonic() >= entry[2]:
+                    del search_cache[key]
+                    entry = None
+                elif entry:
+                    search_cache.move_to_end(key)
 
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        selectors = [
-            "div.BNeawe",
-            "div.V3yFp",
-            "div.LGOjhe",
-            "div.d6DCz",
-            "span.hgKElc",
-            "div.IZ6rdc",
-            "div.kno-rdesc > span",
-            "div.liYKde > div.ifM9O",
-            "div.webanswers-webanswers_table__webanswers-table-wrapper",
-        ]
-
-        result_text = None
-        for selector in selectors:
-            element = soup.select_one(selector)
-            if element:
-                result_text = element.get_text(strip=True, separator=' ')
-                print(f"DEBUG: Found result with selector '{selector}'.")
-                break
-        
-        if not result_text:
-            print("DEBUG: No direct answer box found. Falling back to general search result snippets.")
-            general_snippet_selectors = [
-                "div.VwiC3b > span.LrzXr",
-                "div.s3v9rd > span",
-                "span.st",
-            ]
-            for selector in general_snippet_selectors:
-                snippet_element = soup.select_one(selector)
-                if snippet_element:
-                    result_text = snippet_element.get_text(strip=True, separator=' ')
-                    print(f"DEBUG: Found result from a general search snippet with selector '{selector}'.")
-                    break
+        now = monotonic()
+        if entry and now < entry[1]:
+            print("DEBUG: Serving search result from cache.")
+            result_text = entry[0]
+        elif entry and now < entry[2]:
+            print("DEBUG: Serving stale search result while refreshing.")
+            result_text = entry[0]
+            RefreshInBackground(key, query)
+        else:
+            result_text = FetchAnswer(query, Cancel)
+            if Cancel is not None and Cancel.is_set():
+                print("DEBUG: Real-time search cancelled.")
+                return None
+            CacheAnswer(key, result_text)
 
         if result_text:
+            if OnToken:
+                OnToken(result_text)
             return result_text
         else:
             print("WARNING: Could not find a suitable result snippet after trying multiple selectors.")
-            return "I could not find a clear answer for that query from Google."
+            return NOT_FOUND_ANSWER
 
     except requests.exceptions.RequestException as e:
         print(f"ERROR: A network error occurred during search: {e}")
@@ -60,4 +142,25 @@ def RealtimeSearchEngine(query):
         
     except Exception as e:
         print(f"ERROR: An unexpected error occurred during search: {e}")
-        return f"An unexpected error occurred while processing your search: {str(e)}"
\ No newline at end of file
+        return f"An unexpected error occurred while processing your search: {str(e)}"
+
+def BenchmarkSearch(query="who is the ceo of google", rounds=5):
+    """Times a cold request, requests over the warm pooled connection, and cache hits."""
+    global session
+    session.close()
+    session = NewSession()
+
+    def Timed(**kwargs):
+        start = perf_counter()
+        RealtimeSearchEngine(query, **kwargs)
+        return (perf_counter() - start) * 1000
+
+    cold = Timed(UseCache=False)
+    warm = sorted(Timed(UseCache=False) for _ in range(rounds))
+    hit = sorted(Timed() for _ in range(rounds))
+    print(f"Cold connection: {cold:.1f} ms")
+    print(f"Warm connection: median {warm[len(warm) // 2]:.1f} ms")
+    print(f"Cache hit:       median {hit[len(hit) // 2]:.3f} ms")
+
+if __name__ == "__main__":
+    BenchmarkSearch()
@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import threading
+from time import perf_counter
+
+
+class Runtime:
+    """
+    One long-lived asyncio event loop on a daemon thread, shared by every async
+    backend module. Synchronous code (Main.py, PyQt slots, worker threads) hands
+    coroutines to it with Submit() or RunSync() instead of creating its own loop.
+    """
+
+    def __init__(self, name="BackendRuntime"):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def Start(self):
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                ready = threading.Event()
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self._Run, args=(ready,), name=self.name, daemon=True)
+                self.thread.start()
+                ready.wait()
+                print(f"DEBUG: {self.name} event loop started.")
+            return self.loop
+
+    def _Run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def InLoopThread(self):
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def Submit(self, coro):
+        """Schedules coro on the runtime loop and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.Start())
+
+    def RunSync(self, coro, timeout=None):
+        """
+        Runs coro on the runtime loop and blocks the calling thread until it finishes.
+        After timeout seconds the coroutine is cancelled and concurrent.futures.TimeoutError raised.
+        """
+        if self.InLoopThread():
+            coro.close()
+            raise RuntimeError("RunSync() would block the runtime loop; await the coroutine instead.")
+        future = self.Submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def CallSoon(self, callback, *args):
+        self.Start().call_soon_threadsafe(callback, *args)
+
+    def Stop(self, timeout=2):
+        with self._lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+        print(f"DEBUG: {self.name} event loop stopped.")
+
+
+runtime = Runtime()
+
+
+def BenchmarkRuntime(turns=200):
+    """Per-turn overhead of a fresh asyncio.run() loop versus submitting to the shared runtime."""
+    async def Turn():
+        # A typical turn hands at least one blocking call to a worker thread.
+        await asyncio.to_thread(lambda: None)
+        await asyncio.sleep(0)
+
+    def Measure(run_turn):
+        timings = []
+        for _ in range(turns):
+            started = perf_counter()
+            run_turn()
+            timings.append(perf_counter() - started)
+        timings.sort()
+        return sum(timings) / len(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+    before = Measure(lambda: asyncio.run(Turn()))
+    runtime.Start()
+    after = Measure(lambda: runtime.RunSync(Turn()))
+    runtime.Stop()
+
+    print(f"asyncio.run() per turn:      mean {before[0]:.3f} ms, p95 {before[1]:.3f} ms")
+    print(f"runtime.RunSync() per turn:  mean {after[0]:.3f} ms, p95 {after[1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    BenchmarkRuntime()
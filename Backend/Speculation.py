@@ -0,0 +1,182 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from time import monotonic
+from dotenv import dotenv_values
+from Backend.TextUtils import NormalizeQuery
+
+env_vars = dotenv_values(".env")
+# Backends to start before FirstLayerDMM has decided; "off" disables speculation.
+SpeculationKinds = [kind.strip() for kind in env_vars.get("Speculation", "realtime,general").split(",")
+                    if kind.strip() and kind.strip() != "off"]
+# Cost guard: speculative calls allowed per backend in any rolling hour.
+SpeculationMaxPerHour = int(env_vars.get("SpeculationMaxPerHour", 60))
+# Decisions made locally or from the decision cache arrive well within this, so no call is wasted on them.
+SpeculationDelay = float(env_vars.get("SpeculationDelay", 0.15))
+
+
+class SpeculativeCall:
+    """One backend call started ahead of the decision. Tokens are held back until the call is confirmed."""
+
+    def __init__(self, kind, query, cancel):
+        self.kind = kind
+        self.query = query
+        self.cancel = cancel
+        self.started = monotonic()
+        self.finished = None
+        self.future = None
+        self._tokens = []
+        self._forward = None
+        self._lock = threading.Lock()
+
+    def Run(self, backend):
+        try:
+            return backend(self.OnToken, self.cancel)
+        finally:
+            self.finished = monotonic()
+
+    def OnToken(self, token):
+        with self._lock:
+            if self._forward:
+                self._forward(token)
+            else:
+                self._tokens.append(token)
+
+    def Result(self, OnToken=None, timeout=None):
+        """
+        Replays held-back tokens to OnToken, then waits up to timeout seconds for the answer.
+        Returns None if the call failed or ran out of time; a late call is cancelled and its
+        remaining tokens are dropped, so the caller can make a normal call instead.
+        """
+        with self._lock:
+            if OnToken:
+                for token in self._tokens:
+                    OnToken(token)
+                self._forward = OnToken
+            self._tokens = []
+        try:
+            return self.future.result(timeout)
+        except FutureTimeoutError:
+            self.cancel.set()
+            with self._lock:
+                self._forward = None
+            print(f"WARNING: Speculative {self.kind} call gave no answer within {timeout:g}s; cancelled it.")
+            return None
+        except Exception as e:
+            print(f"WARNING: Speculative {self.kind} call failed: {e}")
+            return None
+
+
+class Speculation:
+    """Handle for the speculative calls made for one query."""
+
+    def __init__(self, speculator, query, backends):
+        self.speculator = speculator
+        self.query = query
+        self.backends = backends
+        self.calls = {}
+        self.started = monotonic()
+        self.decided = False
+        self._lock = threading.Lock()
+
+    def _Launch(self):
+        with self._lock:
+            if self.decided:
+                self.speculator._Record("skipped")
+                return
+            for kind, backend in self.backends.items():
+                if not self.speculator._Allow(kind):
+                    continue
+                call = SpeculativeCall(kind, self.query, threading.Event())
+                call.future = self.speculator.pool.submit(call.Run, backend)
+                self.calls[kind] = call
+            if self.calls:
+                print(f"DEBUG: Speculatively started {', '.join(self.calls)} for '{self.query}'.")
+
+    def Resolve(self, Decision):
+        """
+        Returns the speculative call the decision confirms, if any, and cancels the rest.
+        A call is confirmed only when the decision is a single general/realtime item for the same query.
+        """
+        decided_at = monotonic()
+        with self._lock:
+            self.decided = True
+            calls = dict(self.calls)
+
+        parts = [item for item in Decision if item.startswith("general") or item.startswith("realtime")]
+        confirmed = None
+        if len(parts) == 1:
+            kind, _, query = parts[0].partition(" ")
+            call = calls.get(kind)
+            if call and NormalizeQuery(query) == NormalizeQuery(self.query):
+                confirmed = call
+
+        for kind, call in calls.items():
+            if call is confirmed:
+                # Time the answer was already being worked on when the decision arrived.
+                self.speculator._Record("wins", saved=min(decided_at, call.finished or decided_at) - call.started)
+            else:
+                call.cancel.set()
+                self.speculator._Record("wasted")
+        if calls:
+            print(f"DEBUG: Speculation {'confirmed ' + confirmed.kind if confirmed else 'missed'} "
+                  f"for '{self.query}'. {self.speculator.Summary()}")
+        return confirmed
+
+
+class Speculator:
+    """
+    Starts likely backend calls while FirstLayerDMM is still deciding and keeps
+    hit/waste/latency counters. Backends are callables taking (OnToken, Cancel).
+    """
+
+    def __init__(self, kinds=SpeculationKinds, max_per_hour=SpeculationMaxPerHour, delay=SpeculationDelay):
+        self.kinds = kinds
+        self.max_per_hour = max_per_hour
+        self.delay = delay
+        self.pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="Speculation")
+        self.stats = {"wins": 0, "wasted": 0, "skipped": 0, "capped": 0, "saved_seconds": 0.0}
+        self._launches = {}
+        self._lock = threading.Lock()
+
+    def Start(self, query, backends):
+        """Schedules the enabled backends for query after SpeculationDelay unless the decision arrives first."""
+        speculation = Speculation(self, query, {k: v for k, v in backends.items() if k in self.kinds})
+        if speculation.backends:
+            timer = threading.Timer(self.delay, speculation._Launch)
+            timer.daemon = True
+            timer.start()
+        return speculation
+
+    def _Allow(self, kind):
+        now = monotonic()
+        with self._lock:
+            launches = self._launches.setdefault(kind, deque())
+            while launches and launches[0] < now - 3600:
+                launches.popleft()
+            if len(launches) >= self.max_per_hour:
+                self.stats["capped"] += 1
+                return False
+            launches.append(now)
+            return True
+
+    def _Record(self, outcome, saved=0.0):
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats["saved_seconds"] += saved
+
+    def Stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        started = stats["wins"] + stats["wasted"]
+        stats["win_rate"] = stats["wins"] / started if started else 0.0
+        return stats
+
+    def Summary(self):
+        stats = self.Stats()
+        return (f"Speculation won {stats['wins']} of {stats['wins'] + stats['wasted']} calls "
+                f"({stats['win_rate']:.0%}), saved {stats['saved_seconds']:.1f}s in total; "
+                f"{stats['skipped']} skipped, {stats['capped']} capped.")
+
+
+speculator = Speculator()
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+SpeechCacheMB = float(env_vars.get("SpeechCacheMB", 50))
+
+SPEECH_CACHE_DIR = os.path.join("Data", "SpeechCache")
+
+
+class SpeechCache:
+    """
+    On-disk LRU cache of synthesized audio, keyed by a hash of the text and
+    voice settings. File modification times carry the LRU order across restarts.
+    """
+
+    def __init__(self, directory=SPEECH_CACHE_DIR, max_bytes=int(SpeechCacheMB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._Load()
+
+    def _Load(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".mp3"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def Key(text, voice, pitch, rate):
+        return hashlib.sha256("\0".join((text, voice, pitch, rate)).encode("utf-8")).hexdigest()
+
+    def _Path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def Contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def Get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._Path(key), "rb") as file:
+                data = file.read()
+            os.utime(self._Path(key))
+        except IOError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def Put(self, key, data):
+        if not data or len(data) > self.max_bytes:
+            return
+        temp_path = self._Path(key) + ".tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, self._Path(key))
+        except IOError as e:
+            print(f"ERROR: Could not write speech cache entry: {e}")
+            return
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_bytes > self.max_bytes and self._entries:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    os.remove(self._Path(old_key))
+                except OSError:
+                    pass
+
+    def Stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+speech_cache = SpeechCache()
@@ -1,21 +1,24 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 from dotenv import dotenv_values
 import os
 import mtranslate as mt
-from time import sleep
-import sys
+from time import sleep, time
+from Backend.StateBus import state_bus, STATUS
 
 # Load environment variables from the .env file.
 env_vars = dotenv_values(".env")
 InputLanguage = env_vars.get("InputLanguage", "en")
 ChromeExecutablePath = env_vars.get("ChromeExecutablePath")
 ChromeProfilePath = env_vars.get("ChromeProfilePath")
+# Seconds to wait for one utterance before giving up on the turn.
+SpeechTimeout = float(env_vars.get("SpeechTimeout", 30))
+# "browser": webkitSpeechRecognition in headless Chrome (online).
+# "local": microphone + voice activity detection + offline Vosk model (see Backend/LocalSpeech.py).
+SpeechBackend = env_vars.get("SpeechBackend", "browser").strip().lower()
 
 
 HtmlCode = '''<!DOCTYPE html>
@@ -28,89 +31,201 @@ HtmlCode = '''<!DOCTYPE html>
     <button id="end" onclick="stopRecognition()">Stop Recognition</button>
     <p id="output"></p>
     <script>
+        // Loaded once and kept open. Python asks for each utterance with
+        // execute_async_script("nextTranscript(callback)") and the result is pushed
+        // back through the callback instead of being polled from the DOM.
         const output = document.getElementById('output');
         let recognition = null;
-        let finalTranscript = '';
+        let listening = false;
+        let speechEnd = 0;
+        let waiting = null;
+        const results = [];
 
-        function startRecognition() {
-            output.textContent = '';
-            if (recognition) {
-                recognition.stop();
+        function deliver(result) {
+            if (waiting) {
+                const callback = waiting;
+                waiting = null;
+                callback(result);
+            } else {
+                results.push(result);
             }
-            recognition = new webkitSpeechRecognition() || new SpeechRecognition();
+        }
+
+        function createRecognition() {
+            const Recognition = window.SpeechRecognition || window.webkitSpeechRecognition;
+            recognition = new Recognition();
             recognition.lang = '{language}';
             recognition.interimResults = false;
             recognition.continuous = false;
 
+            recognition.onspeechend = function() {
+                speechEnd = Date.now();
+            };
+
             recognition.onresult = function(event) {
                 const transcript = event.results[event.results.length - 1][0].transcript;
-                finalTranscript += transcript;
-                output.textContent = finalTranscript;
+                output.textContent = transcript;
+                deliver({text: transcript, speechEnd: speechEnd || Date.now(), resultAt: Date.now()});
                 recognition.stop();
             };
-            
+
             recognition.onend = function() {
                 console.log("Recognition ended.");
+                listening = false;
+                speechEnd = 0;
             };
-            
+
             recognition.onerror = function(event) {
                 console.error("Speech recognition error:", event.error);
                 output.textContent = "Error: " + event.error;
+                // "no-speech" just means the user stayed silent; Python asks again.
+                deliver({error: event.error});
             };
+        }
 
-            recognition.start();
+        function startRecognition() {
+            output.textContent = '';
+            if (!recognition) {
+                createRecognition();
+            }
+            if (!listening) {
+                listening = true;
+                recognition.start();
+            }
         }
 
         function stopRecognition() {
-            if (recognition) {
+            if (recognition && listening) {
                 recognition.stop();
             }
         }
+
+        function nextTranscript(callback) {
+            if (results.length) {
+                callback(results.shift());
+                return;
+            }
+            waiting = callback;
+            startRecognition();
+        }
+
+        function cancelTranscript() {
+            // Anything heard for the turn that gave up must not answer the next one.
+            waiting = null;
+            results.length = 0;
+            stopRecognition();
+        }
     </script>
 </body>
 </html>'''.replace('{language}', InputLanguage)
 
-try:
-    if not os.path.exists("Data"):
-        os.makedirs("Data")
-    with open(os.path.join("Data", "Voice.html"), "w") as f:
-        f.write(HtmlCode)
-    print("DEBUG: Voice.html written successfully.")
-except Exception as e:
-    print(f"CRITICAL ERROR: Failed to write Voice.html: {e}")
-    sys.exit(1)
-
 current_dir = os.getcwd()
 Link = f"file:///{os.path.join(current_dir, 'Data', 'Voice.html')}"
 
-chrome_options = Options()
-user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.142.86 Safari/537.36"
-chrome_options.add_argument(f'user-agent={user_agent}')
-chrome_options.add_argument("--use-fake-ui-for-media-stream")
-chrome_options.add_argument("--use-fake-device-for-media-stream")
-chrome_options.add_argument("--headless=new")
-if ChromeExecutablePath and os.path.exists(ChromeExecutablePath):
-    chrome_options.binary_location = ChromeExecutablePath
-if ChromeProfilePath and os.path.exists(ChromeProfilePath):
-    chrome_options.add_argument(f"user-data-dir={ChromeProfilePath}")
-
-speech_driver = None
-try:
-    service = Service(ChromeDriverManager().install())
-    speech_driver = webdriver.Chrome(service=service, options=chrome_options)
-    print("DEBUG: Chrome WebDriver initialized successfully.")
-except Exception as e:
-    print(f"CRITICAL ERROR: Failed to initialize Chrome WebDriver: {e}")
-    sys.exit(1)
-
-TempDirPath = os.path.join(current_dir, "Frontend", "Files")
+
+class BrowserRecognizer:
+    """
+    webkitSpeechRecognition in a headless Chrome page. Chrome is started and
+    Voice.html loaded on the first Listen(); the page then stays open and pushes
+    each transcript back through execute_async_script.
+    """
+    name = "browser"
+
+    def __init__(self, timeout=SpeechTimeout):
+        self.timeout = timeout
+        self.driver = None
+        self.page_loaded = False
+
+    def Start(self):
+        if self.driver is not None:
+            return
+        os.makedirs("Data", exist_ok=True)
+        with open(os.path.join("Data", "Voice.html"), "w") as f:
+            f.write(HtmlCode)
+        print("DEBUG: Voice.html written successfully.")
+
+        chrome_options = Options()
+        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.142.86 Safari/537.36"
+        chrome_options.add_argument(f'user-agent={user_agent}')
+        chrome_options.add_argument("--use-fake-ui-for-media-stream")
+        chrome_options.add_argument("--use-fake-device-for-media-stream")
+        chrome_options.add_argument("--headless=new")
+        if ChromeExecutablePath and os.path.exists(ChromeExecutablePath):
+            chrome_options.binary_location = ChromeExecutablePath
+        if ChromeProfilePath and os.path.exists(ChromeProfilePath):
+            chrome_options.add_argument(f"user-data-dir={ChromeProfilePath}")
+
+        service = Service(ChromeDriverManager().install())
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.driver.set_script_timeout(self.timeout)
+        print("DEBUG: Chrome WebDriver initialized successfully.")
+
+    def NextTranscript(self):
+        """Blocks until Voice.html pushes the next recognition result, or the timeout passes."""
+        self.Start()
+        if not self.page_loaded:
+            started = time()
+            self.driver.get(Link)
+            self.page_loaded = True
+            print(f"DEBUG: Voice.html loaded in {(time() - started) * 1000:.0f} ms.")
+        try:
+            return self.driver.execute_async_script("nextTranscript(arguments[arguments.length - 1]);")
+        except TimeoutException:
+            try:
+                self.driver.execute_script("cancelTranscript();")
+            except WebDriverException as e:
+                # The page is gone; it is loaded again next turn.
+                print(f"WARNING: Could not cancel the pending transcript: {e}")
+                self.page_loaded = False
+            raise
+        except WebDriverException:
+            # The page or its script is gone; load it again next turn.
+            self.page_loaded = False
+            raise
+
+    def Listen(self):
+        try:
+            result = self.NextTranscript()
+        except TimeoutException:
+            print(f"DEBUG: No speech recognized within {self.timeout:.0f}s.")
+            return ""
+        received = time() * 1000
+        if result.get("error"):
+            print(f"DEBUG: Browser speech recognition ended without text: {result['error']}")
+            return ""
+        Text = result.get("text", "").strip()
+        print(f"DEBUG: Recognized text from browser: '{Text}' "
+              f"(end of speech to text: {received - result['speechEnd']:.0f} ms, "
+              f"delivery: {received - result['resultAt']:.0f} ms)")
+        return Text
+
+    def Close(self):
+        if self.driver is not None:
+            print("DEBUG: Quitting speech recognition WebDriver.")
+            self.driver.quit()
+            self.driver = None
+            self.page_loaded = False
+
+
+def CreateRecognizer(backend=SpeechBackend):
+    """Returns the recognizer for SpeechBackend, falling back to the browser if the local one cannot run."""
+    if backend == "local":
+        try:
+            from Backend.LocalSpeech import LocalRecognizer
+            return LocalRecognizer()
+        except (ImportError, RuntimeError) as e:
+            print(f"ERROR: Local speech backend unavailable, using the browser instead: {e}")
+    elif backend != "browser":
+        print(f"WARNING: Unknown SpeechBackend '{backend}', using the browser.")
+    return BrowserRecognizer()
+
+
+# Every recognizer has Listen() -> recognized text or "", and Close().
+speech_recognizer = CreateRecognizer()
+print(f"DEBUG: Speech recognition backend: {speech_recognizer.name}.")
 
 def SetAssistantStatus(Status):
-    try:
-        with open(os.path.join(TempDirPath, 'Status.data'), "w", encoding='utf-8') as file:
-            file.write(Status)
-    except IOError as e:
-        print(f"ERROR: Could not write status to Status.data: {e}")
+    state_bus.Publish(STATUS, Status)
 
 def QueryModifier(Query):
     if not Query:
@@ -153,23 +268,11 @@ def UniversalTranslator(Text):
         return ""
 
 def SpeechRecognition():
-    print("DEBUG: Starting SpeechRecognition in Selenium browser.")
+    print(f"DEBUG: Starting SpeechRecognition with the {speech_recognizer.name} backend.")
     SetAssistantStatus("Listening...")
     try:
-        speech_driver.get(Link)
-        speech_driver.find_element(by=By.ID, value="start").click()
-        print("DEBUG: Recognition started in browser. Waiting for text...")
-        
-        wait = WebDriverWait(speech_driver, 30)
-        output_element = wait.until(
-            lambda driver: speech_driver.find_element(by=By.ID, value="output").text.strip() != ""
-        )
-        
-        Text = output_element.text.strip()
-        print(f"DEBUG: Recognized text from browser: '{Text}'")
-        
-        speech_driver.find_element(by=By.ID, value="end").click()
-        
+        Text = speech_recognizer.Listen()
+
         if Text:
             if InputLanguage.lower() == "en" or "en" in InputLanguage.lower():
                 return QueryModifier(Text)
@@ -179,7 +282,7 @@ def SpeechRecognition():
                 return QueryModifier(translated_query)
         else:
             return ""
-            
+
     except Exception as e:
         print(f"ERROR: SpeechRecognition failed or timed out: {e}")
         SetAssistantStatus("Recognition Failed.")
@@ -195,5 +298,5 @@ if __name__ == "__main__":
                 print("No text recognized or an error occurred.")
             sleep(1)
     finally:
-        print("Closing WebDriver.")
-        speech_driver.quit()
\ No newline at end of file
+        print("Closing speech recognizer.")
+        speech_recognizer.Close()
\ No newline at end of file
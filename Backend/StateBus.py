@@ -0,0 +1,192 @@
+import threading
+import os
+from time import perf_counter, sleep
+from dotenv import dotenv_values
+
+env_vars = dotenv_values(".env")
+
+# When enabled, every published value is also written to Frontend/Files/<Key>.data
+# so external tools that still read the old polling files keep working.
+StateFileMirror = str(env_vars.get("StateFileMirror", "False")).strip().lower() == "true"
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+TempDirPath = os.path.join(os.path.dirname(current_dir), "Frontend", "Files")
+
+# Bus keys and the legacy file each one mirrors to.
+MIC = "Mic"
+STATUS = "Status"
+RESPONSES = "Responses"
+# Event-style keys: subscribers get every chunk, Get() only returns the latest one.
+STREAM = "Stream"
+STREAM_END = "StreamEnd"
+# JSON progress events from the image generation worker.
+IMAGE_JOB = "ImageJob"
+
+MirrorFiles = {
+    MIC: "Mic.data",
+    STATUS: "Status.data",
+    RESPONSES: "Responses.data",
+}
+
+
+class StateBus:
+    """Thread-safe key/value store that pushes every change to its subscribers."""
+
+    def __init__(self, mirror=False):
+        self.mirror = mirror
+        self._values = {}
+        self._subscribers = {}
+        self._condition = threading.Condition()
+
+    def Publish(self, key, value):
+        with self._condition:
+            self._values[key] = value
+            callbacks = list(self._subscribers.get(key, ()))
+            self._condition.notify_all()
+
+        if self.mirror and key in MirrorFiles:
+            try:
+                with open(os.path.join(TempDirPath, MirrorFiles[key]), "w", encoding='utf-8') as file:
+                    file.write(value)
+            except IOError as e:
+                print(f"ERROR: Could not mirror '{key}' to {MirrorFiles[key]}: {e}")
+
+        for callback in callbacks:
+            try:
+                callback(key, value)
+            except Exception as e:
+                print(f"ERROR: StateBus subscriber for '{key}' failed: {e}")
+
+    def Get(self, key, default=""):
+        with self._condition:
+            return self._values.get(key, default)
+
+    def Subscribe(self, key, callback):
+        """Registers callback(key, value); it runs on the publishing thread."""
+        with self._condition:
+            self._subscribers.setdefault(key, []).append(callback)
+
+    def Unsubscribe(self, key, callback):
+        with self._condition:
+            if callback in self._subscribers.get(key, ()):
+                self._subscribers[key].remove(callback)
+
+    def WaitFor(self, key, value, timeout=None):
+        """Blocks until key equals value. Returns False if the timeout expired first."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._values.get(key) == value, timeout)
+
+    def LoadMirror(self):
+        """Seeds the bus from the legacy .data files, if they exist."""
+        for key, filename in MirrorFiles.items():
+            path = os.path.join(TempDirPath, filename)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding='utf-8') as file:
+                        with self._condition:
+                            self._values[key] = file.read().strip()
+                except IOError as e:
+                    print(f"ERROR: Could not read {path}: {e}")
+
+
+state_bus = StateBus(mirror=StateFileMirror)
+state_bus.LoadMirror()
+
+
+def BenchmarkStateBus(rounds=200, idle_seconds=2.0, wake_timeout=1.0):
+    """
+    Compares mic-toggle-to-reaction latency and idle reads for the file and bus modes.
+    Works in a temporary directory; a reaction slower than wake_timeout counts as a miss.
+    Returns True if nothing was missed.
+    """
+    import shutil
+    import tempfile
+
+    bench_dir = tempfile.mkdtemp(prefix="StateBusBench")
+    bench_file = os.path.join(bench_dir, "BenchMic.data")
+
+    def Percentile(samples, fraction):
+        if not samples:
+            return float("nan")
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+    # File mode: the consumer re-opens the file every 100 ms, like the old FirstThread.
+    reads = [0]
+    seen = threading.Event()
+    stop = threading.Event()
+
+    def FilePoller():
+        while not stop.is_set():
+            with open(bench_file, "r", encoding='utf-8') as file:
+                reads[0] += 1
+                if file.read().strip() == "True":
+                    seen.set()
+            sleep(0.1)
+
+    file_latencies = []
+    file_misses = 0
+    try:
+        with open(bench_file, "w", encoding='utf-8') as file:
+            file.write("False")
+        poller = threading.Thread(target=FilePoller, daemon=True)
+        poller.start()
+        sleep(idle_seconds)
+        file_idle_reads = reads[0] / idle_seconds
+
+        for _ in range(min(rounds, 20)):
+            seen.clear()
+            start = perf_counter()
+            with open(bench_file, "w", encoding='utf-8') as file:
+                file.write("True")
+            if seen.wait(wake_timeout):
+                file_latencies.append(perf_counter() - start)
+            else:
+                file_misses += 1
+            with open(bench_file, "w", encoding='utf-8') as file:
+                file.write("False")
+            sleep(0.15)
+        stop.set()
+        poller.join()
+    finally:
+        stop.set()
+        shutil.rmtree(bench_dir, ignore_errors=True)
+
+    # Bus mode: the consumer blocks on the condition and wakes on publish. Every look
+    # the consumer takes at the value is counted as a read.
+    class CountingValues(dict):
+        def get(self, *args):
+            reads[0] += 1
+            return super().get(*args)
+
+    bus = StateBus()
+    bus._values = CountingValues()
+    reads[0] = 0
+    bus.WaitFor(MIC, "True", timeout=idle_seconds)
+    bus_idle_reads = reads[0] / idle_seconds
+
+    bus_latencies = []
+    bus_misses = 0
+    for i in range(rounds):
+        woke = threading.Event()
+        waiter = threading.Thread(target=lambda: bus.WaitFor(MIC, str(i), timeout=wake_timeout) and woke.set(), daemon=True)
+        waiter.start()
+        sleep(0.001)
+        start = perf_counter()
+        bus.Publish(MIC, str(i))
+        if woke.wait(wake_timeout):
+            bus_latencies.append(perf_counter() - start)
+        else:
+            bus_misses += 1
+        waiter.join()
+
+    print(f"File mode: p50 {Percentile(file_latencies, 0.5):.2f} ms, p95 {Percentile(file_latencies, 0.95):.2f} ms, "
+          f"idle reads {file_idle_reads:.1f}/s, {file_misses} missed")
+    print(f"Bus mode:  p50 {Percentile(bus_latencies, 0.5):.3f} ms, p95 {Percentile(bus_latencies, 0.95):.3f} ms, "
+          f"idle reads {bus_idle_reads:.1f}/s, {bus_misses} missed")
+    return file_misses == 0 and bus_misses == 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if BenchmarkStateBus() else 1)
@@ -1,10 +1,14 @@
+import asyncio
 import pygame
 import random
-import asyncio
 import edge_tts
-import os
+import io
+import re
+from concurrent.futures import Future
 from dotenv import dotenv_values
-from time import sleep
+from time import sleep, perf_counter
+from Backend.Runtime import runtime
+from Backend.SpeechCache import speech_cache
 
 env_vars = dotenv_values(".env")
 AssistantVoice = env_vars.get("AssistantVoice")
@@ -13,12 +17,41 @@ if not isinstance(AssistantVoice, str):
     print("Warning: AssistantVoice not found or not a string in .env. Using 'en-US-AriaNeural' as default.")
     AssistantVoice = "en-US-AriaNeural"
 
-AUDIO_FILE_PATH = os.path.join("Data", "speech.mp3")
+VoicePitch = '+5Hz'
+VoiceRate = '+13%'
+
+# How many sentences are synthesized ahead of the one that is playing.
+PREFETCH_SENTENCES = 2
+
+# Spoken after the first sentences of a long answer; pre-warmed into the speech cache.
+CannedResponses = [
+    "The rest of the result has been printed to the chat screen, kindly check it out sir.",
+    "The rest of the text is now on the chat screen, sir, please check it.",
+    "You can see the rest of the text on the chat screen, sir.",
+    "The remaining part of the text is now on the chat screen, sir.",
+    "Sir, you'll find more text on the chat screen for you to see.",
+    "The rest of the answer is now on the chat screen, sir.",
+    "Sir, please look at the chat screen, the rest of the answer is there.",
+    "You'll find the complete answer on the chat screen, sir.",
+    "The next part of the text is on the chat screen, sir.",
+    "Sir, please check the chat screen for more information.",
+    "There's more text on the chat screen for you, sir.",
+    "Sir, take a look at the chat screen for additional text.",
+    "You'll find more to read on the chat screen, sir.",
+    "Sir, check the chat screen for the rest of the text.",
+    "The chat screen has the rest of the text, sir.",
+    "There's more to see on the chat screen, sir, please look.",
+    "Sir, the chat screen holds the continuation of the text.",
+    "You'll find the complete answer on the chat screen, kindly check it out sir.",
+    "Please review the chat screen for the rest of the text, sir.",
+    "Sir, look at the chat screen for the complete answer."
+]
 
 is_mixer_initialized = False
 
 def TTS_init():
     global is_mixer_initialized
+    PrewarmSpeech(CannedResponses)
     if not is_mixer_initialized:
         print("DEBUG: Initializing pygame mixer.")
         try:
@@ -42,16 +75,63 @@ def TTS_quit():
         except Exception as e:
             print(f"ERROR: Failed to quit pygame mixer: {e}")
 
-async def TextToAudioFile(text) -> None:
-    if os.path.exists(AUDIO_FILE_PATH):
-        os.remove(AUDIO_FILE_PATH)
-    
-    print(f"DEBUG: Generating audio for text: '{text[:50]}...'")
-    communicate = edge_tts.Communicate(text, AssistantVoice, pitch='+5Hz', rate='+13%')
-    await communicate.save(AUDIO_FILE_PATH)
-    print("DEBUG: Audio file saved.")
-
-def TTS(Text):
+def SplitSentences(text):
+    """Splits text into sentences so the first one can play while the rest synthesize."""
+    sentences = []
+    for part in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if sentences and len(sentences[-1]) < 40:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        elif part:
+            sentences.append(part)
+    return sentences
+
+def SpeechCacheKey(text):
+    return speech_cache.Key(text, AssistantVoice, VoicePitch, VoiceRate)
+
+async def TextToAudioBytes(text) -> bytes:
+    communicate = edge_tts.Communicate(text, AssistantVoice, pitch=VoicePitch, rate=VoiceRate)
+    buffer = io.BytesIO()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            buffer.write(chunk["data"])
+    audio = buffer.getvalue()
+    # The cache file write and any evictions stay off the shared event loop.
+    await asyncio.to_thread(speech_cache.Put, SpeechCacheKey(text), audio)
+    return audio
+
+def RequestAudio(text):
+    """Returns a future for the audio of text, already resolved on a speech cache hit."""
+    audio = speech_cache.Get(SpeechCacheKey(text))
+    if audio is not None:
+        future = Future()
+        future.set_result(audio)
+        return future
+    # edge_tts requests run on the shared backend event loop.
+    return runtime.Submit(TextToAudioBytes(text))
+
+async def PrewarmAudio(phrases):
+    synthesized = 0
+    for phrase in phrases:
+        for sentence in SplitSentences(phrase):
+            if speech_cache.Contains(SpeechCacheKey(sentence)):
+                continue
+            try:
+                await TextToAudioBytes(sentence)
+                synthesized += 1
+            except Exception as e:
+                print(f"WARNING: Could not pre-warm speech for '{sentence[:30]}...': {e}")
+                return
+    print(f"DEBUG: Speech cache pre-warmed ({synthesized} new clips). Stats: {speech_cache.Stats()}")
+
+def PrewarmSpeech(phrases):
+    """Synthesizes phrases into the speech cache in the background."""
+    runtime.Submit(PrewarmAudio(list(phrases)))
+
+def SpeechCacheStats():
+    return speech_cache.Stats()
+
+def TTS(Text, Tail=None):
+    """Speaks Text, then Tail (if given) as its own clip so it can come from the speech cache."""
     if not is_mixer_initialized:
         print("ERROR: Pygame mixer is not initialized. Cannot play audio.")
         return
@@ -61,14 +141,28 @@ def TTS(Text):
             print("DEBUG: No text to speak.")
             return
 
-        asyncio.run(TextToAudioFile(Text))
+        started = perf_counter()
+        sentences = SplitSentences(Text) + ([Tail] if Tail else [])
+        print(f"DEBUG: Generating audio for text: '{Text[:50]}...' in {len(sentences)} part(s)")
+
+        pending = []
+        for i, sentence in enumerate(sentences):
+            while len(pending) < PREFETCH_SENTENCES and i + len(pending) < len(sentences):
+                pending.append(RequestAudio(sentences[i + len(pending)]))
+            audio = pending.pop(0).result(timeout=30)
+            if not audio:
+                continue
+
+            while pygame.mixer.music.get_busy():
+                sleep(0.02)
+            pygame.mixer.music.load(io.BytesIO(audio), "mp3")
+            pygame.mixer.music.play()
+            if i == 0:
+                print(f"DEBUG: First audio playing {(perf_counter() - started) * 1000:.0f} ms after TTS call.")
 
-        pygame.mixer.music.load(AUDIO_FILE_PATH)
-        pygame.mixer.music.play()
-        
         while pygame.mixer.music.get_busy():
-            sleep(0.1)
-        
+            sleep(0.02)
+
         pygame.mixer.music.stop()
         print("DEBUG: Audio playback finished.")
 
@@ -82,32 +176,9 @@ def TextToSpeech(Text):
 
     Data = str(Text).split(".")
 
-    responses = [
-        "The rest of the result has been printed to the chat screen, kindly check it out sir.",
-        "The rest of the text is now on the chat screen, sir, please check it.",
-        "You can see the rest of the text on the chat screen, sir.",
-        "The remaining part of the text is now on the chat screen, sir.",
-        "Sir, you'll find more text on the chat screen for you to see.",
-        "The rest of the answer is now on the chat screen, sir.",
-        "Sir, please look at the chat screen, the rest of the answer is there.",
-        "You'll find the complete answer on the chat screen, sir.",
-        "The next part of the text is on the chat screen, sir.",
-        "Sir, please check the chat screen for more information.",
-        "There's more text on the chat screen for you, sir.",
-        "Sir, take a look at the chat screen for additional text.",
-        "You'll find more to read on the chat screen, sir.",
-        "Sir, check the chat screen for the rest of the text.",
-        "The chat screen has the rest of the text, sir.",
-        "There's more to see on the chat screen, sir, please look.",
-        "Sir, the chat screen holds the continuation of the text.",
-        "You'll find the complete answer on the chat screen, kindly check it out sir.",
-        "Please review the chat screen for the rest of the text, sir.",
-        "Sir, look at the chat screen for the complete answer."
-    ]
-
     if len(Data) > 4 and len(Text) >= 250:
-        shortened_text = " ".join(Data[0:2]).strip() + ". " + random.choice(responses)
-        TTS(shortened_text)
+        shortened_text = " ".join(Data[0:2]).strip() + "."
+        TTS(shortened_text, Tail=random.choice(CannedResponses))
         print(f"DEBUG: Spoke shortened text. Full text: {Text}")
     else:
         TTS(Text)
@@ -119,6 +190,7 @@ if __name__ == "__main__":
             if text_input.lower() == "exit":
                 break
             TextToSpeech(text_input)
+        print(f"Speech cache: {SpeechCacheStats()}")
         TTS_quit()
     else:
         print("Failed to initialize TTS. Exiting.")
\ No newline at end of file
@@ -0,0 +1,6 @@
+import re
+
+
+def NormalizeQuery(query):
+    """Lower-cased, whitespace-collapsed query without trailing punctuation; the shared key for caches and matching."""
+    return re.sub(r"\s+", " ", query.lower().strip()).rstrip(".?!").strip()
@@ -1,15 +1,24 @@
-from PyQt5.QtGui import (QIcon, QPainter, QMovie, QColor, QTextCharFormat, QFont, QPixmap, QTextBlockFormat)
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QFrame, QLabel, QSizePolicy, QTextEdit, QStackedWidget, QWidget, QLineEdit, QGridLayout, QVBoxLayout, QHBoxLayout, QPushButton)
-from PyQt5.QtCore import Qt, QSize, QTimer, QUrl, QRect
+from PyQt5.QtGui import (QIcon, QPainter, QMovie, QColor, QTextCharFormat, QFont, QPixmap, QTextBlockFormat, QImage, QImageReader)
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QFrame, QLabel, QSizePolicy, QTextEdit, QStackedWidget, QWidget, QLineEdit, QGridLayout, QVBoxLayout, QHBoxLayout, QPushButton, QScrollArea)
+from PyQt5.QtCore import Qt, QSize, QTimer, QUrl, QRect, QObject, pyqtSignal, QRunnable, QThreadPool
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from dotenv import dotenv_values
 import sys
 import os
+import json
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Backend.StateBus import state_bus, MIC, STATUS, RESPONSES, STREAM, STREAM_END, IMAGE_JOB
 
 # Load environment variables from .env file
 env_vars = dotenv_values(".env")
 Assistantname = env_vars.get("Assistantname", "Purva") # Provide a default if not found
 Username = env_vars.get("Username", "User")
+# Image gallery: thumbnail edge in pixels, decoder threads and how many thumbnails stay in the strip.
+GalleryThumbnailSize = int(env_vars.get("GalleryThumbnailSize", 160))
+GalleryWorkers = int(env_vars.get("GalleryWorkers", 2))
+GalleryMaxImages = int(env_vars.get("GalleryMaxImages", 24))
 
 # Define global paths for temporary files and graphics
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -56,46 +65,21 @@ def QueryModifier(query):
     return new_query.capitalize()
 
 def SetMicrophoneStatus(command):
-    try:
-        with open(TempDirectoryPath('Mic.data'), "w", encoding='utf-8') as file:
-            file.write(command)
-        print(f"GUI DEBUG: Set microphone status to: {command}")
-    except IOError as e:
-        print(f"GUI ERROR: Error writing microphone status: {e}")
+    state_bus.Publish(MIC, command)
+    print(f"GUI DEBUG: Set microphone status to: {command}")
 
 def GetMicrophoneStatus():
-    try:
-        with open(TempDirectoryPath('Mic.data'), "r", encoding='utf-8') as file:
-            status = file.read().strip()
-            return status
-    except FileNotFoundError:
-        print("GUI WARNING: Mic.data not found, returning default 'False'.")
-        SetMicrophoneStatus("False")
-        return "False"
-    except IOError as e:
-        print(f"GUI ERROR: Error reading microphone status: {e}")
-        return "False"
+    return state_bus.Get(MIC, "False")
 
 def SetAssistantStatus(status):
-    try:
-        with open(TempDirectoryPath('Status.data'), "w", encoding='utf-8') as file:
-            file.write(status)
-        print(f"GUI DEBUG: Set assistant status to: {status}")
-    except IOError as e:
-        print(f"GUI ERROR: Error writing assistant status: {e}")
+    state_bus.Publish(STATUS, status)
+    print(f"GUI DEBUG: Set assistant status to: {status}")
 
 def GetAssistantStatus():
-    try:
-        with open(TempDirectoryPath('Status.data'), "r", encoding='utf-8') as file:
-            status = file.read().strip()
-            return status
-    except FileNotFoundError:
-        print("GUI WARNING: Status.data not found, returning empty string.")
-        SetAssistantStatus("Idle")
-        return "Idle"
-    except IOError as e:
-        print(f"GUI ERROR: Error reading assistant status: {e}")
-        return ""
+    return state_bus.Get(STATUS, "Idle")
+
+def GetResponses():
+    return state_bus.Get(RESPONSES, "")
 
 def MicButtonInitialed():
     SetMicrophoneStatus("True")
@@ -116,17 +100,41 @@ def TempDirectoryPath(filename):
     return path
 
 def ShowTextToScreen(text):
-    try:
-        with open(TempDirectoryPath('Responses.data'), "w", encoding='utf-8') as file:
-            file.write(text)
-        print(f"GUI DEBUG: Wrote to Responses.data: '{text[:50]}...'")
-    except IOError as e:
-        print(f"GUI ERROR: Error writing text to Responses.data: {e}")
+    state_bus.Publish(RESPONSES, text)
+    print(f"GUI DEBUG: Published response: '{text[:50]}...'")
+
+def StreamTextToScreen(chunk):
+    """Appends partial answer text to the message being streamed. ShowTextToScreen() replaces it with the final text."""
+    if chunk:
+        state_bus.Publish(STREAM, chunk)
+
+def EndStreamToScreen():
+    """Closes a streamed message that will not be followed by a final ShowTextToScreen()."""
+    state_bus.Publish(STREAM_END, "")
+
+class StateSignalBridge(QObject):
+    """Re-emits StateBus changes as a Qt signal so widgets update on the GUI thread."""
+    stateChanged = pyqtSignal(str, str)
+
+    def __init__(self, keys, parent=None):
+        super().__init__(parent)
+        self.keys = keys
+        for key in keys:
+            state_bus.Subscribe(key, self.relay)
+
+    def relay(self, key, value):
+        self.stateChanged.emit(key, value)
+
+    def detach(self):
+        for key in self.keys:
+            state_bus.Unsubscribe(key, self.relay)
 
 class ChatSection(QWidget):
     def __init__(self):
         super(ChatSection, self).__init__()
         self.old_chat_message = ""
+        self.stream_buffer = []
+        self.stream_start = None
 
         layout = QVBoxLayout(self)
         layout.setContentsMargins(-10, 40, 40, 100)
@@ -173,10 +181,17 @@ class ChatSection(QWidget):
         font.setPointSize(13)
         self.chat_text_edit.setFont(font)
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.loadMessages)
-        self.timer.timeout.connect(self.SpeechRecogText)
-        self.timer.start(200)
+        # Streamed tokens are buffered and painted together at most every 50 ms.
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.setInterval(50)
+        self.stream_timer.timeout.connect(self.flushStream)
+
+        self.state_bridge = StateSignalBridge([RESPONSES, STATUS, STREAM, STREAM_END], self)
+        self.state_bridge.stateChanged.connect(self.onStateChanged)
+        self.destroyed.connect(lambda *args: self.state_bridge.detach())
+        self.loadMessages(GetResponses())
+        self.SpeechRecogText(GetAssistantStatus())
         self.chat_text_edit.viewport().installEventFilter(self)
 
         self.setStyleSheet("""
@@ -217,30 +232,56 @@ class ChatSection(QWidget):
             }
         """)
 
-    def loadMessages(self):
-        file_path = TempDirectoryPath('Responses.data')
-        messages = ""
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                messages = file.read().strip()
-        except FileNotFoundError:
-            pass
-        except IOError as e:
-            print(f"GUI ERROR: Error reading {file_path}: {e}")
+    def onStateChanged(self, key, value):
+        if key == RESPONSES:
+            self.loadMessages(value)
+        elif key == STATUS:
+            self.SpeechRecogText(value)
+        elif key == STREAM:
+            self.stream_buffer.append(value)
+            if not self.stream_timer.isActive():
+                self.stream_timer.start()
+        elif key == STREAM_END:
+            self.flushStream()
+            self.stream_start = None
+
+    def flushStream(self):
+        if not self.stream_buffer:
             return
+        text = "".join(self.stream_buffer)
+        self.stream_buffer = []
+        if self.stream_start is None:
+            self.stream_start = self.addMessage(messages=text)
+            return
+        cursor = self.chat_text_edit.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText(text)
+        self.chat_text_edit.setTextCursor(cursor)
+        self.chat_text_edit.verticalScrollBar().setValue(self.chat_text_edit.verticalScrollBar().maximum())
+
+    def finishStream(self, messages):
+        self.stream_timer.stop()
+        self.flushStream()
+        cursor = self.chat_text_edit.textCursor()
+        cursor.setPosition(self.stream_start)
+        cursor.movePosition(cursor.End, cursor.KeepAnchor)
+        cursor.insertText(messages)
+        self.stream_start = None
+        self.chat_text_edit.setTextCursor(cursor)
+        self.chat_text_edit.verticalScrollBar().setValue(self.chat_text_edit.verticalScrollBar().maximum())
 
-        if messages and self.old_chat_message != messages:
+    def loadMessages(self, messages):
+        messages = messages.strip()
+        if messages and (self.stream_start is not None or self.stream_buffer):
+            self.finishStream(messages)
+            self.old_chat_message = messages
+        elif messages and self.old_chat_message != messages:
             print(f"GUI DEBUG: New messages loaded: '{messages[:50]}...'")
             self.addMessage(messages=messages)
             self.old_chat_message = messages
 
-    def SpeechRecogText(self):
-        try:
-            messages = GetAssistantStatus()
-            self.label.setText(messages)
-        except Exception as e:
-            print(f"GUI ERROR: Error in ChatSection.SpeechRecogText: {e}")
-            self.label.setText("Error loading status.")
+    def SpeechRecogText(self, messages):
+        self.label.setText(messages)
 
     def addMessage(self, messages):
         cursor = self.chat_text_edit.textCursor()
@@ -265,12 +306,184 @@ class ChatSection(QWidget):
 
         cursor.insertBlock(block_format)
         cursor.setCharFormat(format_char)
+        start = cursor.position()
         cursor.insertText(messages)
 
         self.chat_text_edit.setTextCursor(cursor)
         self.chat_text_edit.verticalScrollBar().setValue(self.chat_text_edit.verticalScrollBar().maximum())
+        return start
 
 
+class ImageLoadSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+
+class ImageLoadTask(QRunnable):
+    """Decodes an image on a QThreadPool thread, downscaled while decoding to fit size (None keeps full resolution)."""
+
+    def __init__(self, path, size, signals):
+        super().__init__()
+        self.path = path
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        if self.size is not None and reader.size().isValid():
+            # JPEG decoders scale during decoding, far cheaper than decoding 1024px and scaling after.
+            reader.setScaledSize(reader.size().scaled(self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            print(f"GUI WARNING: Could not decode image {self.path}: {reader.errorString()}")
+        self.signals.loaded.emit(self.path, image)
+
+class ThumbnailLabel(QLabel):
+    clicked = pyqtSignal(str)
+
+    def __init__(self, path, job_id, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.job_id = job_id
+        self.setFixedSize(GalleryThumbnailSize, GalleryThumbnailSize)
+        self.setAlignment(Qt.AlignCenter)
+        self.setCursor(Qt.PointingHandCursor)
+        self.setStyleSheet("color: grey; border: 1px solid #333;")
+        self.setText("Loading...")
+
+    def mousePressEvent(self, event):
+        self.clicked.emit(self.path)
+
+class ImageGallery(QWidget):
+    """
+    Shows generated images as the image worker reports them on IMAGE_JOB. Thumbnails
+    are decoded off the GUI thread; the full-resolution image is only loaded when a
+    thumbnail is clicked.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnails = {}
+        self.job_started = {}
+        self.first_visible = set()
+        self.image_jobs = {}
+        self.preview_path = None
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(GalleryWorkers)
+        self.thumbnail_signals = ImageLoadSignals(self)
+        self.thumbnail_signals.loaded.connect(self.showThumbnail)
+        self.preview_signals = ImageLoadSignals(self)
+        self.preview_signals.loaded.connect(self.showPreview)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 0, 40, 10)
+        layout.setSpacing(6)
+
+        self.title = QLabel("")
+        self.title.setStyleSheet("color: white; font-size: 14px; border: none;")
+        layout.addWidget(self.title)
+
+        self.preview = QLabel()
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.preview.setStyleSheet("border: none;")
+        self.preview.setCursor(Qt.PointingHandCursor)
+        self.preview.mousePressEvent = lambda event: self.closePreview()
+        self.preview.hide()
+        layout.addWidget(self.preview)
+
+        strip = QWidget()
+        self.strip_layout = QHBoxLayout(strip)
+        self.strip_layout.setContentsMargins(0, 0, 0, 0)
+        self.strip_layout.setSpacing(8)
+        self.strip_layout.addStretch()
+        scroll = QScrollArea()
+        scroll.setWidget(strip)
+        scroll.setWidgetResizable(True)
+        scroll.setFrameStyle(QFrame.NoFrame)
+        scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        scroll.setFixedHeight(GalleryThumbnailSize + 20)
+        self.scroll = scroll
+        layout.addWidget(scroll)
+
+        self.setStyleSheet("background-color: black;")
+        self.hide()
+
+        self.state_bridge = StateSignalBridge([IMAGE_JOB], self)
+        self.state_bridge.stateChanged.connect(self.onImageJob)
+        self.destroyed.connect(lambda *args: self.state_bridge.detach())
+
+    def onImageJob(self, key, value):
+        try:
+            event = json.loads(value)
+        except ValueError:
+            print(f"GUI WARNING: Ignoring malformed image job event: {value[:100]}")
+            return
+        job_id, state = event.get("job"), event.get("state")
+        if state == "queued":
+            self.job_started[job_id] = perf_counter()
+            self.image_jobs[job_id] = event.get("prompt", "")
+            self.title.setText(f"Generating images for '{event.get('prompt', '')}'...")
+            self.show()
+        elif state == "image" and event.get("path"):
+            self.addImage(job_id, event["path"])
+            self.title.setText(f"'{self.image_jobs.get(job_id, '')}': {event.get('done')}/{event.get('total')} images")
+        elif state == "done":
+            self.title.setText(f"'{self.image_jobs.get(job_id, '')}': {event.get('done')} images in {event.get('seconds', 0):.1f}s")
+        elif state == "failed":
+            self.title.setText(f"Image generation failed: {event.get('error', 'unknown error')}")
+        elif state == "batch" and len(event.get("results", {})) > 1:
+            counts = ", ".join(f"'{prompt}': {len(files)}" for prompt, files in event["results"].items())
+            self.title.setText(f"{len(event['results'])} prompts in {event.get('seconds', 0):.1f}s ({counts})")
+
+    def addImage(self, job_id, path):
+        if path in self.thumbnails:
+            return
+        thumbnail = ThumbnailLabel(path, job_id)
+        thumbnail.setToolTip(self.image_jobs.get(job_id, ""))
+        thumbnail.clicked.connect(self.openPreview)
+        self.strip_layout.insertWidget(self.strip_layout.count() - 1, thumbnail)
+        self.thumbnails[path] = thumbnail
+        while len(self.thumbnails) > GalleryMaxImages:
+            oldest = next(iter(self.thumbnails))
+            self.thumbnails.pop(oldest).deleteLater()
+        self.pool.start(ImageLoadTask(path, QSize(GalleryThumbnailSize, GalleryThumbnailSize), self.thumbnail_signals))
+        self.show()
+
+    def showThumbnail(self, path, image):
+        thumbnail = self.thumbnails.get(path)
+        if thumbnail is None:
+            return
+        if image.isNull():
+            thumbnail.setText("Unreadable")
+            return
+        thumbnail.setText("")
+        thumbnail.setPixmap(QPixmap.fromImage(image))
+        job_id = thumbnail.job_id
+        if job_id in self.job_started and job_id not in self.first_visible:
+            self.first_visible.add(job_id)
+            print(f"GUI DEBUG: First image of {job_id} visible after {perf_counter() - self.job_started[job_id]:.2f}s.")
+        self.scroll.horizontalScrollBar().setValue(self.scroll.horizontalScrollBar().maximum())
+
+    def openPreview(self, path):
+        self.preview_path = path
+        self.preview.setText("Loading...")
+        self.preview.show()
+        self.pool.start(ImageLoadTask(path, None, self.preview_signals))
+
+    def showPreview(self, path, image):
+        if path != self.preview_path:
+            return
+        if image.isNull():
+            self.preview.setText("Could not open image.")
+            return
+        height = max(self.window().height() // 2, GalleryThumbnailSize)
+        self.preview.setPixmap(QPixmap.fromImage(image).scaled(QSize(self.width(), height), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def closePreview(self):
+        self.preview_path = None
+        self.preview.clear()
+        self.preview.hide()
+
 class InitialScreen(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -325,17 +538,13 @@ class InitialScreen(QWidget):
         self.setFixedWidth(screen_width)
         self.setStyleSheet("background-color: black;")
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.SpeechRecogText)
-        self.timer.start(200)
+        self.state_bridge = StateSignalBridge([STATUS], self)
+        self.state_bridge.stateChanged.connect(self.SpeechRecogText)
+        self.destroyed.connect(lambda *args: self.state_bridge.detach())
+        self.SpeechRecogText(STATUS, GetAssistantStatus())
 
-    def SpeechRecogText(self):
-        try:
-            messages = GetAssistantStatus()
-            self.label.setText(messages)
-        except Exception as e:
-            print(f"GUI ERROR: Error in ChatSection.SpeechRecogText: {e}")
-            self.label.setText("Error loading status.")
+    def SpeechRecogText(self, key, messages):
+        self.label.setText(messages)
 
     def load_icon(self, path, width=60, height=60):
         pixmap = QPixmap(path)
@@ -387,6 +596,8 @@ class MessageScreen(QWidget):
         layout = QVBoxLayout()
         chat_section = ChatSection()
         layout.addWidget(chat_section)
+        image_gallery = ImageGallery()
+        layout.addWidget(image_gallery)
         self.setLayout(layout)
         self.setStyleSheet("background-color: black;")
         self.setFixedHeight(screen_height)
@@ -584,11 +795,11 @@ def GraphicalUserInterface():
 
 if __name__ == "__main__":
     print("GUI DEBUG: GUI.py running directly. This should usually be called from Main.py.")
-    if not os.path.exists(TempDirectoryPath('Mic.data')):
+    if not state_bus.Get(MIC):
         SetMicrophoneStatus("False")
-        print("GUI DEBUG: Initialized Mic.data to False.")
-    if not os.path.exists(TempDirectoryPath('Status.data')):
+        print("GUI DEBUG: Initialized microphone status to False.")
+    if not state_bus.Get(STATUS):
         SetAssistantStatus("Idle")
-        print("GUI DEBUG: Initialized Status.data to Idle.")
+        print("GUI DEBUG: Initialized assistant status to Idle.")
 
-    GraphicalUserInterface()
\ No newline at end of file
+    GraphicalUserInterface()
\ No newline at end of file
@@ -2,26 +2,29 @@ import sys
 import os
 import json
 import threading
-import subprocess
-from asyncio import run
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import sleep, perf_counter
 
 # Add Frontend and Backend directories to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(current_dir, "Frontend"))
 sys.path.append(os.path.join(current_dir, "Backend"))
 
-from Frontend.GUI import (GraphicalUserInterface, SetAssistantStatus, ShowTextToScreen, TempDirectoryPath, SetMicrophoneStatus, AnswerModifier, QueryModifier, GetMicrophoneStatus, GetAssistantStatus)
+from Frontend.GUI import (GraphicalUserInterface, SetAssistantStatus, ShowTextToScreen, StreamTextToScreen, EndStreamToScreen, TempDirectoryPath, SetMicrophoneStatus, AnswerModifier, QueryModifier, GetMicrophoneStatus, GetAssistantStatus)
+from Backend.StateBus import state_bus, MIC, STATUS
+from Backend.ChatLogStore import chat_log
+from Backend.Runtime import runtime
+from Backend.ImageJobs import image_jobs
 
 # Import Backend modules after adding to path
 try:
     from Backend.Model import FirstLayerDMM
     from Backend.RealtimeSearchEngine import RealtimeSearchEngine
     from Backend.Automation import Automation
-    # FIX: Corrected the import statement to use the correct variable name, speech_driver
-    from Backend.SpeechToText import SpeechRecognition, speech_driver
-    from Backend.Chatbot import ChatBot
-    from Backend.TextToSpeech import TextToSpeech, TTS_init, TTS_quit
+    from Backend.SpeechToText import SpeechRecognition, speech_recognizer
+    from Backend.Chatbot import ChatBot, RecordExchange
+    from Backend.Speculation import speculator
+    from Backend.TextToSpeech import TextToSpeech, TTS_init, TTS_quit, PrewarmSpeech
     print("DEBUG: All Backend modules imported successfully.")
 except ImportError as e:
     print(f"CRITICAL ERROR: Could not import Backend modules. Check your Backend folder structure and file names. Error: {e}")
@@ -32,129 +35,116 @@ from dotenv import dotenv_values
 env_vars = dotenv_values(".env")
 Username = env_vars.get("Username", "User")
 Assistantname = env_vars.get("Assistantname", "Assistant")
+# Seconds a multi-part general/realtime question may take before unfinished parts are given up.
+FanOutDeadline = float(env_vars.get("FanOutDeadline", 20))
+# Seconds the turn waits for all automation commands; anything still running after that is abandoned.
+AutomationDeadline = float(env_vars.get("AutomationDeadline", 120))
 
 DefaultMessage = f"""{Username}: Hello {Assistantname}, How are you?
 {Assistantname}: Welcome {Username}. I am doing well. How may I help you?"""
 
-subprocesses = []
+# Fixed spoken replies; pre-synthesized into the speech cache at startup.
+DMMErrorReply = f"I encountered an error trying to understand that, {Username}."
+AutomationErrorReply = f"I couldn't perform the requested automation, {Username}."
+SearchErrorReply = f"I couldn't perform the search, {Username}."
+ChatBotErrorReply = f"My brain is having a moment, {Username}."
+GoodbyeReply = "Goodbye!"
+FallbackReply = f"{Assistantname}: I'm not sure how to respond to that."
+CannedReplies = [DMMErrorReply, AutomationErrorReply, SearchErrorReply, ChatBotErrorReply, GoodbyeReply, FallbackReply]
+
+fanout_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="FanOut")
 Functions = ["open", "close", "play", "system", "content", "google search", "Youtube"]
+# A leading word asking for fresh images skips the ones stored for the same prompt, e.g. "another sunset".
+NewImageWords = ("another", "different", "fresh", "more")
 
 def ShowDefaultChatIfNoChats():
     """
-    Checks if ChatLog.json exists and has content.
-    If not, it ensures Database.data is empty and sets a default message in Responses.data.
+    Checks if the chat log store has any messages.
+    If not, it ensures Database.data is empty and shows a default message on the GUI.
     """
-    chat_log_path = os.path.join('Data', 'ChatLog.json')
-    print(f"DEBUG: Checking default chat for {chat_log_path}")
+    print(f"DEBUG: Checking default chat for {chat_log.directory}")
 
     try:
-        data_dir = os.path.dirname(chat_log_path)
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-            print(f"DEBUG: Created directory: {data_dir}")
-
-        should_set_default = False
-        if not os.path.exists(chat_log_path) or os.path.getsize(chat_log_path) == 0:
-            print(f"DEBUG: ChatLog.json is empty or not found. Needs default setup.")
-            should_set_default = True
-        else:
-            try:
-                with open(chat_log_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if not content:
-                        should_set_default = True
-                    else:
-                        json.loads(content)
-                        print(f"DEBUG: ChatLog.json exists and is valid JSON.")
-            except json.JSONDecodeError:
-                print(f"WARNING: ChatLog.json is malformed. Re-initializing to default.")
-                should_set_default = True
-            except Exception as e:
-                print(f"ERROR checking ChatLog.json content: {e}. Re-initializing to default.")
-                should_set_default = True
-
-        if should_set_default:
-            with open(chat_log_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            print(f"DEBUG: Initialized empty ChatLog.json.")
+        if chat_log.Count() == 0:
+            print(f"DEBUG: Chat log is empty. Needs default setup.")
 
             with open(TempDirectoryPath('Database.data'), 'w', encoding='utf-8') as file:
                 file.write("")
             print(f"DEBUG: Cleared Database.data.")
 
-            with open(TempDirectoryPath('Responses.data'), 'w', encoding='utf-8') as file:
-                file.write(DefaultMessage)
-            print(f"DEBUG: Wrote DefaultMessage to Responses.data.")
+            ShowTextToScreen(DefaultMessage)
+            print(f"DEBUG: Showed DefaultMessage on the GUI.")
 
     except Exception as e:
         print(f"ERROR in ShowDefaultChatIfNoChats (outer block): {e}")
-        try:
-            with open(TempDirectoryPath('Responses.data'), 'w', encoding='utf-8') as file:
-                file.write(DefaultMessage)
-            print(f"DEBUG: Fallback: Wrote DefaultMessage to Responses.data due to error.")
-        except Exception as e_fallback:
-            print(f"ERROR: Fallback write to Responses.data also failed: {e_fallback}")
-
-
-def ReadChatLogJson():
-    """Reads and returns the content of ChatLog.json."""
-    chat_log_path = os.path.join('Data', 'ChatLog.json')
-    print(f"DEBUG: Reading ChatLog.json from: {chat_log_path}")
-    if not os.path.exists(chat_log_path):
-        print(f"WARNING: ChatLog.json not found at {chat_log_path}. Returning empty list.")
-        return []
+        ShowTextToScreen(DefaultMessage)
+        print(f"DEBUG: Fallback: Showed DefaultMessage on the GUI due to error.")
+
+
+def ReadRenderCursor():
+    """Returns the (generation, offset) of the last chat log message rendered into Database.data."""
     try:
-        with open(chat_log_path, 'r', encoding="utf-8") as file:
-            content = file.read().strip()
-            if not content:
-                print("DEBUG: ChatLog.json is empty. Returning empty list.")
-                return []
-            chatlog_data = json.loads(content)
-        print(f"DEBUG: Successfully read ChatLog.json. Data length: {len(chatlog_data)}")
-        return chatlog_data
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Could not decode ChatLog.json. It might be empty or malformed: {e}")
-        try:
-            with open(chat_log_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            print("DEBUG: Reset ChatLog.json to empty list due to decode error.")
-        except IOError as e_fix:
-            print(f"ERROR: Could not reset ChatLog.json: {e_fix}")
-        return []
+        with open(TempDirectoryPath('Database.cursor'), 'r', encoding='utf-8') as file:
+            cursor = json.load(file)
+        return cursor.get("generation", 0), cursor.get("offset", 0)
+    except (IOError, ValueError):
+        return None, 0
+
+def WriteRenderCursor(generation, offset):
+    cursor_path = TempDirectoryPath('Database.cursor')
+    try:
+        with open(cursor_path + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump({"generation": generation, "offset": offset}, file)
+        os.replace(cursor_path + ".tmp", cursor_path)
     except IOError as e:
-        print(f"ERROR: Could not read ChatLog.json due to IOError: {e}")
-        return []
+        print(f"ERROR: Could not write render cursor: {e}")
 
 def ChatLogIntegration():
     """
-    Reads chat history from ChatLog.json, formats it, and writes to Database.data.
+    Appends chat log messages that are not yet in Database.data, starting from the
+    persisted render cursor. Falls back to a full rebuild if the log was reset or compacted.
     """
     print("DEBUG: Starting ChatLogIntegration.")
-    json_data = ReadChatLogJson()
-    formatted_chatlog = ""
-    for entry in json_data:
-        if entry.get("role") == "user":
-            formatted_chatlog += f"{Username}: {entry.get('content', '')}\n"
-        elif entry.get("role") == "assistant":
-            formatted_chatlog += f"{Assistantname}: {entry.get('content', '')}\n"
+    db_file_path = TempDirectoryPath('Database.data')
+    generation, offset = ReadRenderCursor()
+    count = chat_log.Count()
 
-    final_chatlog = AnswerModifier(formatted_chatlog)
+    if generation != chat_log.generation or offset > count or not os.path.exists(db_file_path):
+        print("DEBUG: Render cursor is stale. Rebuilding Database.data from the start.")
+        offset, mode = 0, 'w'
+    else:
+        mode = 'a'
 
-    db_file_path = TempDirectoryPath('Database.data')
+    if mode == 'a' and offset == count:
+        print("DEBUG: Database.data is already up to date.")
+        return
+
+    written = 0
     try:
-        with open(db_file_path, 'w', encoding='utf-8') as file:
-            file.write(final_chatlog)
-        print(f"DEBUG: Wrote formatted chatlog to Database.data. Length: {len(final_chatlog)}")
-    except IOError as e:
+        with open(db_file_path, mode, encoding='utf-8') as file:
+            needs_separator = file.tell() > 0
+            for entry in chat_log.IterRange(offset, count):
+                if entry.get("role") == "user":
+                    text = f"{Username}: {entry.get('content', '')}"
+                elif entry.get("role") == "assistant":
+                    text = f"{Assistantname}: {entry.get('content', '')}"
+                else:
+                    continue
+                for line in text.split('\n'):
+                    if line.strip():
+                        file.write(f"\n{line}" if needs_separator else line)
+                        needs_separator = True
+                        written += 1
+        WriteRenderCursor(chat_log.generation, count)
+        print(f"DEBUG: Appended {written} lines for {count - offset} new messages to Database.data.")
+    except (IOError, ValueError) as e:
         print(f"ERROR: Could not write formatted chatlog to Database.data: {e}")
 
 def ShowChatsOnGUI():
     """
-    Reads chat data from 'Database.data' and writes it to 'Responses.data'
-    for display on the GUI.
+    Reads chat data from 'Database.data' and publishes it to the GUI.
     """
     db_file_path = TempDirectoryPath('Database.data')
-    responses_file_path = TempDirectoryPath('Responses.data')
     data = ""
     print(f"DEBUG: Starting ShowChatsOnGUI. Reading from {db_file_path}")
     try:
@@ -169,20 +159,10 @@ def ShowChatsOnGUI():
         data = ""
 
     if len(data) > 0:
-        result = data
-        print(f"DEBUG: Writing {len(result)} characters from Database.data to Responses.data for GUI display.")
-        try:
-            with open(responses_file_path, 'w', encoding='utf-8') as response_file:
-                response_file.write(result)
-        except IOError as e:
-            print(f"ERROR: Could not write to Responses.data for GUI: {e}")
+        print(f"DEBUG: Publishing {len(data)} characters from Database.data for GUI display.")
     else:
-        print("DEBUG: Database.data is empty, clearing Responses.data.")
-        try:
-            with open(responses_file_path, 'w', encoding='utf-8') as response_file:
-                response_file.write("")
-        except IOError as e:
-            print(f"ERROR: Could not clear Responses.data: {e}")
+        print("DEBUG: Database.data is empty, clearing the GUI response.")
+    ShowTextToScreen(data)
 
 def InitialExecution():
     """Performs initial setup for the GUI and chat system."""
@@ -194,12 +174,133 @@ def InitialExecution():
     ShowChatsOnGUI()
     print("DEBUG: InitialExecution finished.")
 
+def AnswerStreamer():
+    """Returns an OnToken callback that streams an assistant answer to the GUI as it arrives."""
+    started = [False]
+
+    def OnToken(token):
+        if not started[0]:
+            started[0] = True
+            token = f"{Assistantname}: {token}"
+        StreamTextToScreen(token)
+
+    return OnToken
+
+def SplitImagePrompt(prompt):
+    """Returns (prompt, new_seeds); "another sunset" becomes ("sunset", True)."""
+    words = prompt.split()
+    if len(words) > 1 and words[0].lower() in NewImageWords:
+        return " ".join(words[1:]), True
+    return prompt, False
+
+def ReportImageJob(event):
+    """Shows image worker progress in the assistant status line."""
+    if event["state"] == "image":
+        SetAssistantStatus(f"Image {event['done']}/{event['total']} ready...")
+    elif event["state"] == "done":
+        SetAssistantStatus(f"Images ready ({event.get('seconds', 0):.0f}s).")
+    elif event["state"] == "failed":
+        SetAssistantStatus("Image generation failed.")
+        print(f"ERROR: Image job {event['job']} failed: {event.get('error')}")
+    elif event["state"] == "batch" and len(event["results"]) > 1:
+        ready = sum(1 for files in event["results"].values() if files)
+        SetAssistantStatus(f"Images ready for {ready} of {len(event['results'])} prompts ({event['seconds']:.0f}s).")
+
+def AnswerSubQueries(Parts):
+    """
+    Answers each ("general" | "realtime", query) part concurrently, general parts with
+    ChatBot() and realtime parts with RealtimeSearchEngine(), all within FanOutDeadline.
+    Parts stream to the GUI in their original order and their answers are merged in that order.
+    Parts still running at the deadline are cancelled, and only general answers that made it
+    into the reply are written to the chat log.
+    """
+    Stream = AnswerStreamer()
+    lock = threading.Lock()
+    head = [0]
+    received = [False] * len(Parts)
+    buffers = [[] for _ in Parts]
+    answers = [None] * len(Parts)
+    cancels = [threading.Event() for _ in Parts]
+    # General answers that made it into the reply, logged in part order once the reply is assembled.
+    chat_answers = [None] * len(Parts)
+
+    def Emit(index, token):
+        # Caller holds lock. Only the earliest unfinished part streams live; later ones buffer.
+        received[index] = True
+        if index == head[0]:
+            Stream(token)
+        else:
+            buffers[index].append(token)
+
+    def OnTokenFor(index):
+        def OnToken(token):
+            with lock:
+                if answers[index] is None:
+                    Emit(index, token)
+        return OnToken
+
+    def Finish(index, answer, log=False):
+        """Sets the part's answer unless it already has one. log marks a general answer for the chat log."""
+        with lock:
+            if answers[index] is not None:
+                return
+            if log:
+                chat_answers[index] = answer
+            if not received[index]:
+                Emit(index, answer)
+            answers[index] = answer
+            while head[0] < len(Parts) and answers[head[0]] is not None:
+                head[0] += 1
+                if head[0] < len(Parts):
+                    Stream("\n")
+                    for token in buffers[head[0]]:
+                        Stream(token)
+
+    def Answer(index, kind, query):
+        if cancels[index].is_set():
+            return
+        try:
+            if kind == "general":
+                answer = ChatBot(QueryModifier(query), OnToken=OnTokenFor(index), Persist=False, Cancel=cancels[index])
+            else:
+                answer = RealtimeSearchEngine(QueryModifier(query), OnToken=OnTokenFor(index), Cancel=cancels[index])
+        except Exception as e:
+            print(f"ERROR: {kind} sub-query '{query}' failed: {e}")
+            Finish(index, ChatBotErrorReply if kind == "general" else SearchErrorReply)
+            return
+        if answer is None:
+            # Cancelled at the deadline; the timeout reply is already in place.
+            return
+        Finish(index, answer, log=kind == "general")
+
+    started = perf_counter()
+    futures = [fanout_pool.submit(Answer, index, kind, query) for index, (kind, query) in enumerate(Parts)]
+    _, pending = wait(futures, timeout=FanOutDeadline)
+    for index, (kind, query) in enumerate(Parts):
+        if answers[index] is None:
+            print(f"WARNING: {kind} sub-query '{query}' missed the {FanOutDeadline:.0f}s deadline.")
+            # Stop the part so it neither holds a fan-out worker nor reaches the chat log late.
+            cancels[index].set()
+            futures[index].cancel()
+            Finish(index, f"I couldn't get an answer about {query} in time, {Username}.")
+    with lock:
+        logged = [(QueryModifier(query), answer) for (_, query), answer in zip(Parts, chat_answers) if answer is not None]
+    for query, answer in logged:
+        RecordExchange(query, answer)
+    print(f"DEBUG: Answered {len(Parts)} sub-queries ({len(pending)} timed out) in {perf_counter() - started:.2f}s.")
+    return "\n".join(answers)
+
+def SpeculativeBackends(PreparedQuery):
+    """Backends the speculator may start before FirstLayerDMM decides; the chat answer is logged only once confirmed."""
+    return {
+        "general": lambda OnToken, Cancel: ChatBot(PreparedQuery, OnToken=OnToken, Persist=False, Cancel=Cancel),
+        "realtime": lambda OnToken, Cancel: RealtimeSearchEngine(PreparedQuery, OnToken=OnToken, Cancel=Cancel),
+    }
+
 def MainExecution():
     """Main logic for processing user queries and generating responses."""
     print("DEBUG: Starting MainExecution.")
     TaskExecution = False
-    ImageExecution = False
-    ImageGenerationQuery = ""
 
     SetAssistantStatus("Listening....")
     try:
@@ -215,135 +316,122 @@ def MainExecution():
         SetAssistantStatus("Error in SpeechRec...")
         return False
 
+    speculation = speculator.Start(QueryModifier(Query), SpeculativeBackends(QueryModifier(Query)))
     try:
         Decision = FirstLayerDMM(Query)
         print("\n")
         print(f"Decision: {Decision}")
         print("\n")
+        Speculated = speculation.Resolve(Decision)
     except Exception as e:
         print(f"ERROR: FirstLayerDMM failed: {e}")
+        speculation.Resolve([])
         SetAssistantStatus("Error in DMM...")
-        TextToSpeech(f"I encountered an error trying to understand that, {Username}.")
+        TextToSpeech(DMMErrorReply)
         return False
 
     G = any(i.startswith("general") for i in Decision)
     R = any(i.startswith("realtime") for i in Decision)
 
-    MergedQuery = " and ".join([
-        " ".join(i.split()[1:]) for i in Decision
+    Parts = [
+        (i.split()[0], " ".join(i.split()[1:])) for i in Decision
         if i.startswith("general") or i.startswith("realtime")
-    ])
-
-    for queries in Decision:
-        if "generate" in queries:
-            ImageGenerationQuery = str(queries)
-            ImageExecution = True
-            break
-
-    if ImageExecution:
-        image_gen_file_path = TempDirectoryPath("ImageGeneration.data")
+    ]
+
+    # Every image intent of the decision goes to the worker as one batch.
+    ImagePrompts = [
+        SplitImagePrompt(queries.removeprefix("generate image").strip()) for queries in Decision
+        if queries.startswith("generate image")
+    ]
+    if ImagePrompts:
         try:
-            with open(image_gen_file_path, "w", encoding="utf-8") as file:
-                file.write(f"{ImageGenerationQuery}, True")
-            print(f"DEBUG: Image generation query written to {image_gen_file_path}")
-
-            p1 = subprocess.Popen(
-                ['python', os.path.join(current_dir, r'Backend\ImageGeneration.py')],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.PIPE,
-                shell=False
-            )
-            subprocesses.append(p1)
-            print("DEBUG: ImageGeneration.py subprocess started.")
+            job_ids = image_jobs.SubmitBatch(ImagePrompts)
+            print(f"DEBUG: Image generation jobs {', '.join(job_ids)} queued for "
+                  f"{', '.join(repr(prompt) for prompt, _ in ImagePrompts)}.")
         except Exception as e:
-            print(f"ERROR handling image generation subprocess: {e}")
+            print(f"ERROR: Could not queue image generation for {ImagePrompts}: {e}")
 
     for queries in Decision:
         if TaskExecution == False:
             if any(queries.startswith(func) for func in Functions):
                 try:
-                    run(Automation(list(Decision)))
+                    runtime.RunSync(Automation(list(Decision)), timeout=AutomationDeadline)
                     TaskExecution = True
                     print(f"DEBUG: Automation task executed: {queries}")
                     break
                 except Exception as e:
                     print(f"ERROR: Automation failed for '{queries}': {e}")
                     SetAssistantStatus("Automation failed.")
-                    TextToSpeech(f"I couldn't perform the requested automation, {Username}.")
-
-    if G or R:
-        SetAssistantStatus("Searching...")
-        try:
-            Answer = RealtimeSearchEngine(QueryModifier(MergedQuery))
-            ShowTextToScreen(f"{Assistantname}: {Answer}")
-            SetAssistantStatus(f"{Assistantname}: {Answer}")
-            SetAssistantStatus("Answering...")
-            TextToSpeech(Answer)
-            return True
-        except Exception as e:
-            print(f"ERROR: RealtimeSearchEngine failed: {e}")
-            SetAssistantStatus("Search failed.")
-            TextToSpeech(f"I couldn't perform the search, {Username}.")
-            return False
+                    TextToSpeech(AutomationErrorReply)
+
+    if len(Parts) > 1:
+        SetAssistantStatus("Searching..." if R else "Thinking...")
+        Answer = AnswerSubQueries(Parts)
+        ShowTextToScreen(f"{Assistantname}: {Answer}")
+        SetAssistantStatus("Answering...")
+        TextToSpeech(Answer)
+        return True
     else:
         for Queries in Decision:
             if "general" in Queries:
                 SetAssistantStatus("Thinking...")
                 QueryFinal = Queries.replace("general", "").strip()
                 try:
-                    Answer = ChatBot(QueryModifier(QueryFinal))
+                    Stream = AnswerStreamer()
+                    Answer = Speculated.Result(Stream, timeout=FanOutDeadline) if Speculated and Speculated.kind == "general" else None
+                    if Answer is not None:
+                        RecordExchange(Speculated.query, Answer)
+                    else:
+                        Answer = ChatBot(QueryModifier(QueryFinal), OnToken=Stream)
                     ShowTextToScreen(f"{Assistantname}: {Answer}")
                     SetAssistantStatus("Answering...")
                     TextToSpeech(Answer)
                     return True
                 except Exception as e:
                     print(f"ERROR: ChatBot failed: {e}")
+                    EndStreamToScreen()
                     SetAssistantStatus("Chatbot failed.")
-                    TextToSpeech(f"My brain is having a moment, {Username}.")
+                    TextToSpeech(ChatBotErrorReply)
                     return False
 
             elif "realtime" in Queries:
                 SetAssistantStatus("Searching...")
                 QueryFinal = Queries.replace("realtime", "").strip()
                 try:
-                    Answer = RealtimeSearchEngine(QueryModifier(QueryFinal))
+                    Stream = AnswerStreamer()
+                    Answer = Speculated.Result(Stream, timeout=FanOutDeadline) if Speculated and Speculated.kind == "realtime" else None
+                    if Answer is None:
+                        Answer = RealtimeSearchEngine(QueryModifier(QueryFinal), OnToken=Stream)
                     ShowTextToScreen(f"{Assistantname}: {Answer}")
                     SetAssistantStatus("Answering...")
                     TextToSpeech(Answer)
                     return True
                 except Exception as e:
                     print(f"ERROR: RealtimeSearchEngine failed: {e}")
+                    EndStreamToScreen()
                     SetAssistantStatus("Search failed.")
-                    TextToSpeech(f"I couldn't perform the search, {Username}.")
+                    TextToSpeech(SearchErrorReply)
                     return False
 
             elif "exit" in Queries:
                 QueryFinal = "Okay, Bye!"
                 try:
-                    Answer = ChatBot(QueryModifier(QueryFinal))
+                    Answer = ChatBot(QueryModifier(QueryFinal), OnToken=AnswerStreamer())
                     ShowTextToScreen(f"{Assistantname}: {Answer}")
                     SetAssistantStatus("Answering...")
                     TextToSpeech(Answer)
                 except Exception as e:
                     print(f"WARNING: ChatBot failed for exit message: {e}")
-                    ShowTextToScreen(f"{Assistantname}: Goodbye!")
-                    TextToSpeech("Goodbye!")
+                    ShowTextToScreen(f"{Assistantname}: {GoodbyeReply}")
+                    TextToSpeech(GoodbyeReply)
                 finally:
                     SetAssistantStatus("Idle")
-                    for p in subprocesses:
-                        if p.poll() is None:
-                            p.terminate()
-                            p.wait(timeout=1)
-                            if p.poll() is None:
-                                p.kill()
-                                print(f"DEBUG: Force killed subprocess {p.pid}")
-                        print(f"DEBUG: Subprocess {p.pid} terminated.")
+                    image_jobs.Stop()
                     sys.exit(0)
 
         print("DEBUG: No specific action matched in MainExecution for query.")
         SetAssistantStatus("Available...")
-        fallback_message = f"{Assistantname}: I'm not sure how to respond to that."
+        fallback_message = FallbackReply
         ShowTextToScreen(fallback_message)
         TextToSpeech(fallback_message)
         return False
@@ -363,7 +451,8 @@ def FirstThread():
                     pass
                 else:
                     SetAssistantStatus("Available...")
-                sleep(0.1)
+                # Block until the GUI publishes a mic change instead of polling.
+                state_bus.WaitFor(MIC, "True", timeout=1)
         except Exception as e:
             print(f"ERROR in FirstThread loop: {e}")
             sleep(1)
@@ -384,17 +473,17 @@ def CleanupAndExit():
     """Performs cleanup operations before exiting."""
     print("DEBUG: Running cleanup operations.")
     try:
-        if speech_driver:
-            print("DEBUG: Quitting speech recognition WebDriver.")
-            speech_driver.quit()
+        speech_recognizer.Close()
     except Exception as e:
-        print(f"ERROR: Failed to quit speech recognition WebDriver: {e}")
+        print(f"ERROR: Failed to close the speech recognizer: {e}")
     
     try:
         TTS_quit()
     except Exception as e:
         print(f"ERROR: Failed to quit TTS mixer: {e}")
-    
+
+    image_jobs.Stop()
+    runtime.Stop()
     sys.exit(0)
 
 if __name__ == "__main__":
@@ -406,12 +495,12 @@ if __name__ == "__main__":
             os.makedirs(temp_files_dir)
             print(f"DEBUG: Created directory: {temp_files_dir}")
 
-        if not os.path.exists(TempDirectoryPath('Mic.data')):
+        if not state_bus.Get(MIC):
             SetMicrophoneStatus("False")
-            print("DEBUG: Created Mic.data and set to False.")
-        if not os.path.exists(TempDirectoryPath('Status.data')):
+            print("DEBUG: Initialized microphone status to False.")
+        if not state_bus.Get(STATUS):
             SetAssistantStatus("Idle")
-            print("DEBUG: Created Status.data and set to Idle.")
+            print("DEBUG: Initialized assistant status to Idle.")
         if not os.path.exists(TempDirectoryPath('Database.data')):
             with open(TempDirectoryPath('Database.data'), "w", encoding='utf-8') as f:
                 f.write("")
@@ -425,34 +514,17 @@ if __name__ == "__main__":
         os.makedirs(data_dir_path)
         print(f"DEBUG: Created directory: {data_dir_path}")
 
-    chat_log_path = os.path.join(data_dir_path, 'ChatLog.json')
-    if not os.path.exists(chat_log_path) or os.path.getsize(chat_log_path) == 0:
-        try:
-            with open(chat_log_path, 'w', encoding='utf-8') as f:
-                json.dump([], f)
-            print(f"DEBUG: Initialized empty ChatLog.json at {chat_log_path}.")
-        except IOError as e:
-            print(f"ERROR creating/initializing ChatLog.json: {e}")
-            sys.exit(1)
-    else:
-        try:
-            with open(chat_log_path, 'r', encoding='utf-8') as f:
-                json.load(f)
-            print("DEBUG: Existing ChatLog.json is valid JSON.")
-        except json.JSONDecodeError:
-            print(f"WARNING: ChatLog.json at {chat_log_path} is corrupted. Re-initializing.")
-            try:
-                with open(chat_log_path, 'w', encoding='utf-8') as f:
-                    json.dump([], f)
-                print("DEBUG: Reset ChatLog.json to empty list due to corruption.")
-            except IOError as e:
-                print(f"ERROR resetting corrupted ChatLog.json: {e}")
-                sys.exit(1)
-
+    # One-shot import of the old ChatLog.json, before anything reads the chat log.
+    chat_log.MigrateFromJson()
     InitialExecution()
     
     if not TTS_init():
         CleanupAndExit()
+    PrewarmSpeech(CannedReplies)
+
+    # Start the image worker now so the first request does not wait for it to import.
+    image_jobs.on_event = ReportImageJob
+    image_jobs.Start()
 
     thread1 = threading.Thread(target=FirstThread, daemon=True)
     thread1.start()
@@ -464,4 +536,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nDEBUG: Keyboard interrupt detected.")
     finally:
-        CleanupAndExit()
\ No newline at end of file
+        CleanupAndExit()
\ No newline at end of file